@@ -0,0 +1,102 @@
+"""
+Avro schema registry shared by the usecase-2 modules.
+
+Each schema file is read and parsed once, the parsed codec is kept per
+(name, version). Load the schemas of a module with prewarm() at startup, so
+requests never wait for file I/O and schema parsing.
+
+Schemas are taken from $SCHEMA_PATH (default: ../schemas, relative to this file).
+Versioned schemas are named <name>.v<version>.avsc, e.g. system_status.v2.avsc,
+version None refers to <name>.avsc.
+
+The modules' Dockerfiles add this file next to main.py. To run a module outside
+docker, add this directory to PYTHONPATH.
+"""
+import logging
+import os
+import time
+from collections import Counter
+
+from edgefarm_application.base.schema import schema_load_builtin, schema_read_builtin
+
+_logger = logging.getLogger(__name__)
+
+# (name, version) -> parsed schema, for schemaless_encode/schemaless_decode
+_codecs = {}
+
+# (name, version) -> schema json text, for ef.AdsEncoder
+_schemas = {}
+
+# loads: schema files read, late_loads: of these after prewarm(), on the request path,
+# hits: served from memory, load_seconds: time spent loading
+counters = Counter()
+
+_prewarmed = False
+
+
+def codec(name, version=None):
+    """
+    :return: parsed schema <name> for schemaless_encode/schemaless_decode
+    """
+    key = (name, version)
+    c = _codecs.get(key)
+    if c is None:
+        c = _codecs[key] = _load(schema_load_builtin, name, version, "")
+    else:
+        counters["hits"] += 1
+    return c
+
+
+def schema(name, version=None):
+    """
+    :return: json text of schema <name>, e.g. for ef.AdsEncoder
+    """
+    key = (name, version)
+    s = _schemas.get(key)
+    if s is None:
+        s = _schemas[key] = _load(schema_read_builtin, name, version, ".avsc")
+    else:
+        counters["hits"] += 1
+    return s
+
+
+def prewarm(codecs=(), schemas=()):
+    """
+    Load schemas in advance. Fails at startup if one is missing or invalid.
+    :param codecs: names or (name, version) of schemas used with codec()
+    :param schemas: names or (name, version) of schemas used with schema()
+    """
+    global _prewarmed
+    for names, func in ((codecs, codec), (schemas, schema)):
+        for name in names:
+            func(*name) if isinstance(name, tuple) else func(name)
+    _prewarmed = True
+    _logger.info(f"schema registry prewarmed: {len(_codecs)} codecs, {len(_schemas)} schemas")
+
+
+def schema_path():
+    return os.getenv("SCHEMA_PATH", os.path.join("..", "schemas"))
+
+
+def _file_name(name, version, ext):
+    if version is not None:
+        name = f"{name}.v{version}"
+    return os.path.join(schema_path(), name + ext)
+
+
+def _load(func, name, version, ext):
+    path = _file_name(name, version, ext)
+    # schema_*_builtin take the path relative to this file
+    file = os.path.join(os.path.dirname(os.path.abspath(__file__)), _file_name(name, version, ".avsc"))
+    if not os.path.isfile(file):
+        raise ValueError(f"unknown schema {name}, version {version}: {os.path.normpath(file)} not found")
+    start = time.perf_counter()
+    rv = func(__file__, path)
+    counters["loads"] += 1
+    counters["load_seconds"] += time.perf_counter() - start
+    if _prewarmed:
+        counters["late_loads"] += 1
+        _logger.warning(f"schema {path} loaded on first use, add it to prewarm()")
+    else:
+        _logger.debug(f"schema {path} loaded")
+    return rv
@@ -0,0 +1,45 @@
+"""
+Partitioning of the SeatRes state reports of the trains.
+
+Each train reports its state on the subject of its partition, so several
+fleet-seat-info-monitor replicas can split the fleet among themselves: a replica
+subscribes to the partitions it owns only.
+
+Changing PARTITIONS moves the trains to other subjects, train and fleet monitors
+must be updated together.
+
+The modules' Dockerfiles add this file next to main.py, as schema_registry.py.
+"""
+import zlib
+
+# nats subject needs to start with `public.` to enable access to clound module
+STATUS_SUBJECT = "public.seatres.status"
+# reports of several trains (system_status version 2), split by the fleet monitor
+BATCH_SUBJECT = f"{STATUS_SUBJECT}.batch"
+
+PARTITIONS = 64  # number of state report subjects
+
+
+def partition(train_id):
+    """
+    :return: partition of <train_id>, stable over restarts
+    """
+    return zlib.crc32(train_id.encode()) % PARTITIONS
+
+
+def partition_subject(p):
+    return f"{STATUS_SUBJECT}.{p}"
+
+
+def partition_batch_subject(p):
+    """
+    :return: subject of the system_status version 2 batches of partition <p>
+    """
+    return f"{partition_subject(p)}.batch"
+
+
+def subject(train_id):
+    """
+    :return: subject to report the state of <train_id> on
+    """
+    return partition_subject(partition(train_id))
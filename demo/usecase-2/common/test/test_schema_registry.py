@@ -0,0 +1,99 @@
+import importlib
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import pytest
+
+pytest.importorskip("edgefarm_application")
+
+import schema_registry  # noqa: E402
+
+SCHEMAS = os.path.join(os.path.dirname(__file__), "..", "..", "schemas")
+
+
+def read_schema(file):
+    with open(os.path.join(SCHEMAS, file)) as f:
+        return json.load(f)
+
+
+class TestSchemaRegistry(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        for f in ("timestamp.avsc", "system_status.avsc", "system_status.v2.avsc"):
+            shutil.copy(os.path.join(SCHEMAS, f), self.tmp.name)
+        patcher = patch.dict(os.environ, {"SCHEMA_PATH": self.tmp.name})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # empty registry per test
+        importlib.reload(schema_registry)
+
+    def test_codec_is_loaded_once(self):
+        c = schema_registry.codec("timestamp")
+        self.assertIs(schema_registry.codec("timestamp"), c)
+        self.assertIs(schema_registry.codec("timestamp", None), c)
+        self.assertEqual((schema_registry.counters["loads"], schema_registry.counters["hits"]), (1, 2))
+
+        # the file isn't read again
+        os.remove(os.path.join(self.tmp.name, "timestamp.avsc"))
+        self.assertIs(schema_registry.codec("timestamp"), c)
+
+    def test_codec_and_schema_are_cached_separately(self):
+        s = schema_registry.schema("timestamp")
+        self.assertEqual(json.loads(s), read_schema("timestamp.avsc"))
+        self.assertIs(schema_registry.schema("timestamp"), s)
+        schema_registry.codec("timestamp")
+        self.assertEqual(schema_registry.counters["loads"], 2)
+
+    def test_versions(self):
+        v1 = schema_registry.codec("system_status")
+        v2 = schema_registry.codec("system_status", 2)
+        self.assertIsNot(v1, v2)
+        self.assertIs(schema_registry.codec("system_status", 2), v2)
+        self.assertEqual(
+            json.loads(schema_registry.schema("system_status", 2)),
+            read_schema("system_status.v2.avsc"),
+        )
+        self.assertEqual(schema_registry.counters["loads"], 3)
+
+    def test_unknown_schema(self):
+        for name, version, file in (
+            ("seat_info_request", None, "seat_info_request.avsc"),
+            ("timestamp", 3, "timestamp.v3.avsc"),
+        ):
+            for func in (schema_registry.codec, schema_registry.schema):
+                with self.subTest(func=func.__name__, name=name, version=version):
+                    with self.assertRaisesRegex(ValueError, f"unknown schema {name}.*{file}"):
+                        func(name, version)
+        self.assertEqual(schema_registry.counters["loads"], 0)
+
+    def test_prewarm(self):
+        schema_registry.prewarm(codecs=["timestamp", ("system_status", 2)], schemas=["system_status"])
+        self.assertEqual(schema_registry.counters["loads"], 3)
+        self.assertEqual(schema_registry.counters["late_loads"], 0)
+
+        schema_registry.codec("system_status", 2)
+        schema_registry.schema("system_status")
+        self.assertEqual(schema_registry.counters["hits"], 2)
+
+        # not prewarmed
+        with self.assertLogs(schema_registry._logger, "WARNING") as logs:
+            schema_registry.codec("system_status")
+        self.assertIn("system_status loaded on first use", logs.output[0])
+        self.assertEqual((schema_registry.counters["loads"], schema_registry.counters["late_loads"]), (4, 1))
+
+    def test_prewarm_fails_on_missing_schema(self):
+        with self.assertRaises(ValueError):
+            schema_registry.prewarm(codecs=["timestamp", "seat_info_request"])
+
+    def test_default_schema_path(self):
+        del os.environ["SCHEMA_PATH"]
+        self.assertIn("passenger-info.seat-info.delta-request", schema_registry.schema("seat_info_delta_request"))
+
+
+if __name__ == "__main__":
+    unittest.main()
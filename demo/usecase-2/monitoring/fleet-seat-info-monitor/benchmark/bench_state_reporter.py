@@ -0,0 +1,118 @@
+"""
+Benchmark of the SeatRes ADS state reporter.
+
+Simulates <trains> trains, of which <change-rate> change their state per report period.
+Sending a message takes <send-latency> ms, the ADS producer is replaced by a stand-in
+that only waits that long. The stand-in doesn't encode the messages, the CPU time
+reported is the reporter's scheduling overhead without the avro encoding.
+
+For comparison, the time one report cycle takes the way the reporter did before
+is calculated: all trains one after another, every period.
+
+Run from fleet-seat-info-monitor:
+    PYTHONPATH=src:../../common python benchmark/bench_state_reporter.py --trains 10000
+"""
+import argparse
+import asyncio
+import logging
+import random
+import resource
+import time
+from collections import Counter
+
+import seat_res_ads_state_reporter
+from seat_res_ads_state_reporter import SeatResAdsStateReporter
+
+
+class AdsProducerStandIn:
+    def __init__(self, latency):
+        self._latency = latency
+        self.in_flight = 0
+        self.max_in_flight = 0
+        # sends per 100 ms window, shows how evenly the messages are spread
+        self.per_window = Counter()
+
+    async def encode_and_send(self, encoder, payload):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        self.per_window[int(time.monotonic() * 10)] += 1
+        await asyncio.sleep(self._latency)
+        self.in_flight -= 1
+
+
+def make_trains(count):
+    # [train id, combined state], as TrainStatusCollector.trains() returns
+    return [[f"train{i:05}", "ONLINE-OK"] for i in range(count)]
+
+
+async def change_states(trains, rate, period):
+    while True:
+        await asyncio.sleep(period)
+        for t in random.sample(trains, int(len(trains) * rate)):
+            t[1] = "OFFLINE" if t[1] == "ONLINE-OK" else "ONLINE-OK"
+
+
+async def run(args):
+    trains = make_trains(args.trains)
+    producer = AdsProducerStandIn(args.send_latency / 1000)
+    q = asyncio.Queue()
+    reporter = SeatResAdsStateReporter(
+        q,
+        lambda: trains,
+        None,
+        period=args.period,
+        full_refresh_period=args.full_refresh_period,
+        max_concurrent_sends=args.max_concurrent_sends,
+        ads_producer=producer,
+    )
+    changer = asyncio.create_task(change_states(trains, args.change_rate, args.period))
+
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    await asyncio.sleep(args.period * args.periods)
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+    reporter.stop()
+    changer.cancel()
+    if not q.empty():
+        raise RuntimeError(f"reporter failed: {q.get_nowait()}")
+
+    c = reporter.counters
+    windows = sorted(producer.per_window.values())
+    print(f"{'trains':>22}: {args.trains}")
+    print(f"{'periods':>22}: {args.periods} x {args.period} s")
+    print(f"{'messages sent':>22}: {c['reported']} ({c['reported'] / args.periods:,.0f} per period)")
+    print(f"{'unchanged, skipped':>22}: {c['skipped']}")
+    print(f"{'late slots':>22}: {c['late']}")
+    print(f"{'max sends in flight':>22}: {producer.max_in_flight}")
+    print(f"{'sends per 100 ms':>22}: median {windows[len(windows) // 2]}, max {windows[-1]}")
+    print(f"{'cpu':>22}: {cpu:.2f} s of {elapsed:.2f} s")
+    legacy = args.trains * args.send_latency / 1000
+    print(
+        f"{'legacy cycle':>22}: {legacy:.2f} s for {args.trains} sequential sends "
+        f"(+ {seat_res_ads_state_reporter.REPORT_PERIOD} s sleep)"
+    )
+    print(f"{'peak rss':>22}: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss} kB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ADS state reporter benchmark")
+    parser.add_argument("--trains", type=int, default=10000)
+    parser.add_argument("--periods", type=int, default=24)
+    parser.add_argument("--period", type=float, default=seat_res_ads_state_reporter.REPORT_PERIOD)
+    parser.add_argument("--change-rate", type=float, default=0.01, help="share of trains changing per period")
+    parser.add_argument("--send-latency", type=float, default=2, help="ms per ADS message")
+    parser.add_argument(
+        "--full-refresh-period", type=float, default=seat_res_ads_state_reporter.FULL_REFRESH_PERIOD
+    )
+    parser.add_argument(
+        "--max-concurrent-sends", type=int, default=seat_res_ads_state_reporter.MAX_CONCURRENT_SENDS
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 import logging
 
 import edgefarm_application as ef
-from schema_loader import schema_read
+import schema_registry
 
 _logger = logging.getLogger(__name__)
 
@@ -15,7 +15,7 @@ class AdsEventReporter:
         self._ads_producer = ef.AdsProducer()
 
         # Create an encoder for an application specific payload
-        payload_schema = schema_read(__file__, "system_event")
+        payload_schema = schema_registry.schema("system_event")
         self._ads_encoder = ef.AdsEncoder(
             payload_schema,
             schema_name="system_event",
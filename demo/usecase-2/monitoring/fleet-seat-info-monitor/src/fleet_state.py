@@ -0,0 +1,118 @@
+from array import array
+
+# combined state from the train and the train online state, the code of a state
+# is its index
+STATES = ("UNKNOWN", "OFFLINE", "ONLINE-UNKNOWN", "ONLINE-NOK", "ONLINE-OK")
+
+# just the online state of the train
+ONLINE_STATES = ("UNKNOWN", "OFFLINE", "ONLINE")
+
+# event messages of the online states, shared by all trains
+ONLINE_MESSAGES = ("train state unknown", "train is offline", "train is online")
+
+# state and online state code of trains handed off to another monitor replica
+RELEASED = 255
+
+
+def code(state):
+    return STATES.index(state)
+
+
+def online_code(state):
+    return ONLINE_STATES.index(state)
+
+
+class FleetStateTable:
+    """
+    State of all trains: one row per train, one column per attribute.
+
+    The row of a train never changes. States are stored as codes (see STATES and
+    ONLINE_STATES), one byte per train, so queries over the fleet scan a column in C
+    instead of visiting one object per train.
+
+    Trains handed off to another monitor replica keep their row in state RELEASED,
+    they are left out by the queries.
+    """
+
+    def __init__(self):
+        # row -> train id
+        self.train_ids = []
+        # train id -> row
+        self._rows = {}
+        # combined state code
+        self.state = bytearray()
+        # online state code
+        self.online = bytearray()
+        # time.time() of the last state report, 0: never reported
+        self.last_report = array("d")
+        # time.monotonic() when the train is offline without further state report
+        self.deadline = array("d")
+        # 1 while the train has an entry in the deadline heap of TrainStatusCollector
+        self.scheduled = bytearray()
+
+    def __len__(self):
+        return len(self.train_ids)
+
+    def row(self, train_id):
+        """
+        :return: row of <train_id>, None if not in the table
+        """
+        return self._rows.get(train_id)
+
+    def add(self, train_id):
+        """
+        Add <train_id> in state UNKNOWN.
+        :return: row of the train
+        """
+        row = len(self.train_ids)
+        self._rows[train_id] = row
+        self.train_ids.append(train_id)
+        self.state.append(code("UNKNOWN"))
+        self.online.append(online_code("UNKNOWN"))
+        self.last_report.append(0)
+        self.deadline.append(0)
+        self.scheduled.append(0)
+        return row
+
+    def release(self, row):
+        self.state[row] = RELEASED
+        self.online[row] = RELEASED
+
+    def states(self):
+        """
+        :return: list of (train id, combined state) of all trains
+        """
+        return [(t, STATES[c]) for t, c in zip(self.train_ids, self.state) if c != RELEASED]
+
+    def count_by_state(self):
+        """
+        :return: dict combined state -> number of trains
+        """
+        return {s: self.state.count(c) for c, s in enumerate(STATES)}
+
+    def count_by_online_state(self):
+        """
+        :return: dict online state -> number of trains
+        """
+        return {s: self.online.count(c) for c, s in enumerate(ONLINE_STATES)}
+
+    def trains_in_state(self, state):
+        """
+        :return: list of the ids of all trains in combined <state>
+        """
+        return [self.train_ids[row] for row in _find_all(self.state, code(state))]
+
+    def offline_trains(self):
+        """
+        :return: list of the ids of all offline trains
+        """
+        return [self.train_ids[row] for row in _find_all(self.online, online_code("OFFLINE"))]
+
+
+def _find_all(column, value):
+    rows = []
+    row = column.find(value)
+    while row != -1:
+        rows.append(row)
+        row = column.find(value, row + 1)
+    return rows
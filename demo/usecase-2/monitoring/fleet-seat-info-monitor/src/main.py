@@ -1,5 +1,6 @@
 import os
 import signal
+import socket
 import asyncio
 import logging
 
@@ -8,11 +9,24 @@ from seat_res_train_monitor import TrainStatusCollector
 from seat_info_proxy_monitor import SeatInfoProxyMonitor
 from seat_res_ads_state_reporter import SeatResAdsStateReporter
 from ads_event_reporter import AdsEventReporter
+import schema_registry
 
 
 async def main():
     loop = asyncio.get_event_loop()
 
+    # parse all schemas before serving requests
+    schema_registry.prewarm(
+        codecs=[
+            "system_status",
+            ("system_status", 2),
+            "timestamp",
+            "seat_res_monitor_membership",
+            "seat_res_monitor_handoff",
+        ],
+        schemas=["system_event", "system_status"],
+    )
+
     # Initialize EdgeFarm SDK
     if os.getenv("IOTEDGE_MODULEID") is not None:
         await ef.application_module_init_from_environment(loop)
@@ -25,7 +39,9 @@ async def main():
     # Create a queue that we will use to store events.
     event_q = asyncio.Queue()
 
-    seat_res_train_monitor = TrainStatusCollector(event_q)
+    # replicas share the trains, each needs its own id
+    replica_id = os.getenv("REPLICA_ID", f"{socket.gethostname()}-{os.getpid()}")
+    seat_res_train_monitor = TrainStatusCollector(event_q, replica_id)
     await seat_res_train_monitor.start()
 
     seat_info_proxy_monitor = SeatInfoProxyMonitor(event_q)
@@ -9,7 +9,7 @@ from edgefarm_application.base.avro import schemaless_decode
 
 from run_task import run_task
 from state_tracker import StateTracker
-from schema_loader import schema_load
+import schema_registry
 
 _logger = logging.getLogger(__name__)
 
@@ -27,7 +27,7 @@ class SeatInfoProxyMonitor:
         self._q = q
         self._nc = application_module_network_nats()
         self._task = asyncio.create_task(run_task(_logger, q, self._monitor))
-        self._timestamp_codec = schema_load(__file__, "timestamp")
+        self._timestamp_codec = schema_registry.codec("timestamp")
         self._state = StateTracker(
             "Proxy-Monitor",
             {
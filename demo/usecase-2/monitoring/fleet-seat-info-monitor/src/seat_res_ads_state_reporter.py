@@ -1,35 +1,68 @@
 import asyncio
 import logging
 import datetime
+import time
+import zlib
+from collections import Counter
 
 import edgefarm_application as ef
 
 from run_task import run_task
-from schema_loader import schema_read
+import schema_registry
 
 _logger = logging.getLogger(__name__)
 
+REPORT_PERIOD = 5  # seconds between two reports of a train
+REPORT_SLOTS = 50  # the trains are spread over this many slots per period
+FULL_REFRESH_PERIOD = 60  # seconds after which an unchanged state is reported again
+MAX_CONCURRENT_SENDS = 16  # ADS messages in flight at once
+
 
 class SeatResAdsStateReporter:
     """
     Provides the status of the seat reservation system per train to ADS.
 
-    For each train, a separate ADS message is sent.
-    ADS messages are produced periodically.
+    For each train, a separate ADS message is sent and encoded, as the ADS dashboard
+    expects one system_status message per train. The trains of one slot share the
+    timestamp and are sent concurrently.
+    Each train has a fixed slot within the report period, derived from its train id,
+    so the messages are spread evenly over the period instead of being sent in one burst.
+    A train is reported if its state changed since the last report. Unchanged states are
+    reported again every <full_refresh_period>, in a period derived from the train id
+    as well, so the refreshes are spread over the periods.
 
     :param q: event q to place occurred events
-    :param trains_func: function returning list of train objects
+    :param trains_func: function returning list of (train id, combined state) of all trains
     :param seat_info_proxy_status_func: function to provide status of seat_info_proxy
+    :param ads_producer: producer to send the messages with, default ef.AdsProducer()
     """
 
-    def __init__(self, q, trains_func, seat_info_proxy_status_func):
+    def __init__(
+        self,
+        q,
+        trains_func,
+        seat_info_proxy_status_func,
+        period=REPORT_PERIOD,
+        slots=REPORT_SLOTS,
+        full_refresh_period=FULL_REFRESH_PERIOD,
+        max_concurrent_sends=MAX_CONCURRENT_SENDS,
+        ads_producer=None,
+    ):
         self._trains_func = trains_func
         self._seat_info_proxy_status_func = seat_info_proxy_status_func
+        self._period = period
+        self._slots = slots
+        self._send_slots = asyncio.Semaphore(max_concurrent_sends)
+        self._refresh_periods = max(1, round(full_refresh_period / period))
+        # train_id -> last reported state
+        self._reported = {}
+        # reported: messages sent, skipped: unchanged trains not reported, late: ticks behind schedule
+        self.counters = Counter()
         self._task = asyncio.create_task(run_task(_logger, q, self._reporter))
-        self._ads_producer = ef.AdsProducer()
+        self._ads_producer = ads_producer if ads_producer is not None else ef.AdsProducer()
 
         # Create an encoder for an application specific payload
-        payload_schema = schema_read(__file__, "system_status")
+        payload_schema = schema_registry.schema("system_status")
         self._ads_encoder = ef.AdsEncoder(
             payload_schema,
             schema_name="system_status",
@@ -48,22 +81,61 @@ class SeatResAdsStateReporter:
         # TODO: consider cloudmod_state
 
     async def _reporter(self):
+        slot_duration = self._period / self._slots
+        next_tick = time.monotonic()
+        period = 0
         while True:
-            for t in self._trains_func():
-                await self._report_train(t)
-            await asyncio.sleep(5)
+            # trains added during a period are reported from the next period on
+            by_slot = [[] for _ in range(self._slots)]
+            refresh_phase = period % self._refresh_periods
+            for train_id, train_state in self._trains_func():
+                h = zlib.crc32(train_id.encode())  # stable over restarts, unlike hash()
+                refresh = h // self._slots % self._refresh_periods == refresh_phase
+                by_slot[h % self._slots].append((train_id, train_state, refresh))
+            period += 1
+
+            for trains in by_slot:
+                await self._report_trains(trains)
+
+                # absolute schedule, a late slot doesn't delay the following ones
+                next_tick += slot_duration
+                delay = next_tick - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    self.counters["late"] += 1
+
+    async def _report_trains(self, trains):
+        """
+        :param trains: list of (train id, combined state, True if the state is to be
+        reported even if unchanged)
+        """
+        due = []
+        for train_id, train_state, refresh in trains:
+            state = self.state(train_state, None)
+            if refresh or self._reported.get(train_id) != state:
+                due.append((train_id, state))
+        self.counters["skipped"] += len(trains) - len(due)
+        if len(due) == 0:
+            return
+
+        ts = datetime.datetime.now()
+        await asyncio.gather(*(self._report_train(train_id, state, ts) for train_id, state in due))
+        for train_id, state in due:
+            self._reported[train_id] = state
 
-    async def _report_train(self, t):
-        state = self.state(t.state.state, None)
-        _logger.info(f"reporting state for {t.train_id}: {state}")
+    async def _report_train(self, train_id, state, ts):
+        _logger.debug(f"reporting state for {train_id}: {state}")
 
         ads_payload = {
             "data": {
-                "time": datetime.datetime.now(),
-                "trainId": t.train_id,
+                "time": ts,
+                "trainId": train_id,
                 "systemName": "SeatRes",
                 "status": state,
             },
         }
         # Send data to ads node module
-        await self._ads_producer.encode_and_send(self._ads_encoder, ads_payload)
+        async with self._send_slots:
+            await self._ads_producer.encode_and_send(self._ads_encoder, ads_payload)
+        self.counters["reported"] += 1
@@ -1,142 +1,353 @@
 import logging
 import datetime
 import asyncio
+import functools
+import heapq
+import time
 
 from edgefarm_application.base.application_module import application_module_network_nats
-from edgefarm_application.base.avro import schemaless_decode
+from edgefarm_application.base.avro import schemaless_decode, schemaless_encode
 
 from run_task import run_task
-from state_tracker import StateTracker
-from schema_loader import schema_load
+from fleet_state import FleetStateTable, ONLINE_MESSAGES, RELEASED, code, online_code
+from shard_coordinator import ShardCoordinator, MEMBER_TIMEOUT
+import schema_registry
+import status_partitions
 
 _logger = logging.getLogger(__name__)
 
-_state_report_subject = "public.seatres.status"
+_handoff_subject = "seatres.monitor.handoff"
 
+# replicas share the state reports on the former subject
+_legacy_queue_group = "fleet-seat-info-monitor"
 
-class SeatResTrainMonitor:
-    def __init__(self, train_id, q):
-        self.train_id = train_id
-        self.edge_report_ts = None
+OFFLINE_TIMEOUT = 10  # seconds without state report until a train is offline
 
-        # this is the combined state from the train and the train online state
-        self.state = StateTracker(
-            "TrainSeatRes",
-            {
-                "UNKNOWN": "unknown",
-                "OFFLINE": "offline",
-                "ONLINE-UNKNOWN": "online, unclear state",
-                "ONLINE-NOK": "online, but not ok",
-                "ONLINE-OK": "online, ok",
-            },
-        )
-        # this is just the online state of the train
-        self.state_online = StateTracker(
-            "Train-Online-Monitor",
-            {
-                "UNKNOWN": "train state unknown",
-                "OFFLINE": "train is offline",
-                "ONLINE": "train is online",
-            },
-        )
-        self._q = q
-        self._task = asyncio.create_task(run_task(_logger, q, self._watchdog))
-
-    async def start(self):
-        self.state.update("UNKNOWN")
-        await self.state_online.update_and_send_event("UNKNOWN", self._send_event)
-
-    def stop(self):
-        self._task.cancel()
-
-    async def update_edge_state(self, state):
-        self.edge_report_ts = datetime.datetime.now()
-
-        if state == -1:
-            up_state = "ONLINE-UNKNOWN"
-        elif state == 0:
-            up_state = "ONLINE-NOK"
-        elif state == 1:
-            up_state = "ONLINE-OK"
-
-        self.state.update(up_state)
-        await self.state_online.update_and_send_event("ONLINE", self._send_event)
-
-    async def _watchdog(self):
-        while True:
-            now = datetime.datetime.now()
-
-            if self.edge_report_ts is not None:
-                if (now - self.edge_report_ts).total_seconds() > 10:
-                    self.state.update("OFFLINE")
-                    await self.state_online.update_and_send_event(
-                        "OFFLINE", self._send_event
-                    )
-
-            await asyncio.sleep(1)
-
-    async def _send_event(self, data):
-        data["train_id"] = self.train_id
-        await self._q.put(data)
+# status of the state report -> combined state code
+_status_codes = {
+    -1: code("ONLINE-UNKNOWN"),
+    0: code("ONLINE-NOK"),
+    1: code("ONLINE-OK"),
+}
 
 
 class TrainStatusCollector:
     """
     Collect seat reservation system status of all trains.
 
-    The individual trains report their SeatRes state via Nats subject 'public.seatres.status' to
-    this module.
+    The individual trains report their SeatRes state via Nats subjects
+    'public.seatres.status.<partition>' (see status_partitions) to this module.
+    Trains without state report for OFFLINE_TIMEOUT seconds are set offline.
+    The states of all trains are kept in a FleetStateTable, see fleet().
+
+    Several replicas of this module share the partitions, see ShardCoordinator. A replica
+    giving up a partition sends the states of its trains to the new owner via
+    Nats subject 'seatres.monitor.handoff'. Reports of trains still using subject
+    'public.seatres.status' are forwarded to the subject of their partition.
+
+    Reports of several trains (system_status version 2, e.g. from a regional gateway)
+    are sent on subject 'public.seatres.status.batch' and forwarded split by partition
+    to 'public.seatres.status.<partition>.batch', see _state_batch_handler.
+
+    :param q: event q to place occurred events
+    :param replica_id: id of this replica, unique among the replicas
     """
 
-    def __init__(self, q):
+    def __init__(self, q, replica_id):
         self._nc = application_module_network_nats()
         self._q = q
-        self._state_report_codec = schema_load(__file__, "system_status")
-        self._trains = {}
+        self._state_report_codec = schema_registry.codec("system_status")
+        self._state_batch_codec = schema_registry.codec("system_status", 2)
+        self._handoff_codec = schema_registry.codec("seat_res_monitor_handoff")
+        self._fleet = FleetStateTable()
+        self._shards = ShardCoordinator(q, replica_id, self._acquire, self._release)
+        # partition -> nats subscription ids of the report and batch subjects
+        self._partition_subscription_ids = {}
+        # partition -> (time.monotonic() of receipt, hand-off) for partitions not owned yet
+        self._handoffs = {}
+        # heap of (deadline, row), at most one entry per train
+        self._deadlines = []
+        self._first_deadline_changed = asyncio.Event()
+        self._task = None
 
     async def start(self):
-        self._state_report_subscription_id = await self._nc.subscribe(
-            _state_report_subject, cb=self._state_report_handler
+        self._task = asyncio.create_task(run_task(_logger, self._q, self._offline_scheduler))
+        self._handoff_subscription_id = await self._nc.subscribe(
+            _handoff_subject, cb=self._handoff_handler
+        )
+        self._legacy_subscription_id = await self._nc.subscribe(
+            status_partitions.STATUS_SUBJECT,
+            cb=self._legacy_report_handler,
+            queue=_legacy_queue_group,
+        )
+        self._batch_subscription_id = await self._nc.subscribe(
+            status_partitions.BATCH_SUBJECT,
+            cb=self._batch_handler,
+            queue=_legacy_queue_group,
         )
+        await self._shards.start()
 
     async def stop(self):
-        await self._nc.unsubscribe(self._state_report_subscription_id)
-        for v in self._trains.values():
-            v.stop()
+        """
+        Stop the offline scheduler, hand the owned partitions over to the other replicas.
+        """
+        # first, a failing unsubscribe must not leave the scheduler running
+        self._task.cancel()
+        try:
+            await self._nc.unsubscribe(self._legacy_subscription_id)
+            await self._nc.unsubscribe(self._batch_subscription_id)
+            await self._shards.stop()
+        finally:
+            await self._nc.unsubscribe(self._handoff_subscription_id)
 
     async def add_train(self, train_id):
-        if train_id not in self._trains.keys():
-            v = SeatResTrainMonitor(train_id, self._q)
-            self._trains[train_id] = v
-            await v.start()
-        else:
-            v = self._trains[train_id]
-        return v
+        """
+        :return: row of <train_id> in the fleet state table
+        """
+        row = self._fleet.row(train_id)
+        if row is None:
+            row = self._fleet.add(train_id)
+            await self._send_online_event(row)
+        return row
 
     def trains(self):
-        return self._trains.values()
+        """
+        :return: list of (train id, combined state) of all trains
+        """
+        return self._fleet.states()
+
+    def fleet(self):
+        return self._fleet
+
+    async def _acquire(self, partitions):
+        for p in partitions:
+            self._partition_subscription_ids[p] = (
+                await self._nc.subscribe(
+                    status_partitions.partition_subject(p), cb=self._state_report_handler
+                ),
+                await self._nc.subscribe(
+                    status_partitions.partition_batch_subject(p),
+                    cb=functools.partial(self._state_batch_handler, p),
+                ),
+            )
+            received, handoff = self._handoffs.pop(p, (None, None))
+            if handoff is not None and time.monotonic() - received < MEMBER_TIMEOUT:
+                self._apply_handoff(handoff)
+
+    async def _release(self, partitions):
+        for p in partitions:
+            for subscription_id in self._partition_subscription_ids.pop(p):
+                await self._nc.unsubscribe(subscription_id)
+
+        f = self._fleet
+        trains = {p: [] for p in partitions}
+        for row, train_id in enumerate(f.train_ids):
+            p = status_partitions.partition(train_id)
+            if p in trains and f.state[row] != RELEASED:
+                trains[p].append(
+                    {
+                        "trainId": train_id,
+                        "state": f.state[row],
+                        "online": f.online[row],
+                        "lastReport": datetime.datetime.fromtimestamp(
+                            f.last_report[row], datetime.timezone.utc
+                        ),
+                    }
+                )
+                f.release(row)
+
+        for p, states in trains.items():
+            msg = {
+                "meta": {"version": b"\x01\x00\x00"},
+                "data": {"member": self._shards.member_id, "partition": p, "trains": states},
+            }
+            await self._nc.publish(_handoff_subject, schemaless_encode(msg, self._handoff_codec))
+        _logger.info(f"{sum(len(t) for t in trains.values())} trains handed off")
+
+    async def _handoff_handler(self, nats_msg):
+        """
+        Called when a NATS message is received on _handoff_subject
+        """
+        data = schemaless_decode(nats_msg.data, self._handoff_codec)["data"]
+        if data["member"] == self._shards.member_id:
+            return
+        if self._shards.owns(data["partition"]):
+            self._apply_handoff(data)
+        else:
+            # ownership not taken over yet
+            self._handoffs[data["partition"]] = (time.monotonic(), data)
+
+    def _apply_handoff(self, data):
+        f = self._fleet
+        now = time.time()
+        for t in data["trains"]:
+            last_report = t["lastReport"].timestamp()
+            row = f.row(t["trainId"])
+            if row is None:
+                row = f.add(t["trainId"])
+            elif f.state[row] != RELEASED and f.last_report[row] >= last_report:
+                # reported here meanwhile
+                continue
+            f.state[row] = t["state"]
+            f.online[row] = t["online"]
+            f.last_report[row] = last_report
+            if t["online"] == online_code("ONLINE"):
+                deadline = time.monotonic() + OFFLINE_TIMEOUT - (now - last_report)
+                f.deadline[row] = max(f.deadline[row], deadline)
+                self._schedule(row)
+        _logger.info(f"{len(data['trains'])} trains of partition {data['partition']} taken over")
+
+    async def _legacy_report_handler(self, nats_msg):
+        """
+        Called when a NATS message is received on status_partitions.STATUS_SUBJECT
+        """
+        msg = schemaless_decode(nats_msg.data, self._state_report_codec)
+        await self._nc.publish(
+            status_partitions.subject(msg["data"]["trainId"]),
+            nats_msg.data,
+            reply=nats_msg.reply,
+        )
+
+    async def _batch_handler(self, nats_msg):
+        """
+        Called when a NATS message is received on status_partitions.BATCH_SUBJECT
+        """
+        msg = schemaless_decode(nats_msg.data, self._state_batch_codec)
+        await self._forward_batch(msg, self._split_batch(msg["data"]))
+        if nats_msg.reply:
+            await self._nc.publish(nats_msg.reply, b"")
 
     async def _state_report_handler(self, nats_msg):
         """
-        Called when a NATS message is received on _state_report_subject
+        Called when a NATS message is received on the subject of an owned partition
         """
         reply_subject = nats_msg.reply
         msg = schemaless_decode(nats_msg.data, self._state_report_codec)
         _logger.debug(f"state report received msg {msg}")
 
-        train_id = msg["data"]["trainId"]
-        try:
-            v = self._trains[train_id]
-            await self._update_edge_state(v, msg)
-        except KeyError:
-            _logger.info(f"received state report from new train {train_id}")
-            v = await self.add_train(train_id)
-            await self._update_edge_state(v, msg)
+        await self._update_edge_states((msg["data"],))
 
         await self._nc.publish(reply_subject, b"")
 
-    async def _update_edge_state(self, v, msg):
-        try:
-            await v.update_edge_state(msg["data"]["status"])
-        except KeyError:
-            _logger.error(f"couldn't find [data][status] in {msg}")
+    async def _state_batch_handler(self, partition, nats_msg):
+        """
+        Called when a NATS message is received on the batch subject of owned <partition>
+
+        The reports are applied in one pass and answered with a single reply. Reports
+        of trains of other partitions are forwarded to their partitions.
+        """
+        msg = schemaless_decode(nats_msg.data, self._state_batch_codec)
+        _logger.debug(f"state report received for {len(msg['data'])} trains")
+        reports = self._split_batch(msg["data"])
+
+        await self._update_edge_states(reports.pop(partition, ()))
+        if len(reports) > 0:
+            _logger.warning(f"batch on partition {partition} contains trains of {len(reports)} other partitions")
+            await self._forward_batch(msg, reports)
+
+        # batches forwarded by _forward_batch are sent without reply subject
+        if nats_msg.reply:
+            await self._nc.publish(nats_msg.reply, b"")
+
+    @staticmethod
+    def _split_batch(reports):
+        """
+        :return: dict partition -> reports of <reports> of trains of that partition
+        """
+        by_partition = {}
+        for data in reports:
+            by_partition.setdefault(status_partitions.partition(data["trainId"]), []).append(data)
+        return by_partition
+
+    async def _forward_batch(self, msg, reports):
+        """
+        Send <reports> (partition -> reports) to the batch subjects of their partitions
+        """
+        for p, data in reports.items():
+            batch = {"meta": msg["meta"], "data": data}
+            await self._nc.publish(
+                status_partitions.partition_batch_subject(p),
+                schemaless_encode(batch, self._state_batch_codec),
+            )
+
+    async def _update_edge_states(self, reports):
+        f = self._fleet
+        now = time.time()
+        deadline = time.monotonic() + OFFLINE_TIMEOUT
+        for data in reports:
+            train_id = data["trainId"]
+            row = f.row(train_id)
+            if row is None:
+                _logger.info(f"received state report from new train {train_id}")
+                row = await self.add_train(train_id)
+
+            state = _status_codes.get(data["status"])
+            if state is None:
+                _logger.error(f"invalid status in state report {data}")
+                continue
+            f.state[row] = state
+            f.last_report[row] = now
+            f.deadline[row] = deadline
+            await self._set_online(row, online_code("ONLINE"))
+            self._schedule(row)
+
+    def _schedule(self, row):
+        f = self._fleet
+        if not f.scheduled[row]:
+            f.scheduled[row] = 1
+            entry = (f.deadline[row], row)
+            heapq.heappush(self._deadlines, entry)
+            if self._deadlines[0] is entry:
+                self._first_deadline_changed.set()
+
+    async def _set_online(self, row, online):
+        if self._fleet.online[row] != online:
+            self._fleet.online[row] = online
+            await self._send_online_event(row)
+
+    async def _send_online_event(self, row):
+        await self._q.put(
+            {
+                "time": datetime.datetime.now(),
+                "source": "Train-Online-Monitor",
+                "event": ONLINE_MESSAGES[self._fleet.online[row]],
+                "train_id": self._fleet.train_ids[row],
+            }
+        )
+
+    async def _offline_scheduler(self):
+        """
+        Set trains offline when their deadline has passed.
+
+        A state report only moves the deadline of the train. The heap entry is
+        corrected when it is due: O(log n) per deadline, no wakeups while no
+        deadline is due. Deadlines of reports are set to report time + OFFLINE_TIMEOUT,
+        they never become due before the first entry of the heap. Trains taken over
+        from another replica may, then the wait is started again.
+        """
+        while True:
+            self._first_deadline_changed.clear()
+            if len(self._deadlines) == 0:
+                await self._first_deadline_changed.wait()
+                continue
+
+            deadline, row = self._deadlines[0]
+            now = time.monotonic()
+            if deadline > now:
+                try:
+                    await asyncio.wait_for(self._first_deadline_changed.wait(), deadline - now)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._deadlines)
+            f = self._fleet
+            if f.state[row] == RELEASED:
+                f.scheduled[row] = 0
+            elif f.deadline[row] > now:
+                # reported meanwhile
+                heapq.heappush(self._deadlines, (f.deadline[row], row))
+            else:
+                f.scheduled[row] = 0
+                f.state[row] = code("OFFLINE")
+                await self._set_online(row, online_code("OFFLINE"))
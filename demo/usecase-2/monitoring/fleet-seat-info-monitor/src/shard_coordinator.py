@@ -0,0 +1,156 @@
+import asyncio
+import hashlib
+import logging
+import math
+import time
+
+from edgefarm_application.base.application_module import application_module_network_nats
+from edgefarm_application.base.avro import schemaless_decode, schemaless_encode
+
+from run_task import run_task
+import schema_registry
+import status_partitions
+
+_logger = logging.getLogger(__name__)
+
+_membership_subject = "seatres.monitor.members"
+
+HEARTBEAT_INTERVAL = 2  # seconds between two heartbeats of a replica
+MEMBER_TIMEOUT = 3 * HEARTBEAT_INTERVAL  # seconds without heartbeat until a replica is gone
+JOIN_WAIT = 1  # seconds to learn the running replicas before taking over partitions
+
+
+class ShardCoordinator:
+    """
+    Distributes the state report partitions (see status_partitions) over the running
+    fleet-seat-info-monitor replicas.
+
+    The replicas announce themselves on Nats subject 'seatres.monitor.members'. A partition
+    is owned by the replica with the highest hash of (replica, partition). All replicas
+    come to the same assignment without further coordination, and a joining or leaving
+    replica only moves its own share of the partitions.
+
+    :param q: event q to place occurred events
+    :param member_id: id of this replica, unique among the replicas
+    :param on_acquire: coroutine function called with the set of partitions taken over
+    :param on_release: coroutine function called with the set of partitions given up
+    """
+
+    def __init__(self, q, member_id, on_acquire, on_release):
+        self.member_id = member_id
+        self._nc = application_module_network_nats()
+        self._q = q
+        self._on_acquire = on_acquire
+        self._on_release = on_release
+        self._membership_codec = schema_registry.codec("seat_res_monitor_membership")
+        # member -> time.monotonic() of the last heartbeat
+        self._members = {member_id: math.inf}
+        self._owned = set()
+        self._joined = False
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    async def start(self):
+        self._membership_subscription_id = await self._nc.subscribe(
+            _membership_subject, cb=self._membership_handler
+        )
+        await self._announce("JOIN")
+        await asyncio.sleep(JOIN_WAIT)
+        self._joined = True
+        await self._rebalance()
+        self._task = asyncio.create_task(run_task(_logger, self._q, self._heartbeat))
+
+    async def stop(self):
+        """
+        Leave and give up all partitions.
+        """
+        self._joined = False
+        self._task.cancel()
+        await self._nc.unsubscribe(self._membership_subscription_id)
+        await self._announce("LEAVE")
+        async with self._lock:
+            released, self._owned = self._owned, set()
+            await self._on_release(released)
+
+    def owns(self, partition):
+        return partition in self._owned
+
+    def members(self):
+        return list(self._members)
+
+    def owner(self, partition):
+        """
+        :return: replica owning <partition>, as far as known to this replica
+        """
+        return max(self._members, key=lambda m: _score(m, partition))
+
+    async def _membership_handler(self, nats_msg):
+        """
+        Called when a NATS message is received on _membership_subject
+        """
+        data = schemaless_decode(nats_msg.data, self._membership_codec)["data"]
+        member = data["member"]
+        if member == self.member_id:
+            return
+
+        if data["event"] == "LEAVE":
+            _logger.info(f"replica {member} left")
+            changed = self._members.pop(member, None) is not None
+        else:
+            changed = member not in self._members
+            if changed:
+                _logger.info(f"replica {member} joined")
+            self._members[member] = time.monotonic()
+            if data["event"] == "JOIN":
+                # known to the joining replica before it takes over partitions
+                await self._announce("HEARTBEAT")
+
+        if changed:
+            await self._rebalance()
+
+    async def _heartbeat(self):
+        while True:
+            await self._announce("HEARTBEAT")
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+            now = time.monotonic()
+            gone = [m for m, t in self._members.items() if now - t > MEMBER_TIMEOUT]
+            if len(gone) > 0:
+                _logger.warning(f"replicas {gone} gone without leaving")
+                for m in gone:
+                    del self._members[m]
+                await self._rebalance()
+
+    async def _rebalance(self):
+        if not self._joined:
+            return
+        async with self._lock:
+            owned = {
+                p for p in range(status_partitions.PARTITIONS) if self.owner(p) == self.member_id
+            }
+            released = self._owned - owned
+            acquired = owned - self._owned
+            self._owned = owned
+            _logger.info(
+                f"{len(self._members)} replicas, owning {len(owned)} partitions "
+                f"({len(acquired)} acquired, {len(released)} released)"
+            )
+            if len(released) > 0:
+                await self._on_release(released)
+            if len(acquired) > 0:
+                await self._on_acquire(acquired)
+
+    async def _announce(self, event):
+        msg = {
+            "meta": {"version": b"\x01\x00\x00"},
+            "data": {"member": self.member_id, "event": event},
+        }
+        await self._nc.publish(
+            _membership_subject, schemaless_encode(msg, self._membership_codec)
+        )
+
+
+def _score(member, partition):
+    # rendezvous hashing, stable over restarts, unlike hash()
+    digest = hashlib.blake2b(f"{member}/{partition}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
@@ -0,0 +1,73 @@
+"""
+In-process stand-in for the NATS connection of the edgefarm SDK, so several
+collectors or coordinators can talk to each other in one test.
+"""
+import asyncio
+
+
+class Msg:
+    def __init__(self, subject, data, reply):
+        self.subject = subject
+        self.data = data
+        self.reply = reply
+
+
+class FakeBus:
+    def __init__(self):
+        # subscription id -> (subject, cb, queue, connection)
+        self._subscriptions = {}
+        self._next_id = 0
+        self._round_robin = 0
+        # (subject, data, reply) of all messages sent
+        self.published = []
+
+    def connect(self):
+        return FakeNats(self)
+
+    def deliver(self, subject, data, reply=""):
+        self.published.append((subject, data, reply))
+        groups = {}
+        for s, cb, queue, conn in list(self._subscriptions.values()):
+            if s != subject or not conn.connected:
+                continue
+            if queue:
+                groups.setdefault(queue, []).append(cb)
+            else:
+                asyncio.ensure_future(cb(Msg(subject, data, reply)))
+        # one subscriber per queue group
+        for cbs in groups.values():
+            self._round_robin += 1
+            asyncio.ensure_future(cbs[self._round_robin % len(cbs)](Msg(subject, data, reply)))
+
+    def replies(self, prefix="reply."):
+        return [s for s, _, _ in self.published if s.startswith(prefix)]
+
+
+class FakeNats:
+    """
+    :ivar connected: False drops all messages from and to this connection, like a
+    crashed process
+    """
+
+    def __init__(self, bus):
+        self._bus = bus
+        self.connected = True
+
+    async def subscribe(self, subject, cb=None, queue=""):
+        self._bus._next_id += 1
+        self._bus._subscriptions[self._bus._next_id] = (subject, cb, queue, self)
+        return self._bus._next_id
+
+    async def unsubscribe(self, subscription_id):
+        del self._bus._subscriptions[subscription_id]
+
+    async def publish(self, subject, data, reply=""):
+        if self.connected:
+            self._bus.deliver(subject, data, reply)
+
+
+async def settle(seconds=0.05):
+    """
+    Let the callbacks of the messages sent run.
+    """
+    await asyncio.sleep(seconds)
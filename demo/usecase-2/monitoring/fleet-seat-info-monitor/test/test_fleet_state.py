@@ -0,0 +1,66 @@
+import unittest
+
+from fleet_state import FleetStateTable, RELEASED, code, online_code
+
+
+class TestFleetStateTable(unittest.TestCase):
+    def setUp(self):
+        self.fleet = FleetStateTable()
+        for train_id in ("ICE 1", "ICE 2", "ICE 3", "ICE 4"):
+            self.fleet.add(train_id)
+
+    def set_state(self, train_id, state, online):
+        row = self.fleet.row(train_id)
+        self.fleet.state[row] = code(state)
+        self.fleet.online[row] = online_code(online)
+
+    def test_add(self):
+        f = self.fleet
+        self.assertEqual(len(f), 4)
+        self.assertEqual(f.row("ICE 3"), 2)
+        self.assertIsNone(f.row("ICE 5"))
+        self.assertEqual(f.add("ICE 5"), 4)
+        self.assertEqual(f.train_ids[4], "ICE 5")
+        self.assertEqual(f.states()[-1], ("ICE 5", "UNKNOWN"))
+        self.assertEqual((f.last_report[4], f.deadline[4], f.scheduled[4]), (0, 0, 0))
+
+    def test_queries(self):
+        self.set_state("ICE 1", "ONLINE-OK", "ONLINE")
+        self.set_state("ICE 2", "ONLINE-NOK", "ONLINE")
+        self.set_state("ICE 3", "OFFLINE", "OFFLINE")
+
+        f = self.fleet
+        self.assertEqual(
+            f.states(),
+            [("ICE 1", "ONLINE-OK"), ("ICE 2", "ONLINE-NOK"), ("ICE 3", "OFFLINE"), ("ICE 4", "UNKNOWN")],
+        )
+        self.assertEqual(
+            f.count_by_state(),
+            {"UNKNOWN": 1, "OFFLINE": 1, "ONLINE-UNKNOWN": 0, "ONLINE-NOK": 1, "ONLINE-OK": 1},
+        )
+        self.assertEqual(f.count_by_online_state(), {"UNKNOWN": 1, "OFFLINE": 1, "ONLINE": 2})
+        self.assertEqual(f.trains_in_state("ONLINE-NOK"), ["ICE 2"])
+        self.assertEqual(f.trains_in_state("ONLINE-UNKNOWN"), [])
+        self.assertEqual(f.offline_trains(), ["ICE 3"])
+
+    def test_find_all_rows(self):
+        for train_id in ("ICE 1", "ICE 3", "ICE 4"):
+            self.set_state(train_id, "OFFLINE", "OFFLINE")
+        self.assertEqual(self.fleet.offline_trains(), ["ICE 1", "ICE 3", "ICE 4"])
+        self.assertEqual(self.fleet.trains_in_state("OFFLINE"), ["ICE 1", "ICE 3", "ICE 4"])
+
+    def test_released_trains_are_left_out(self):
+        self.set_state("ICE 2", "OFFLINE", "OFFLINE")
+        f = self.fleet
+        f.release(f.row("ICE 2"))
+        self.assertEqual(f.state[1], RELEASED)
+        # the row is kept
+        self.assertEqual(f.row("ICE 2"), 1)
+        self.assertEqual([t for t, _ in f.states()], ["ICE 1", "ICE 3", "ICE 4"])
+        self.assertEqual(f.offline_trains(), [])
+        self.assertEqual(sum(f.count_by_state().values()), 3)
+        self.assertEqual(sum(f.count_by_online_state().values()), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import asyncio
+import unittest
+import zlib
+
+import pytest
+
+pytest.importorskip("edgefarm_application")
+
+from seat_res_ads_state_reporter import SeatResAdsStateReporter  # noqa: E402
+
+TRAINS = [f"ICE {i}" for i in range(40)]
+SLOTS = 4
+REFRESH_PERIODS = 3
+
+
+def refresh_phase(train):
+    return zlib.crc32(train.encode()) // SLOTS % REFRESH_PERIODS
+
+
+class RecordingProducer:
+    def __init__(self):
+        # (period, trainId, status, time) of the messages sent
+        self.sent = []
+        self.period = 0
+
+    async def encode_and_send(self, encoder, payload):
+        data = payload["data"]
+        self.sent.append((self.period, data["trainId"], data["status"], data["time"]))
+
+
+class TestSeatResAdsStateReporter(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.producer = RecordingProducer()
+        self.states = {t: "ONLINE-OK" for t in TRAINS}
+        # states applied at the start of a period: period -> {train: state}
+        self.changes = {}
+        self.reporter = SeatResAdsStateReporter(
+            asyncio.Queue(),
+            self.trains,
+            lambda: None,
+            period=0.02,
+            slots=SLOTS,
+            full_refresh_period=0.02 * REFRESH_PERIODS,
+            ads_producer=self.producer,
+        )
+        # the periods are driven by the tests
+        self.reporter.stop()
+
+    def trains(self):
+        # called once per period
+        self.producer.period += 1
+        self.states.update(self.changes.get(self.producer.period, {}))
+        return list(self.states.items())
+
+    async def run_periods(self, periods):
+        task = asyncio.create_task(self.reporter._reporter())
+        while self.producer.period <= periods:
+            await asyncio.sleep(0.005)
+        task.cancel()
+        return [s for s in self.producer.sent if s[0] <= periods]
+
+    async def test_slots(self):
+        sent = await self.run_periods(1)
+        self.assertCountEqual([s[1] for s in sent], TRAINS)
+
+        # sent slot by slot, the trains of a slot share the timestamp
+        slots = [zlib.crc32(s[1].encode()) % SLOTS for s in sent]
+        self.assertEqual(slots, sorted(slots))
+        times = {}
+        for slot, s in zip(slots, sent):
+            times.setdefault(slot, set()).add(s[3])
+        self.assertEqual([len(times[slot]) for slot in range(SLOTS)], [1] * SLOTS)
+        self.assertEqual([times[slot].pop() for slot in range(SLOTS)], sorted({s[3] for s in sent}))
+
+    async def test_unchanged_states_are_skipped(self):
+        self.changes = {2: {"ICE 1": "OFFLINE"}, 3: {"ICE 1": "ONLINE-OK"}}
+        sent = await self.run_periods(3)
+        changed = [(s[0], s[2]) for s in sent if s[1] == "ICE 1"]
+        self.assertEqual(changed, [(1, 1), (2, 0), (3, 1)])
+        # besides ICE 1, only the trains due for a full refresh in periods 2 and 3
+        refreshed = {(s[0], s[1]) for s in sent if s[0] > 1 and s[1] != "ICE 1"}
+        self.assertEqual(
+            refreshed,
+            {(p, t) for p in (2, 3) for t in TRAINS if t != "ICE 1" and refresh_phase(t) == p - 1},
+        )
+        self.assertGreaterEqual(self.reporter.counters["skipped"], 2 * (len(TRAINS) - 1) - len(refreshed))
+
+    async def test_full_refresh(self):
+        sent = await self.run_periods(1 + 2 * REFRESH_PERIODS)
+        # after the first period, each unchanged train is reported once per refresh period
+        for t in TRAINS:
+            periods = [s[0] for s in sent if s[1] == t and s[0] > 1]
+            with self.subTest(train=t):
+                self.assertEqual(len(periods), 2)
+                self.assertEqual(periods[1] - periods[0], REFRESH_PERIODS)
+                self.assertEqual((periods[0] - 1) % REFRESH_PERIODS, refresh_phase(t))
+        # spread over the periods
+        per_period = [len([s for s in sent if s[0] == p]) for p in range(2, 2 + REFRESH_PERIODS)]
+        self.assertTrue(all(0 < n < len(TRAINS) for n in per_period), per_period)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+import pytest
+
+pytest.importorskip("edgefarm_application")
+
+import shard_coordinator  # noqa: E402
+import status_partitions  # noqa: E402
+from shard_coordinator import ShardCoordinator  # noqa: E402
+from fake_nats import FakeBus, settle  # noqa: E402
+
+# heartbeat every 50 ms, replicas are gone after 200 ms
+FAST = dict(HEARTBEAT_INTERVAL=0.05, MEMBER_TIMEOUT=0.2, JOIN_WAIT=0.1)
+ALL = set(range(status_partitions.PARTITIONS))
+
+
+class TestShardCoordinator(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        patcher = patch.multiple(shard_coordinator, **FAST)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.bus = FakeBus()
+        self.coordinators = []
+
+    async def asyncTearDown(self):
+        for c in self.coordinators:
+            if c._joined:
+                await c.stop()
+
+    async def coordinator(self, member_id):
+        """
+        :return: started coordinator, its connection and the set of partitions it
+        announced as acquired and not released since
+        """
+        conn = self.bus.connect()
+        partitions = set()
+
+        async def on_acquire(acquired):
+            self.assertFalse(acquired & partitions)
+            partitions.update(acquired)
+
+        async def on_release(released):
+            self.assertLessEqual(released, partitions)
+            partitions.difference_update(released)
+
+        with patch.object(shard_coordinator, "application_module_network_nats", return_value=conn):
+            c = ShardCoordinator(asyncio.Queue(), member_id, on_acquire, on_release)
+        await c.start()
+        self.coordinators.append(c)
+        return c, conn, partitions
+
+    def assert_assignment(self, *coordinators):
+        """
+        every partition is owned by one of the <coordinators>, and all of them agree on it
+        """
+        owned = [{p for p in ALL if c.owns(p)} for c in coordinators]
+        self.assertEqual(set().union(*owned), ALL)
+        self.assertEqual(sum(len(o) for o in owned), len(ALL))
+        for c in coordinators:
+            self.assertEqual(sorted(c.members()), sorted(o.member_id for o in coordinators))
+            for p in ALL:
+                self.assertEqual(c.owner(p), coordinators[0].owner(p))
+
+    async def test_single_replica_owns_all(self):
+        a, _, partitions = await self.coordinator("a")
+        self.assertEqual(partitions, ALL)
+        self.assert_assignment(a)
+
+    async def test_join_and_leave(self):
+        a, _, a_partitions = await self.coordinator("a")
+        b, _, b_partitions = await self.coordinator("b")
+        await settle()
+        self.assert_assignment(a, b)
+        self.assertEqual(a_partitions, {p for p in ALL if a.owns(p)})
+        self.assertEqual(b_partitions, {p for p in ALL if b.owns(p)})
+        self.assertTrue(0 < len(b_partitions) < len(ALL))
+
+        await b.stop()
+        await settle()
+        self.assertEqual(a_partitions, ALL)
+        self.assertEqual(b_partitions, set())
+        self.assert_assignment(a)
+
+    async def test_join_moves_the_joiners_share_only(self):
+        a, _, _ = await self.coordinator("a")
+        b, _, _ = await self.coordinator("b")
+        await settle()
+        before = {p: a.owner(p) for p in ALL}
+
+        c, _, _ = await self.coordinator("c")
+        await settle()
+        self.assert_assignment(a, b, c)
+        for p in ALL:
+            self.assertIn(c.owner(p), (before[p], "c"))
+
+    async def test_crashed_replica_is_taken_over(self):
+        a, _, a_partitions = await self.coordinator("a")
+        b, b_conn, _ = await self.coordinator("b")
+        await settle()
+        self.assertNotEqual(a_partitions, ALL)
+
+        b_conn.connected = False
+        await settle(FAST["MEMBER_TIMEOUT"] + 2 * FAST["HEARTBEAT_INTERVAL"])
+        self.assertEqual(a_partitions, ALL)
+        self.assertEqual(a.members(), ["a"])
+
+
+if __name__ == "__main__":
+    unittest.main()
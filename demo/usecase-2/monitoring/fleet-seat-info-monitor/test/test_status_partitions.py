@@ -0,0 +1,27 @@
+import unittest
+
+import status_partitions
+
+
+class TestStatusPartitions(unittest.TestCase):
+    def test_partition_is_stable(self):
+        # crc32, not hash(): the same on every replica, train monitor and after restarts
+        self.assertEqual(status_partitions.partition("ICE 1"), 5)
+
+    def test_partitions_are_used_evenly(self):
+        counts = [0] * status_partitions.PARTITIONS
+        for i in range(6400):
+            counts[status_partitions.partition(f"ICE {i}")] += 1
+        self.assertGreater(min(counts), 50)
+        self.assertLess(max(counts), 150)
+
+    def test_subjects(self):
+        p = status_partitions.partition("ICE 1")
+        self.assertEqual(status_partitions.subject("ICE 1"), f"public.seatres.status.{p}")
+        self.assertEqual(status_partitions.partition_subject(7), "public.seatres.status.7")
+        self.assertEqual(status_partitions.partition_batch_subject(7), "public.seatres.status.7.batch")
+        self.assertNotIn(status_partitions.BATCH_SUBJECT, [status_partitions.partition_subject(p) for p in range(64)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,286 @@
+import asyncio
+import datetime
+import unittest
+from unittest.mock import patch
+
+import pytest
+
+pytest.importorskip("edgefarm_application")
+
+from edgefarm_application.base.avro import schemaless_encode  # noqa: E402
+
+import schema_registry  # noqa: E402
+import seat_res_train_monitor  # noqa: E402
+import shard_coordinator  # noqa: E402
+import status_partitions  # noqa: E402
+from seat_res_train_monitor import TrainStatusCollector  # noqa: E402
+from fake_nats import FakeBus, settle  # noqa: E402
+from test_shard_coordinator import FAST  # noqa: E402
+
+OFFLINE_TIMEOUT = 0.3
+TRAINS = [f"ICE {i}" for i in range(100)]
+
+
+class CollectorTestCase(unittest.IsolatedAsyncioTestCase):
+    """
+    Replicas of the collector connected by a FakeBus, with short timeouts.
+    """
+
+    async def asyncSetUp(self):
+        for module, values in (
+            (shard_coordinator, FAST),
+            (
+                seat_res_train_monitor,
+                dict(MEMBER_TIMEOUT=FAST["MEMBER_TIMEOUT"], OFFLINE_TIMEOUT=OFFLINE_TIMEOUT),
+            ),
+        ):
+            patcher = patch.multiple(module, **values)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.bus = FakeBus()
+        self.codec = schema_registry.codec("system_status")
+        self.collectors = []
+
+    async def asyncTearDown(self):
+        for c in self.collectors:
+            await c.stop()
+
+    async def collector(self, replica_id):
+        """
+        :return: started collector, its connection and its event q
+        """
+        conn = self.bus.connect()
+        q = asyncio.Queue()
+        with patch.object(
+            seat_res_train_monitor, "application_module_network_nats", return_value=conn
+        ), patch.object(shard_coordinator, "application_module_network_nats", return_value=conn):
+            c = TrainStatusCollector(q, replica_id)
+        await c.start()
+        self.collectors.append(c)
+        return c, conn, q
+
+    def report(self, train_id, status=1, subject=None, reply="reply.report"):
+        msg = {
+            "meta": {"version": b"\x01\x00\x00"},
+            "data": {
+                "time": datetime.datetime.now(),
+                "trainId": train_id,
+                "systemName": "SeatRes",
+                "status": status,
+            },
+        }
+        self.bus.deliver(
+            subject or status_partitions.subject(train_id), schemaless_encode(msg, self.codec), reply
+        )
+
+    def states(self, *collectors):
+        """
+        :return: dict train id -> state over all <collectors>, fails if a train is
+        tracked by more than one
+        """
+        states = {}
+        for c in collectors:
+            for train_id, state in c.trains():
+                self.assertNotIn(train_id, states)
+                states[train_id] = state
+        return states
+
+
+class TestHandoff(CollectorTestCase):
+    async def test_joining_replica_takes_over_states(self):
+        a, _, _ = await self.collector("a")
+        for train_id in TRAINS:
+            self.report(train_id, 1 if train_id != "ICE 7" else 0)
+        await settle()
+        self.assertEqual(len(a.trains()), len(TRAINS))
+
+        b, _, b_events = await self.collector("b")
+        await settle()
+        states = self.states(a, b)
+        self.assertEqual(set(states), set(TRAINS))
+        self.assertEqual(states["ICE 7"], "ONLINE-NOK")
+        self.assertEqual(list(states.values()).count("ONLINE-OK"), len(TRAINS) - 1)
+        self.assertTrue(0 < len(b.trains()) < len(TRAINS))
+        for train_id, _ in b.trains():
+            self.assertTrue(b._shards.owns(status_partitions.partition(train_id)))
+        # the trains are online already, no events
+        self.assertTrue(b_events.empty())
+
+        # and back
+        await b.stop()
+        self.collectors.remove(b)
+        await settle()
+        self.assertEqual(self.states(a), states)
+
+    async def test_reports_after_takeover_go_to_new_owner(self):
+        a, _, _ = await self.collector("a")
+        b, _, _ = await self.collector("b")
+        await settle()
+        for train_id in TRAINS:
+            self.report(train_id, -1)
+        await settle()
+        states = self.states(a, b)
+        self.assertEqual(set(states.values()), {"ONLINE-UNKNOWN"})
+        self.assertEqual(len(self.bus.replies("reply.report")), len(TRAINS))
+
+    async def test_legacy_subject_is_forwarded(self):
+        a, _, _ = await self.collector("a")
+        b, _, _ = await self.collector("b")
+        await settle()
+        for train_id in TRAINS:
+            self.report(train_id, subject=status_partitions.STATUS_SUBJECT)
+        await settle()
+        self.assertEqual(set(self.states(a, b)), set(TRAINS))
+        # the owner replies
+        self.assertEqual(len(self.bus.replies("reply.report")), len(TRAINS))
+
+    async def test_crashed_replica_trains_are_learnt_from_reports(self):
+        a, _, _ = await self.collector("a")
+        b, b_conn, _ = await self.collector("b")
+        await settle()
+        for train_id in TRAINS:
+            self.report(train_id)
+        await settle()
+
+        b_conn.connected = False
+        await settle(FAST["MEMBER_TIMEOUT"] + 2 * FAST["HEARTBEAT_INTERVAL"])
+        self.assertEqual(a._shards.members(), ["a"])
+        for train_id in TRAINS:
+            self.report(train_id)
+        await settle()
+        self.assertEqual(set(self.states(a)), set(TRAINS))
+
+
+class TestOfflineScheduler(CollectorTestCase):
+    def events(self, q):
+        events = []
+        while not q.empty():
+            e = q.get_nowait()
+            events.append((e["train_id"], e["event"]))
+        return events
+
+    async def test_train_without_reports_goes_offline(self):
+        c, _, q = await self.collector("a")
+        self.report("ICE 1")
+        self.report("ICE 2")
+        await settle()
+        self.assertEqual(
+            self.events(q),
+            [
+                ("ICE 1", "train state unknown"),
+                ("ICE 1", "train is online"),
+                ("ICE 2", "train state unknown"),
+                ("ICE 2", "train is online"),
+            ],
+        )
+
+        # ICE 1 keeps reporting
+        for _ in range(5):
+            await settle(OFFLINE_TIMEOUT / 3)
+            self.report("ICE 1")
+        await settle()
+        self.assertEqual(self.events(q), [("ICE 2", "train is offline")])
+        self.assertEqual(dict(c.trains()), {"ICE 1": "ONLINE-OK", "ICE 2": "OFFLINE"})
+        self.assertEqual(c.fleet().offline_trains(), ["ICE 2"])
+        # one heap entry per train at most
+        self.assertLessEqual(len(c._deadlines), 1)
+
+        self.report("ICE 2", 0)
+        await settle()
+        self.assertEqual(self.events(q), [("ICE 2", "train is online")])
+        self.assertEqual(dict(c.trains())["ICE 2"], "ONLINE-NOK")
+
+    async def test_no_deadlines_no_offline_events(self):
+        c, _, q = await self.collector("a")
+        await settle(OFFLINE_TIMEOUT * 2)
+        self.assertTrue(q.empty())
+        self.assertFalse(c._task.done())
+
+    async def test_stop_cancels_the_scheduler(self):
+        c, _, q = await self.collector("a")
+        self.report("ICE 1")
+        await settle()
+        self.events(q)
+
+        await c.stop()
+        self.collectors.remove(c)
+        await settle(OFFLINE_TIMEOUT * 2)
+        self.assertTrue(c._task.cancelled())
+        self.assertTrue(q.empty())
+
+
+class TestBatches(CollectorTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.batch_codec = schema_registry.codec("system_status", 2)
+
+    def batch(self, subject, statuses, reply="reply.batch"):
+        """
+        :param statuses: dict train id -> status
+        """
+        msg = {
+            "meta": {"version": b"\x02\x00\x00"},
+            "data": [
+                {
+                    "time": datetime.datetime.now(),
+                    "trainId": train_id,
+                    "systemName": "SeatRes",
+                    "status": status,
+                }
+                for train_id, status in statuses.items()
+            ],
+        }
+        self.bus.deliver(subject, schemaless_encode(msg, self.batch_codec), reply)
+
+    async def test_batch_is_split_by_partition(self):
+        a, _, _ = await self.collector("a")
+        b, _, _ = await self.collector("b")
+        await settle()
+        self.batch(status_partitions.BATCH_SUBJECT, {t: 1 for t in TRAINS})
+        await settle()
+
+        states = self.states(a, b)
+        self.assertEqual(set(states), set(TRAINS))
+        self.assertEqual(set(states.values()), {"ONLINE-OK"})
+        self.assertTrue(0 < len(a.trains()) < len(TRAINS))
+        # one reply for the batch, none for the parts
+        self.assertEqual(self.bus.replies(), ["reply.batch"])
+        parts = {status_partitions.partition_batch_subject(p) for p in range(status_partitions.PARTITIONS)}
+        parts = [s for s, _, _ in self.bus.published if s in parts]
+        self.assertEqual(len(parts), len({status_partitions.partition(t) for t in TRAINS}))
+
+    async def test_foreign_trains_are_forwarded(self):
+        a, _, _ = await self.collector("a")
+        b, _, _ = await self.collector("b")
+        await settle()
+        own = [t for t in TRAINS if a._shards.owns(status_partitions.partition(t))]
+        p = status_partitions.partition(own[0])
+        foreign = [t for t in TRAINS if b._shards.owns(status_partitions.partition(t))][:3]
+
+        self.batch(status_partitions.partition_batch_subject(p), {t: 0 for t in [own[0]] + foreign})
+        await settle()
+        self.assertEqual(self.states(a), {own[0]: "ONLINE-NOK"})
+        self.assertEqual(self.states(b), {t: "ONLINE-NOK" for t in foreign})
+        self.assertEqual(self.bus.replies(), ["reply.batch"])
+
+    async def test_invalid_status_is_skipped(self):
+        a, _, _ = await self.collector("a")
+        self.batch(status_partitions.BATCH_SUBJECT, {"ICE 1": 1, "ICE 2": 5, "ICE 3": -1})
+        await settle()
+        states = self.states(a)
+        self.assertEqual(states["ICE 1"], "ONLINE-OK")
+        self.assertEqual(states["ICE 3"], "ONLINE-UNKNOWN")
+        self.assertNotIn(states["ICE 2"], ("ONLINE-OK", "ONLINE-NOK"))
+
+    async def test_single_reports_and_batches_mixed(self):
+        a, _, _ = await self.collector("a")
+        self.report("ICE 1", 0)
+        self.batch(status_partitions.BATCH_SUBJECT, {"ICE 1": 1, "ICE 2": 1})
+        await settle()
+        self.report("ICE 2", 0)
+        await settle()
+        self.assertEqual(self.states(a), {"ICE 1": "ONLINE-OK", "ICE 2": "ONLINE-NOK"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,7 @@
 import logging
 
 import edgefarm_application as ef
-from schema_loader import schema_read
+import schema_registry
 
 _logger = logging.getLogger(__name__)
 
@@ -16,7 +16,7 @@ class AdsEventReporter:
         self._train_id_func = train_id_func
 
         # Create an encoder for an application specific payload
-        payload_schema = schema_read(__file__, "system_event")
+        payload_schema = schema_registry.schema("system_event")
         self._ads_encoder = ef.AdsEncoder(
             payload_schema,
             schema_name="system_event",
@@ -8,11 +8,15 @@ from pis_monitor import PisMonitor
 from seatres_state import SeatResStateReporter
 from ads_event_reporter import AdsEventReporter
 from train_id_provider import TrainIdProvider
+import schema_registry
 
 
 async def main():
     loop = asyncio.get_event_loop()
 
+    # parse all schemas before serving requests
+    schema_registry.prewarm(codecs=["system_status"], schemas=["system_event"])
+
     # Initialize EdgeFarm SDK
     if os.getenv("IOTEDGE_MODULEID") is not None:
         await ef.application_module_init_from_environment(loop)
@@ -7,18 +7,18 @@ from edgefarm_application.base.application_module import application_module_netw
 from edgefarm_application.base.avro import schemaless_encode
 
 from run_task import run_task
-from schema_loader import schema_load
+import schema_registry
+import status_partitions
 
 _logger = logging.getLogger(__name__)
 
-_state_report_subject = "public.seatres.status"
-
 
 class SeatResStateReporter:
     """
     Provides the status of the seat reservation system determined in the edge to
     the cloud module by periodically pushing the status on NATS subject
-    "public.seatres.status" using a req/reply NATS pattern.
+    "public.seatres.status.<partition>" (see status_partitions) using a req/reply
+    NATS pattern.
 
     The request is provided as a schemaless Avro binary using the system_status.avsc schema
     and the data fields set as follows
@@ -31,7 +31,7 @@ class SeatResStateReporter:
         self._train_id_func = train_id_func
         self._nc = application_module_network_nats()
         self._task = asyncio.create_task(run_task(_logger, q, self._reporter))
-        self._status_codec = schema_load(__file__, "system_status")
+        self._status_codec = schema_registry.codec("system_status")
 
     def stop(self):
         self._task.cancel()
@@ -61,7 +61,9 @@ class SeatResStateReporter:
 
                 try:
                     await self._nc.request(
-                        _state_report_subject, avro_binary, timeout=2
+                        status_partitions.subject(self._train_id_func()),
+                        avro_binary,
+                        timeout=2,
                     )
                     # response message is ignored
                 except (NatsError.NatsError, NatsError.ErrTimeout) as e:
@@ -1,24 +1,23 @@
 import os
 import signal
 import asyncio
-import nats.aio.errors as NatsError
 import json
+import logging
 
 from edgefarm_application.base.application_module import application_module_network_nats
 import edgefarm_application as ef
-from edgefarm_application.base.avro import schemaless_decode
-from edgefarm_application.base.avro import schemaless_encode
-from schema_loader import schema_load
+from seat_info_cache import SeatInfoCache
+import schema_registry
 
 
-# enable use of mqtt client and nats connection in seat_info_request_handler
+# enable use of mqtt client and seat info cache in seat_info_request_handler
 mqtt_client = None
-nc = None
+seat_info_cache = None
 
 mqtt_req_topic = "pis/req/seatRes"
 mqtt_res_topic = "pis/res/seatRes"
-# nats subject needs to start with `public.` to enable access to clound module
-nats_subject = "public.pis.seatRes"
+
+METRICS_INTERVAL = 60  # seconds between two cache metrics outputs
 
 
 async def seat_info_request_handler(msg):
@@ -27,56 +26,37 @@ async def seat_info_request_handler(msg):
     msg['payload'] is the MQTT message as received from MQTT. Here, the payload is
     a string containing the train ID.
 
-    This example encodes the data it into an seat_info_request avro message (see `../schemas/seat_info_request.avsc`).
-    The message is transmitted via nats request reply to the cloud module, which responses with a seat_info_response avro message (see `../schemas/seat_info_response.avsc`).
-    The received data contains the reserved seats and is replied to the MQTT topic `pis/res/seatRes`.
+    The seat reservations are taken from the on-train cache (see `seat_info_cache.py`), which
+    requests them from the cloud module via nats request reply with a seat_info_delta_request
+    avro message (see `../schemas/seat_info_delta_request.avsc`) if needed.
+    The seat reservations are replied to the MQTT topic `pis/res/seatRes`.
     """
 
-    # Generate payload with "seat_info_request" schema
     train = msg["payload"].decode("utf-8")
     print("Train ID: " + train)
 
-    seat_info_request = {
-        "train": train,
-    }
-
-    # Pass request to clound module
-    try:
-        response = await nc.request(
-            nats_subject,
-            schemaless_encode(
-                seat_info_request, schema_load(__file__, "seat_info_request")
-            ),
-            timeout=2,
-        )
-
-        m = schemaless_decode(
-            response.data, schema_load(__file__, "seat_info_response")
-        )
-        seat_reservations = []
-        for seat_info in m["seatReservations"]:
-            seat_reservations.append(
-                {
-                    "id": seat_info["id"],
-                    "startStation": seat_info["startStation"],
-                    "endStation": seat_info["endStation"],
-                }
-            )
-
-        print("Seat reservations received:")
-        print(seat_reservations)
-
-        # Send seat reservations response
-        json_dump = json.dumps(seat_reservations).encode()
-        await mqtt_client.publish(mqtt_res_topic, json_dump)
-    except (NatsError.NatsError, NatsError.ErrTimeout) as e:
-        print("error: " + str(e))
+    seat_reservations = await seat_info_cache.get(train)
+    if seat_reservations is not None:
+        await publish_seat_reservations(train, seat_reservations)
+
+
+async def publish_seat_reservations(train, seat_reservations):
+    print(f"Seat reservations of {train}:")
+    print(seat_reservations)
+
+    # Send seat reservations response
+    json_dump = json.dumps(seat_reservations).encode()
+    await mqtt_client.publish(mqtt_res_topic, json_dump)
 
 
 async def main():
-    global nc, mqtt_client
+    global mqtt_client, seat_info_cache
+    logging.basicConfig(level=logging.INFO)
     loop = asyncio.get_event_loop()
 
+    # parse all schemas before serving requests
+    schema_registry.prewarm(codecs=["seat_info_delta_request", "seat_info_delta_response"])
+
     # Initialize EdgeFarm SDK
     if os.getenv("IOTEDGE_MODULEID") is not None:
         await ef.application_module_init_from_environment(loop)
@@ -84,14 +64,19 @@ async def main():
         print("Warning: Running example outside IOTEDGE environment")
         await ef.application_module_init(loop, "", "", "")
 
+    # Cache of the seat reservations, refreshed from the cloud module via nats
+    seat_info_cache = SeatInfoCache(
+        application_module_network_nats(),
+        os.getenv("SEAT_INFO_CACHE_FILE", "seat_info_cache.json") or None,
+        float(os.getenv("SEAT_INFO_CACHE_TTL", "30")),
+        on_refresh=publish_seat_reservations,
+    )
+
     # Connect to EdgeFarm service module mqtt-bridge and register the MQTT subjects
     mqtt_client = ef.AlmMqttModuleClient()
     print("Registering to " + mqtt_req_topic)
     await mqtt_client.subscribe(mqtt_req_topic, seat_info_request_handler)
 
-    # # Get nats connection
-    nc = application_module_network_nats()
-
     #
     # The following shuts down gracefully when SIGINT or SIGTERM is received
     #
@@ -103,11 +88,17 @@ async def main():
     for sig in ("SIGINT", "SIGTERM"):
         loop.add_signal_handler(getattr(signal, sig), signal_handler)
 
+    seconds = 0
     while not stop["stop"]:
         await asyncio.sleep(1)
+        seconds += 1
+        if seconds % METRICS_INTERVAL == 0:
+            print(f"seat info cache: {seat_info_cache.metrics()}")
+            print(f"schema registry: {dict(schema_registry.counters)}")
 
     print("Unsubscribing and shutting down...")
     await mqtt_client.close()
+    await seat_info_cache.close()
     await ef.application_module_term()
 
 
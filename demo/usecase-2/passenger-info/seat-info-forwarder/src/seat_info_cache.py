@@ -0,0 +1,179 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import Counter
+
+import nats.aio.errors as NatsError
+from edgefarm_application.base.avro import schemaless_decode, schemaless_encode
+
+import schema_registry
+
+_logger = logging.getLogger(__name__)
+
+# nats subject needs to start with `public.` to enable access to clound module
+nats_delta_subject = "public.pis.seatRes.delta"
+
+REQUEST_TIMEOUT = 2  # seconds to wait for the cloud module
+PERSIST_INTERVAL = 10  # seconds between two writes of the cache file
+
+
+class SeatInfoCache:
+    """
+    On-train cache of the seat reservations per train id.
+
+    Entries younger than <ttl> are served directly. Older entries are served as well,
+    while a refresh from the cloud module runs in the background, so the PIS gets
+    an answer even without connectivity. Refreshes send the data version of the
+    cached entry, the cloud module only sends changes.
+
+    The cache is written to <filename> and loaded from there on start.
+    """
+
+    def __init__(self, nc, filename, ttl, on_refresh=None):
+        """
+        :param nc: nats connection
+        :param filename: cache file, None: not persisted
+        :param ttl: seconds an entry is served without refresh
+        :param on_refresh: coroutine function called with (train, reservations) when
+        a background refresh changed the reservations
+        """
+        self._nc = nc
+        self._filename = filename
+        self._ttl = ttl
+        self._on_refresh = on_refresh
+        self._request_codec = schema_registry.codec("seat_info_delta_request")
+        self._response_codec = schema_registry.codec("seat_info_delta_response")
+        # train -> {"reservations": [...], "dataVersion": int, "time": fetch time}
+        self._entries = self._load()
+        self._refreshes = {}
+        self._dirty = False
+        self.counters = Counter()
+        self._max_staleness = 0
+        self._task = asyncio.create_task(self._persist_periodically())
+
+    async def get(self, train):
+        """
+        :return: reservations of <train>, None if not cached and not available from
+        the cloud module
+        """
+        entry = self._entries.get(train)
+        if entry is None:
+            self.counters["misses"] += 1
+            try:
+                return await self._refresh(train)
+            except (NatsError.NatsError, NatsError.ErrTimeout) as e:
+                _logger.error(f"seat info of train {train} not available: {e}")
+                return None
+
+        age = time.time() - entry["time"]
+        if age < self._ttl:
+            self.counters["hits"] += 1
+        else:
+            self.counters["stale"] += 1
+            self._max_staleness = max(self._max_staleness, age)
+            if train not in self._refreshes:
+                task = asyncio.create_task(self._refresh_in_background(train))
+                self._refreshes[train] = task
+                task.add_done_callback(lambda t: self._refreshes.pop(train, None))
+        return entry["reservations"]
+
+    def metrics(self):
+        """
+        Metrics since the last call.
+        :return: dict with hits (fresh), stale, misses, refresh errors, the maximum
+        age in s of a stale entry served and the number of cached trains
+        """
+        m = {
+            "hits": self.counters["hits"],
+            "stale": self.counters["stale"],
+            "misses": self.counters["misses"],
+            "refresh_errors": self.counters["refresh_errors"],
+            "max_staleness_s": self._max_staleness,
+            "trains": len(self._entries),
+        }
+        self.counters.clear()
+        self._max_staleness = 0
+        return m
+
+    async def close(self):
+        self._task.cancel()
+        for task in list(self._refreshes.values()):
+            task.cancel()
+        self._persist()
+
+    async def _refresh_in_background(self, train):
+        old = self._entries[train]["reservations"]
+        try:
+            reservations = await self._refresh(train)
+        except (NatsError.NatsError, NatsError.ErrTimeout) as e:
+            self.counters["refresh_errors"] += 1
+            _logger.warning(f"refresh of train {train} failed, serving cached data: {e}")
+            return
+        if reservations != old and self._on_refresh is not None:
+            await self._on_refresh(train, reservations)
+
+    async def _refresh(self, train):
+        entry = self._entries.get(train)
+        request = {
+            "meta": {"version": b"\x01\x00\x00"},
+            "data": {"train": train, "dataVersion": entry["dataVersion"] if entry else 0},
+        }
+        response = await self._nc.request(
+            nats_delta_subject,
+            schemaless_encode(request, self._request_codec),
+            timeout=REQUEST_TIMEOUT,
+        )
+        data = schemaless_decode(response.data, self._response_codec)["data"]
+
+        if data["kind"] == "NOT_MODIFIED" and entry is not None:
+            reservations = entry["reservations"]
+        elif data["kind"] == "DELTA" and entry is not None:
+            removed = {_key(r) for r in data["removed"]}
+            reservations = [r for r in entry["reservations"] if _key(r) not in removed]
+            reservations += data["added"]
+        else:
+            reservations = data["added"]
+
+        self._entries[train] = {
+            "reservations": reservations,
+            "dataVersion": data["dataVersion"],
+            "time": time.time(),
+        }
+        self._dirty = True
+        return reservations
+
+    def _load(self):
+        if self._filename is None or not os.path.exists(self._filename):
+            return {}
+        try:
+            with open(self._filename) as f:
+                entries = json.load(f)
+            _logger.info(f"{len(entries)} trains loaded from {self._filename}")
+            return entries
+        except (OSError, ValueError) as e:
+            _logger.error(f"cannot load seat info cache {self._filename}: {e}")
+            return {}
+
+    async def _persist_periodically(self):
+        while True:
+            await asyncio.sleep(PERSIST_INTERVAL)
+            self._persist()
+
+    def _persist(self):
+        if self._filename is None or not self._dirty:
+            return
+        # replace as a whole, a crash while writing doesn't destroy the former file
+        tmp = self._filename + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp, self._filename)
+            self._dirty = False
+        except OSError as e:
+            _logger.error(f"cannot write seat info cache {self._filename}: {e}")
+
+
+def _key(reservation):
+    return reservation["id"], reservation["startStation"], reservation["endStation"]
@@ -0,0 +1,196 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+import pytest
+
+pytest.importorskip("edgefarm_application")
+
+import nats.aio.errors as NatsError  # noqa: E402
+from edgefarm_application.base.avro import schemaless_decode, schemaless_encode  # noqa: E402
+
+import schema_registry  # noqa: E402
+from seat_info_cache import SeatInfoCache  # noqa: E402
+
+
+def reservation(i, start="BONN", end="KÖLN"):
+    return {"id": i, "startStation": start, "endStation": end}
+
+
+class Msg:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeNats:
+    """
+    Answers delta requests with the queued responses, an exception in the queue is
+    raised instead.
+    """
+
+    def __init__(self):
+        self.responses = []
+        # data of the requests received
+        self.requests = []
+        # set: requests wait until it is set
+        self.release = None
+
+    def respond(self, kind, version, added=(), removed=()):
+        self.responses.append(
+            {"dataVersion": version, "kind": kind, "added": list(added), "removed": list(removed)}
+        )
+
+    async def request(self, subject, data, timeout=None):
+        self.requests.append(schemaless_decode(data, schema_registry.codec("seat_info_delta_request"))["data"])
+        if self.release is not None:
+            await self.release.wait()
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return Msg(
+            schemaless_encode(
+                {"meta": {"version": b"\x01\x00\x00"}, "data": response},
+                schema_registry.codec("seat_info_delta_response"),
+            )
+        )
+
+
+class TestSeatInfoCache(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmp.name, "cache.json")
+        self.nc = FakeNats()
+        self.refreshed = []
+        self.caches = []
+
+    async def asyncTearDown(self):
+        for c in self.caches:
+            await c.close()
+        self.tmp.cleanup()
+
+    def cache(self, filename=None):
+        async def on_refresh(train, reservations):
+            self.refreshed.append((train, reservations))
+
+        c = SeatInfoCache(self.nc, filename, ttl=60, on_refresh=on_refresh)
+        self.caches.append(c)
+        return c
+
+    def age(self, cache, train):
+        cache._entries[train]["time"] -= 120
+
+    async def test_fresh_hit(self):
+        cache = self.cache()
+        self.nc.respond("FULL", 1, added=[reservation(1)])
+        self.assertEqual(await cache.get("ICE 1"), [reservation(1)])
+        self.assertEqual(await cache.get("ICE 1"), [reservation(1)])
+        self.assertEqual(len(self.nc.requests), 1)
+        self.assertEqual((cache.counters["misses"], cache.counters["hits"]), (1, 1))
+
+    async def test_stale_hit_refreshes_once_in_background(self):
+        cache = self.cache()
+        self.nc.respond("FULL", 1, added=[reservation(1)])
+        await cache.get("ICE 1")
+        self.age(cache, "ICE 1")
+
+        self.nc.release = asyncio.Event()
+        self.nc.respond("DELTA", 2, added=[reservation(2)])
+        for _ in range(3):
+            self.assertEqual(await cache.get("ICE 1"), [reservation(1)])
+            await asyncio.sleep(0)
+        self.assertEqual(len(self.nc.requests), 2)
+        self.assertEqual(cache.counters["stale"], 3)
+
+        self.nc.release.set()
+        await asyncio.gather(*cache._refreshes.values())
+        self.assertEqual(self.refreshed, [("ICE 1", [reservation(1), reservation(2)])])
+        self.assertEqual(await cache.get("ICE 1"), [reservation(1), reservation(2)])
+        self.assertEqual(cache.counters["hits"], 1)
+
+    async def test_not_modified_refresh_keeps_reservations(self):
+        cache = self.cache()
+        self.nc.respond("FULL", 1, added=[reservation(1)])
+        await cache.get("ICE 1")
+        self.age(cache, "ICE 1")
+
+        self.nc.respond("NOT_MODIFIED", 1)
+        await cache.get("ICE 1")
+        await asyncio.gather(*cache._refreshes.values())
+        self.assertEqual(self.nc.requests[1]["dataVersion"], 1)
+        self.assertEqual(self.refreshed, [])
+        self.assertEqual(await cache.get("ICE 1"), [reservation(1)])
+
+    async def test_delta_merge(self):
+        cache = self.cache()
+        self.nc.respond("FULL", 1, added=[reservation(1), reservation(2), reservation(3, end="BONN")])
+        await cache.get("ICE 1")
+        self.age(cache, "ICE 1")
+
+        # seat 3 is removed for its former section and reserved for another one
+        self.nc.respond(
+            "DELTA",
+            2,
+            added=[reservation(3, start="KÖLN"), reservation(4)],
+            removed=[reservation(2), reservation(3, end="BONN")],
+        )
+        await cache.get("ICE 1")
+        await asyncio.gather(*cache._refreshes.values())
+        self.assertEqual(self.nc.requests[1], {"train": "ICE 1", "dataVersion": 1})
+        self.assertEqual(
+            await cache.get("ICE 1"), [reservation(1), reservation(3, start="KÖLN"), reservation(4)]
+        )
+        self.assertEqual(cache._entries["ICE 1"]["dataVersion"], 2)
+
+    async def test_restore_after_restart(self):
+        cache = self.cache(self.filename)
+        self.nc.respond("FULL", 5, added=[reservation(1)])
+        await cache.get("ICE 1")
+        await cache.close()
+
+        restarted = self.cache(self.filename)
+        self.assertEqual(await restarted.get("ICE 1"), [reservation(1)])
+        self.assertEqual(len(self.nc.requests), 1)
+        self.assertEqual(restarted.counters["hits"], 1)
+
+        # the version of the restored entry is sent on refresh
+        self.age(restarted, "ICE 1")
+        self.nc.respond("NOT_MODIFIED", 5)
+        await restarted.get("ICE 1")
+        await asyncio.gather(*restarted._refreshes.values())
+        self.assertEqual(self.nc.requests[1]["dataVersion"], 5)
+
+    async def test_corrupt_file_starts_empty(self):
+        with open(self.filename, "w") as f:
+            f.write('{"ICE 1": {"reserv')
+        cache = self.cache(self.filename)
+        self.nc.respond("FULL", 1, added=[reservation(1)])
+        self.assertEqual(await cache.get("ICE 1"), [reservation(1)])
+        self.assertEqual(cache.counters["misses"], 1)
+
+        # the next write replaces the corrupt file
+        await cache.close()
+        self.assertEqual(await self.cache(self.filename).get("ICE 1"), [reservation(1)])
+        self.assertEqual(len(self.nc.requests), 1)
+
+    async def test_request_failure(self):
+        cache = self.cache()
+        self.nc.responses.append(NatsError.ErrTimeout())
+        self.assertIsNone(await cache.get("ICE 1"))
+        self.assertNotIn("ICE 1", cache._entries)
+
+        self.nc.respond("FULL", 1, added=[reservation(1)])
+        await cache.get("ICE 1")
+        self.age(cache, "ICE 1")
+
+        # a failing refresh keeps serving the cached reservations
+        self.nc.responses.append(NatsError.ErrTimeout())
+        self.assertEqual(await cache.get("ICE 1"), [reservation(1)])
+        await asyncio.gather(*cache._refreshes.values())
+        self.assertEqual(cache._entries["ICE 1"]["reservations"], [reservation(1)])
+        self.assertEqual(cache.counters["refresh_errors"], 1)
+        self.assertEqual(self.refreshed, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
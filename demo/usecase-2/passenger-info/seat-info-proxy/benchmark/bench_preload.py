@@ -0,0 +1,118 @@
+"""
+Benchmark of the preload_db bulk load.
+
+Generates <records> seat reservations as csv and yaml file and loads them with
+bulk_load into the database. For comparison, a part of the data is also loaded the
+way preload_db did before: one ORM object per record, added to the session one by one.
+
+The database is a temporary sqlite file, set DATABASE_URI to benchmark another database.
+The seat_reservation table of that database is replaced!
+
+Run from seat-info-proxy:
+    PYTHONPATH=src/preload_db python benchmark/bench_preload.py --records 1000000
+"""
+import argparse
+import csv
+import logging
+import os
+import resource
+import tempfile
+import time
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+import bulk_load
+import models
+
+STATIONS = ["HAMBURG", "BREMEN", "ESSEN", "DUISBURG", "DÜSSELDORF", "KÖLN", "BONN", "KOBLENZ"]
+
+
+def generate(records, trains):
+    seats = max(records // trains, 1)
+    for i in range(records):
+        start = i % (len(STATIONS) - 1)
+        yield {
+            "trainid": f"ICE {i // seats % trains + 1}",
+            "seatid": i % seats + 1,
+            "startstation": STATIONS[start],
+            "endstation": STATIONS[start + 1 + i % (len(STATIONS) - 1 - start)],
+        }
+
+
+def write_csv(filename, records, trains):
+    with open(filename, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=bulk_load.FIELDS)
+        writer.writeheader()
+        writer.writerows(generate(records, trains))
+
+
+def write_yaml(filename, records, trains):
+    with open(filename, "w") as f:
+        f.write("---\n")
+        for i, r in enumerate(generate(records, trains)):
+            f.write(
+                f"- id: {i + 1}\n  trainid: {r['trainid']}\n  seatid: {r['seatid']}\n"
+                f"  startstation: {r['startstation']}\n  endstation: {r['endstation']}\n"
+            )
+
+
+def load_legacy(engine, records, trains):
+    # preload_db before the bulk load
+    models.SeatReservation.__table__.drop(engine, checkfirst=True)
+    models.SeatReservation.__table__.create(engine)
+    with Session(engine) as s:
+        for r in generate(records, trains):
+            s.add(models.SeatReservation(**r))
+        s.commit()
+
+
+def count(engine):
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(models.SeatReservation.__table__)).scalar()
+
+
+def timed(name, records, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    # the peak of the process so far: the formats are loaded one after the other, a
+    # reader holding the whole file would raise it
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(
+        f"{name:>12}: {records:>9} records in {elapsed:7.2f} s ({records / elapsed:>10,.0f} records/s), "
+        f"peak rss {rss // 1024} MB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="preload_db bulk load benchmark")
+    parser.add_argument("--records", type=int, default=1000000)
+    parser.add_argument("--trains", type=int, default=500)
+    parser.add_argument("--chunk-size", type=int, default=bulk_load.CHUNK_SIZE)
+    parser.add_argument("--legacy-records", type=int, default=20000, help="records loaded the former way, 0: skip")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_uri = os.getenv("DATABASE_URI", f"sqlite:///{tmp}/bench.db")
+        engine = bulk_load.open_engine(database_uri)
+        csv_file = os.path.join(tmp, "reservations.csv")
+        yaml_file = os.path.join(tmp, "reservations.yaml")
+        write_csv(csv_file, args.records, args.trains)
+        write_yaml(yaml_file, args.records, args.trains)
+
+        if args.legacy_records > 0:
+            timed("legacy (orm)", args.legacy_records, lambda: load_legacy(engine, args.legacy_records, args.trains))
+        for name, filename in (("csv", csv_file), ("yaml", yaml_file)):
+            timed(
+                name,
+                args.records,
+                lambda: bulk_load.load(engine, bulk_load.read_records(filename), args.chunk_size),
+            )
+            assert count(engine) == args.records
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,9 @@
-from datetime import datetime
-from sqlalchemy import select
+from collections import Counter, namedtuple
+from datetime import datetime, timedelta
+import time
+from sqlalchemy import bindparam, func, inspect, not_, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import create_async_engine
 
 import models
@@ -7,45 +11,353 @@ import logging
 
 
 _logger = logging.getLogger(__name__)
+
+# Rows changed up to this long before the newest seen change are read again on
+# incremental sync, covers transactions committing after a later one
+SYNC_OVERLAP = timedelta(seconds=30)
+
+# Every n-th sync reloads the whole table, catches rows deleted instead of flagged
+FULL_SYNC_INTERVAL = 720
+
+# time of the last successful refresh of the cached data
 _update = None
 
-# Session to the database to query the data from
-# SourceSession = None
+# Engine to the database to query the data from
 source_engine = None
 
-# Session to the database to store the cache in
-# DestSession = None
-# dest_engine = None
+# Cached seat reservations: trainid -> list of seat_reservation rows, ordered by id
+_trains = {}
+
+# Cached seat reservations: id -> seat_reservation row
+_rows = {}
+
+# ids of the cached seat reservations per trainid
+_train_ids = {}
+
+# newest updated_at seen in the table, None: next sync is a full reload
+_watermark = None
+
+# highest id seen in the table
+_max_id = 0
+
+# True if the table has the change tracking columns, None: not checked yet
+_incremental = None
+
+# number of successful syncs
+_syncs = 0
+
+# Functions called with the set of trainids whose reservations changed on sync
+_change_listeners = []
+
+# data version per trainid, increased on each change of the train's reservations.
+# Starts with the current time in us, versions of a restarted proxy don't match
+# the ones handed out before
+_versions = {}
+_base_version = time.time_ns() // 1000
+_last_version = _base_version
+
+# database access metrics since the last call of metrics()
+_metrics = Counter()
+
+Reservation = namedtuple(
+    "Reservation", ["id", "trainid", "seatid", "startstation", "endstation", "updated_at"]
+)
+
+_columns = (
+    models.SeatReservation.id,
+    models.SeatReservation.trainid,
+    models.SeatReservation.seatid,
+    models.SeatReservation.startstation,
+    models.SeatReservation.endstation,
+)
 
+# trainid lookup, built once: with the bound parameter the compiled statement is
+# taken from the statement cache (and prepared once per connection with asyncpg).
+# Key: True if deleted rows must be filtered
+_train_statements = {
+    False: select(*_columns)
+    .where(models.SeatReservation.trainid == bindparam("trainid"))
+    .order_by(models.SeatReservation.id),
+}
+_train_statements[True] = _train_statements[False].where(not_(models.SeatReservation.deleted))
 
-# Init database connections 'sqlite:///:memory:'
-async def init(source_db_uri, dest_db_uri):
+# lookup of several trains, as _train_statements
+_trains_statements = {
+    False: select(*_columns)
+    .where(models.SeatReservation.trainid.in_(bindparam("trainids", expanding=True)))
+    .order_by(models.SeatReservation.id),
+}
+_trains_statements[True] = _trains_statements[False].where(not_(models.SeatReservation.deleted))
 
-    # global SourceSession, DestSession, source_engine, dest_engine
+
+# Init database connection
+async def init(source_db_uri, pool_size=5, max_overflow=10, pool_timeout=30, echo=False):
+    """
+    :param pool_size: number of connections kept open
+    :param max_overflow: number of connections opened in addition under load
+    :param pool_timeout: seconds to wait for a free connection before giving up
+    :param echo: log all SQL statements
+    """
     global source_engine
-    source_engine = create_async_engine(source_db_uri, echo=True)
+    options = {}
+    if make_url(source_db_uri).get_backend_name() != "sqlite":
+        # sqlite doesn't pool connections
+        options = {
+            "pool_size": pool_size,
+            "max_overflow": max_overflow,
+            "pool_timeout": pool_timeout,
+        }
+    source_engine = create_async_engine(source_db_uri, echo=echo, **options)
+
+
+def subscribe_changes(listener):
+    """
+    Call <listener>(trainids) after each sync with the set of trains whose
+    reservations changed.
+    """
+    _change_listeners.append(listener)
+
+
+def loaded():
+    """
+    :return: True if get() is served from memory
+    """
+    return _update is not None
+
+
+def version(trainid):
+    """
+    :return: data version of the reservations of <trainid>, 0 if the cache is not loaded
+    """
+    if _update is None:
+        return 0
+    return _versions.get(trainid, _base_version)
+
+
+def has_reservations(trainid):
+    """
+    :return: True if the loaded cache holds seat reservations of <trainid>
+    """
+    return trainid in _trains
 
 
 async def get(trainid):
+    """
+    Get the seat reservations of <trainid>.
+    Served from memory once the cache is loaded, before that read from the database.
+    """
+    if _update is None:
+        _logger.debug("cache not loaded yet, reading from database")
+        return await _query(_train_statements[bool(_incremental)], {"trainid": trainid})
+    return _trains.get(trainid, [])
 
-    async with source_engine.connect() as conn:
 
-        # select a Result, which will be delivered with buffered
-        # results
-        result = await conn.execute(
-            select(models.SeatReservation).where(
-                models.SeatReservation.trainid == trainid
-            )
-        )
-        r = result.fetchall()
-        logging.debug(r)
-        return r
+async def get_many(trainids):
+    """
+    Get the seat reservations of several trains at once, see get().
+    :return: dict trainid -> list of seat reservations, for all <trainids>
+    """
+    if _update is None:
+        _logger.debug("cache not loaded yet, reading from database")
+        result = {t: [] for t in trainids}
+        rows = await _query(_trains_statements[bool(_incremental)], {"trainids": list(result)})
+        for row in rows:
+            result[row.trainid].append(row)
+        return result
+    return {t: _trains.get(t, []) for t in trainids}
 
 
-# Sync source and destination db seatreservation tables
 async def sync():
+    """
+    Bring the cached seat reservations up to date with the source db.
+
+    If the table has the change tracking columns (updated_at, deleted), only rows
+    changed since the last sync are read. Otherwise, on the first sync and every
+    FULL_SYNC_INTERVAL syncs the whole table is reloaded.
+
+    :return: time of the last successful refresh, None if never loaded
+    """
+    global _update, _incremental, _syncs
+    try:
+        if _incremental is None:
+            _incremental = await _has_change_tracking()
+            if not _incremental:
+                _logger.warning(
+                    "seat_reservation has no change tracking columns, reloading the whole table on each sync"
+                )
+        if _incremental and _watermark is not None and _syncs % FULL_SYNC_INTERVAL != 0:
+            changed, rows = await _sync_changes()
+        else:
+            changed, rows = await _sync_all()
+    except (SQLAlchemyError, OSError) as e:
+        _logger.error(f"cache synchronization failed, keeping data from {_update}: {e}")
+        return _update
 
-    global _update
+    _syncs += 1
     _update = datetime.now()
-    _logger.debug("cache syncronized.")
+    _set_versions(changed)
+    _logger.debug(
+        f"cache synchronized. {rows} rows read, {len(_trains)} trains, "
+        f"{len(changed)} changed"
+    )
+
+    if len(changed) > 0:
+        for listener in _change_listeners:
+            listener(changed)
     return _update
+
+
+def _set_versions(trainids):
+    global _last_version
+    _last_version += 1
+    for trainid in trainids:
+        _versions[trainid] = _last_version
+
+
+async def _sync_all():
+    """
+    Reload all seat reservations from the source db into memory.
+    :return: set of changed trainids, number of rows read
+    """
+    global _trains, _rows, _train_ids, _watermark, _max_id
+    statement = select(*_columns).order_by(models.SeatReservation.id)
+    watermark = None
+    if _incremental:
+        # before the rows, so no change is missed between the two queries
+        watermark = (await _query(select(func.max(models.SeatReservation.updated_at))))[0][0]
+        statement = statement.add_columns(models.SeatReservation.updated_at).where(
+            not_(models.SeatReservation.deleted)
+        )
+
+    rows = {}
+    train_ids = {}
+    for row in await _query(statement):
+        row = Reservation(*row) if _incremental else Reservation(*row, None)
+        rows[row.id] = row
+        train_ids.setdefault(row.trainid, []).append(row.id)
+    trains = {t: [rows[i] for i in ids] for t, ids in train_ids.items()}
+
+    changed = {
+        t for t in trains.keys() | _trains.keys() if trains.get(t) != _trains.get(t)
+    }
+
+    # replace as a whole, get() never sees a partly loaded cache
+    _trains = trains
+    _rows = rows
+    _train_ids = {t: set(ids) for t, ids in train_ids.items()}
+    _watermark = watermark if watermark is not None else datetime.min
+    _max_id = max(rows, default=0)
+    return changed, len(rows)
+
+
+async def _sync_changes():
+    """
+    Apply the rows changed since the last sync to the cached data.
+    :return: set of changed trainids, number of rows read
+    """
+    global _watermark, _max_id
+    since = _watermark - SYNC_OVERLAP if _watermark > datetime.min + SYNC_OVERLAP else _watermark
+
+    pending, max_id = (
+        await _query(
+            select(
+                select(func.count())
+                .where(models.SeatReservation.updated_at >= since)
+                .scalar_subquery(),
+                select(func.max(models.SeatReservation.id)).scalar_subquery(),
+            )
+        )
+    )[0]
+    # preload_db replaces the whole table: removed rows are not flagged as deleted and
+    # the ids start at 1 again. Otherwise the ids only grow.
+    if (max_id or 0) < _max_id:
+        _logger.info("seat_reservation was replaced, reloading all")
+        return await _sync_all()
+    if pending > len(_rows) // 2:
+        _logger.info(f"{pending} changed rows, reloading all")
+        return await _sync_all()
+
+    changes = await _query(
+        select(*_columns, models.SeatReservation.updated_at, models.SeatReservation.deleted)
+        .where(models.SeatReservation.updated_at >= since)
+        .order_by(models.SeatReservation.updated_at, models.SeatReservation.id)
+    )
+
+    changed = set()
+    for change in changes:
+        _watermark = max(_watermark, change.updated_at)
+        _max_id = max(_max_id, change.id)
+        row = None if change.deleted else Reservation(*change[:-1])
+        old = _rows.get(change.id)
+        if old == row:
+            # unchanged, read again because of SYNC_OVERLAP
+            continue
+        if old is not None:
+            del _rows[old.id]
+            _train_ids[old.trainid].discard(old.id)
+            changed.add(old.trainid)
+        if row is not None:
+            _rows[row.id] = row
+            _train_ids.setdefault(row.trainid, set()).add(row.id)
+            changed.add(row.trainid)
+
+    # rebuild the changed trains only, each replaced as a whole
+    for trainid in changed:
+        ids = _train_ids.get(trainid)
+        if ids:
+            _trains[trainid] = [_rows[i] for i in sorted(ids)]
+        else:
+            _train_ids.pop(trainid, None)
+            _trains.pop(trainid, None)
+    return changed, len(changes)
+
+
+async def _has_change_tracking():
+    def columns(conn):
+        return {c["name"] for c in inspect(conn).get_columns(models.SeatReservation.__tablename__)}
+
+    async with source_engine.connect() as conn:
+        return {"updated_at", "deleted"} <= await conn.run_sync(columns)
+
+
+def metrics():
+    """
+    Database access metrics since the last call.
+    :return: dict with number of queries, average and maximum time in ms waiting for a
+    pool connection and executing the queries, current pool status
+    """
+    global _metrics
+    m, _metrics = _metrics, Counter()
+    queries = max(m["queries"], 1)
+    return {
+        "queries": m["queries"],
+        "errors": m["errors"],
+        "pool_wait_ms_avg": m["pool_wait"] / queries * 1000,
+        "pool_wait_ms_max": m["pool_wait_max"] * 1000,
+        "query_ms_avg": m["query"] / queries * 1000,
+        "query_ms_max": m["query_max"] * 1000,
+        "pool": source_engine.pool.status() if source_engine is not None else None,
+    }
+
+
+async def _query(statement, params=None):
+    start = time.perf_counter()
+    try:
+        async with source_engine.connect() as conn:
+            acquired = time.perf_counter()
+
+            # select a Result, which will be delivered with buffered
+            # results
+            result = await conn.execute(statement, params)
+            rows = result.fetchall()
+    except Exception:
+        _metrics["errors"] += 1
+        raise
+    done = time.perf_counter()
+
+    _metrics["queries"] += 1
+    _metrics["pool_wait"] += acquired - start
+    _metrics["pool_wait_max"] = max(_metrics["pool_wait_max"], acquired - start)
+    _metrics["query"] += done - acquired
+    _metrics["query_max"] = max(_metrics["query_max"], done - acquired)
+    return rows
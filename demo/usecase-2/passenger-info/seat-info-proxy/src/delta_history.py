@@ -0,0 +1,65 @@
+from collections import OrderedDict
+
+VERSIONS = 8  # former data versions per train a delta response can refer to
+TRAINS = 10000  # trains with history, the least recently requested one is dropped beyond
+
+
+class DeltaHistory:
+    """
+    Seat reservations of the data versions handed out per train, to answer a client
+    holding one of them with the changes only.
+
+    Only trains with reservations get a history, requests for unknown train ids
+    don't grow it.
+    """
+
+    def __init__(self, versions=VERSIONS, trains=TRAINS):
+        self._versions = versions
+        self._trains = trains
+        # trainid -> OrderedDict data version -> set of (id, startStation, endStation),
+        # least recently requested train first
+        self._history = OrderedDict()
+
+    def __len__(self):
+        return len(self._history)
+
+    def delta(self, trainid, held, data_version, reservations):
+        """
+        :param held: data version the client holds, 0 if none
+        :param data_version: current data version of <trainid>, 0 if unknown
+        :param reservations: current seat reservations of <trainid>
+        :return: (kind, added, removed): NOT_MODIFIED if the client is up to date,
+        DELTA if <held> is known and the delta is smaller than the full set, else FULL
+        """
+        current = {_reservation_key(r) for r in reservations}
+        history = self._history.get(trainid)
+        if history is not None:
+            self._history.move_to_end(trainid)
+        elif data_version != 0 and len(reservations) > 0:
+            history = self._history[trainid] = OrderedDict()
+            while len(self._history) > self._trains:
+                self._history.popitem(last=False)
+        if history is not None and data_version != 0 and data_version not in history:
+            history[data_version] = current
+            while len(history) > self._versions:
+                history.popitem(last=False)
+
+        if held != 0 and held == data_version:
+            return "NOT_MODIFIED", [], []
+        if held != 0 and history is not None and held in history:
+            added = [r for r in reservations if _reservation_key(r) not in history[held]]
+            removed = [_reservation_dict(k) for k in history[held] - current]
+            if len(added) + len(removed) < len(reservations):
+                return "DELTA", added, removed
+        return "FULL", reservations, []
+
+    def drop(self, trainid):
+        self._history.pop(trainid, None)
+
+
+def _reservation_key(reservation):
+    return reservation["id"], reservation["startStation"], reservation["endStation"]
+
+
+def _reservation_dict(key):
+    return {"id": key[0], "startStation": key[1], "endStation": key[2]}
@@ -9,7 +9,7 @@ from nats import *  # noqa
 
 from edgefarm_application.base.avro import schemaless_decode, schemaless_encode
 
-import schema_loader
+import schema_registry
 
 __author__ = "Florian Reinhold"
 __copyright__ = "Ci4Rail GmbH"
@@ -60,11 +60,9 @@ async def main(args):
     args = parse_args(args)
     setup_logging(args.loglevel)
 
-    _timestamp_codec = schema_loader.schema_load(__file__, "timestamp")
-    _seat_info_request_codec = schema_loader.schema_load(__file__, "seat_info_request")
-    _seat_info_response_codec = schema_loader.schema_load(
-        __file__, "seat_info_response"
-    )
+    _timestamp_codec = schema_registry.codec("timestamp")
+    _seat_info_request_codec = schema_registry.codec("seat_info_request")
+    _seat_info_response_codec = schema_registry.codec("seat_info_response")
 
     nats_server = os.getenv("NATS_SERVER", "nats://localhost:4222")
 
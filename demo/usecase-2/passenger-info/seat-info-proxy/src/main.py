@@ -12,6 +12,7 @@ import edgefarm_application as ef
 from seat_info_proxy_service import SeatInfoProxyService
 
 import cache
+import schema_registry
 
 __author__ = "Florian Reinhold"
 __copyright__ = "Ci4Rail GmbH"
@@ -60,7 +61,26 @@ async def main(args):
 
     database_uri = os.getenv("DATABASE_URI", "sqlite:///seatinfos.db")
 
-    await cache.init(database_uri, "sqlite:///:memory:")
+    await cache.init(
+        database_uri,
+        pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        echo=os.getenv("DB_ECHO", "0") == "1",
+    )
+
+    # parse all schemas before serving requests
+    schema_registry.prewarm(
+        codecs=[
+            "timestamp",
+            "seat_info_request",
+            "seat_info_response",
+            "seat_info_batch_request",
+            "seat_info_batch_response",
+            "seat_info_delta_request",
+            "seat_info_delta_response",
+        ]
+    )
 
     # Initialize EdgeFarm SDK
     if os.getenv("IOTEDGE_MODULEID") is not None:
@@ -1,5 +1,5 @@
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Boolean, Column, DateTime, Integer, String, false, func
 
 Base = declarative_base()
 
@@ -8,10 +8,17 @@ class SeatReservation(Base):
     __tablename__ = "seat_reservation"
     __table_args__ = {"sqlite_autoincrement": True}
     id = Column(Integer, primary_key=True)
-    trainid = Column(String)
+    trainid = Column(String, index=True)
     seatid = Column(Integer)
     startstation = Column(String)
     endstation = Column(String)
+    # change tracking for the incremental cache sync of seat-info-proxy.
+    # Writers outside of SQLAlchemy must set updated_at on insert/update and
+    # flag removed reservations as deleted instead of deleting the row.
+    updated_at = Column(
+        DateTime, nullable=False, index=True, server_default=func.now(), onupdate=func.now()
+    )
+    deleted = Column(Boolean, nullable=False, default=False, server_default=false())
 
     def __repr__(self):
         return "<SeatReservation(trainid='{}', seatid='{}', startstation={}, endstation={})>".format(
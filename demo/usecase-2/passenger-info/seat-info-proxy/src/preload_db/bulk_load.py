@@ -0,0 +1,282 @@
+import csv
+import io
+import itertools
+import logging
+import os
+
+import yaml
+from sqlalchemy import MetaData, create_engine, event, text
+from sqlalchemy.schema import CreateTable
+
+import models
+
+_logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 10000  # records inserted at once
+STAGING_SUFFIX = "_load"  # table the data is loaded into before it replaces seat_reservation
+FIELDS = ("trainid", "seatid", "startstation", "endstation")
+SCALAR_CACHE_SIZE = 10000  # yaml scalar values kept for reuse while parsing
+
+# libyaml based loader if available, much faster on large files
+_YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def open_engine(database_uri):
+    """
+    Create an engine to <database_uri> that runs DDL inside the load transaction.
+    """
+    engine = create_engine(database_uri)
+    if engine.dialect.name == "sqlite":
+        # pysqlite commits before DDL statements by default. Let SQLAlchemy emit BEGIN,
+        # so the table swap is part of the transaction.
+        @event.listens_for(engine, "connect")
+        def _connect(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(engine, "begin")
+        def _begin(conn):
+            conn.exec_driver_sql("BEGIN")
+
+    return engine
+
+
+def read_records(filename):
+    """
+    Stream the seat reservations of a .yaml or .csv file.
+    :return: generator of dicts with the FIELDS
+    """
+    with open(filename, "r", newline="") as stream:
+        if os.path.splitext(filename)[1].lower() == ".csv":
+            yield from read_csv_records(stream)
+        else:
+            yield from read_yaml_records(stream)
+
+
+def read_csv_records(stream):
+    """
+    :param stream: csv with header line, containing at least the FIELDS columns
+    """
+    reader = csv.DictReader(stream)
+    missing = set(FIELDS) - set(reader.fieldnames or [])
+    if missing:
+        raise ValueError(f"missing csv columns {sorted(missing)}")
+    for entry in reader:
+        yield _record(entry)
+
+
+def read_yaml_records(stream):
+    """
+    Parse a yaml list of mappings one entry at a time, so memory use is bounded by the
+    largest entry, not by the file. Entries are composed from the parser events and
+    constructed like yaml.safe_load does, aliases to earlier entries included.
+
+    :param stream: yaml list of mappings as in seatreservations.yaml
+    """
+    loader = _YamlLoader(stream)
+    try:
+        yield from _yaml_records(iter(loader.get_event, None))
+    finally:
+        loader.dispose()
+
+
+def _yaml_records(events):
+    resolver = yaml.resolver.Resolver()
+    constructor = yaml.constructor.SafeConstructor()
+    anchors = {}
+
+    for ev in events:
+        if isinstance(ev, (yaml.StreamStartEvent, yaml.DocumentStartEvent)):
+            continue
+        if isinstance(ev, yaml.StreamEndEvent):
+            return
+        if isinstance(ev, yaml.SequenceStartEvent):
+            break
+        if (
+            isinstance(ev, yaml.ScalarEvent)
+            and _compose_node(ev, events, resolver, anchors).tag == "tag:yaml.org,2002:null"
+        ):
+            return
+        raise ValueError("yaml document is not a list of seat reservations")
+
+    scalars = {}
+    for i, ev in enumerate(events):
+        if isinstance(ev, yaml.SequenceEndEvent):
+            return
+        entry_events, flat = _entry_events(ev, events)
+        if flat:
+            # the usual entry, constructed without nodes. Plain scalars repeat a lot
+            # (trains, stations), their values are cached
+            if len(scalars) > SCALAR_CACHE_SIZE:
+                scalars.clear()
+            values = [_scalar(e, resolver, constructor, scalars) for e in entry_events[1:-1]]
+            entry = dict(zip(values[::2], values[1::2]))
+        else:
+            node = _compose_node(ev, iter(entry_events[1:]), resolver, anchors)
+            entry = constructor.construct_object(node, deep=True)
+            # don't keep the objects of all entries
+            constructor.constructed_objects.clear()
+        if not isinstance(entry, dict):
+            raise ValueError(f"seat reservation {i} is not a mapping: {entry}")
+        yield _record(entry)
+
+
+# nesting depth change per ev type
+_DEPTH = {
+    yaml.SequenceStartEvent: 1,
+    yaml.MappingStartEvent: 1,
+    yaml.SequenceEndEvent: -1,
+    yaml.MappingEndEvent: -1,
+}
+
+
+def _entry_events(ev, events):
+    """
+    :return: list of <ev> and the following events of <events> up to its end,
+    True if that's a mapping of untagged plain or quoted scalars without anchors and
+    merge keys
+    """
+    entry_events = [ev]
+    flat = type(ev) is yaml.MappingStartEvent and ev.anchor is None and ev.tag is None
+    depth = _DEPTH.get(type(ev), 0)
+    while depth > 0:
+        ev = next(events)
+        entry_events.append(ev)
+        if type(ev) is yaml.ScalarEvent:
+            flat = flat and ev.anchor is None and ev.tag is None
+        else:
+            depth += _DEPTH.get(type(ev), 0)
+            flat = flat and depth == 0
+    if flat:
+        flat = not any(e.value == "<<" and e.implicit[0] for e in entry_events[1:-1:2])
+    return entry_events, flat
+
+
+def _scalar(ev, resolver, constructor, cache):
+    key = (ev.value, ev.implicit)
+    value = cache.get(key, _scalar)
+    if value is _scalar:
+        tag = resolver.resolve(yaml.ScalarNode, ev.value, ev.implicit)
+        value = cache[key] = constructor.construct_object(yaml.ScalarNode(tag, ev.value))
+        constructor.constructed_objects.clear()
+    return value
+
+
+def _compose_node(ev, events, resolver, anchors):
+    """
+    :return: yaml node starting with <ev>, the following events are taken from <events>
+    """
+    if isinstance(ev, yaml.AliasEvent):
+        if ev.anchor not in anchors:
+            raise ValueError(f"undefined yaml alias {ev.anchor}")
+        return anchors[ev.anchor]
+
+    tag = ev.tag
+    if isinstance(ev, yaml.ScalarEvent):
+        if tag is None or tag == "!":
+            tag = resolver.resolve(yaml.ScalarNode, ev.value, ev.implicit)
+        node = yaml.ScalarNode(tag, ev.value, ev.start_mark, ev.end_mark, style=ev.style)
+    elif isinstance(ev, yaml.SequenceStartEvent):
+        if tag is None or tag == "!":
+            tag = resolver.resolve(yaml.SequenceNode, None, ev.implicit)
+        node = yaml.SequenceNode(tag, [], ev.start_mark, None, flow_style=ev.flow_style)
+        for child in events:
+            if isinstance(child, yaml.SequenceEndEvent):
+                break
+            node.value.append(_compose_node(child, events, resolver, anchors))
+    else:
+        if tag is None or tag == "!":
+            tag = resolver.resolve(yaml.MappingNode, None, ev.implicit)
+        node = yaml.MappingNode(tag, [], ev.start_mark, None, flow_style=ev.flow_style)
+        for key in events:
+            if isinstance(key, yaml.MappingEndEvent):
+                break
+            node.value.append(
+                (
+                    _compose_node(key, events, resolver, anchors),
+                    _compose_node(next(events), events, resolver, anchors),
+                )
+            )
+    if ev.anchor is not None:
+        anchors[ev.anchor] = node
+    return node
+
+
+def _record(entry):
+    for f in FIELDS:
+        if isinstance(entry.get(f), (list, dict)):
+            raise ValueError(f"{f} of seat reservation is not a single value: {entry}")
+    seatid = entry.get("seatid")
+    return {
+        "trainid": entry["trainid"],
+        "seatid": int(seatid) if seatid not in (None, "") else None,
+        "startstation": entry.get("startstation") or None,
+        "endstation": entry.get("endstation") or None,
+    }
+
+
+def load(engine, records, chunk_size=CHUNK_SIZE):
+    """
+    Replace the content of seat_reservation with <records>.
+
+    The records are inserted in chunks into a staging table, which then replaces
+    seat_reservation. Everything happens in one transaction: readers see either
+    the old or the complete new table.
+
+    :return: number of records loaded
+    """
+    table = models.SeatReservation.__table__
+    # same columns, indexes and options, index names derived from the staging table name
+    staging = table.to_metadata(MetaData(), name=table.name + STAGING_SUFFIX)
+    count = 0
+    with engine.begin() as conn:
+        staging.drop(conn, checkfirst=True)
+        # indexes are built after loading, that's faster than maintaining them per insert
+        conn.execute(CreateTable(staging))
+
+        records = iter(records)
+        while True:
+            chunk = list(itertools.islice(records, chunk_size))
+            if len(chunk) == 0:
+                break
+            _insert(conn, staging, chunk)
+            count += len(chunk)
+            _logger.debug(f"{count} records inserted")
+
+        _logger.info(f"Replacing {table.name} with {count} records...")
+        _swap(conn, staging, table)
+    return count
+
+
+def _insert(conn, table, chunk):
+    if conn.dialect.name == "postgresql":
+        # COPY is considerably faster than multi row INSERTs
+        buf = io.StringIO()
+        csv.writer(buf).writerows([[r[f] for f in FIELDS] for r in chunk])
+        buf.seek(0)
+        with conn.connection.cursor() as cursor:
+            cursor.copy_expert(f"COPY {table.name} ({', '.join(FIELDS)}) FROM STDIN WITH CSV", buf)
+    else:
+        # executemany
+        conn.execute(table.insert(), chunk)
+
+
+def _swap(conn, staging, table):
+    if conn.dialect.name == "postgresql":
+        # build the indexes before taking the lock on the old table, renamed below
+        for index in staging.indexes:
+            index.create(conn)
+
+    table.drop(conn, checkfirst=True)
+    conn.execute(text(f"ALTER TABLE {staging.name} RENAME TO {table.name}"))
+
+    if conn.dialect.name == "postgresql":
+        # the next load creates the staging table again, free all names derived from it
+        for index in staging.indexes:
+            name = index.name.replace(staging.name, table.name, 1)
+            conn.execute(text(f"ALTER INDEX {index.name} RENAME TO {name}"))
+        conn.execute(text(f"ALTER TABLE {table.name} RENAME CONSTRAINT {staging.name}_pkey TO {table.name}_pkey"))
+        conn.execute(text(f"ALTER SEQUENCE {staging.name}_id_seq RENAME TO {table.name}_id_seq"))
+    else:
+        # no ALTER INDEX ... RENAME, build the indexes on the final table
+        for index in table.indexes:
+            index.create(conn)
@@ -3,16 +3,10 @@ import logging
 import sys
 import os
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.exc import ProgrammingError, OperationalError
-
-import models
+import bulk_load
 
 from seat_info_proxy import __version__
 
-import yaml
-
 __author__ = "Florian Reinhold"
 __copyright__ = "Ci4Rail GmbH"
 __license__ = "MIT"
@@ -50,7 +44,13 @@ def parse_args(args):
         "--file",
         dest="filename",
         required=True,
-        help="input yaml"
+        help="input yaml or csv (.csv) with the columns trainid, seatid, startstation, endstation"
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=bulk_load.CHUNK_SIZE,
+        help="records inserted at once (default: %(default)s)"
     )
 
     return parser.parse_args(args)
@@ -77,53 +77,17 @@ def main(args):
     database_uri = os.getenv("DATABASE_URI", "sqlite:///seatinfos.db")
 
     # Connect to db
-    engine = create_engine(database_uri)
-
-    # Create the session
-    session = sessionmaker()
-    session.configure(bind=engine)
-    s = session()
-
-    # Delete Table
-    _logger.info("Cleanup table...")
-    try:
-        models.SeatReservation.__table__.drop(engine)
-    except ProgrammingError:
-        _logger.info("No table to clean up")
-    except OperationalError:
-        _logger.info("No table to clean up")
-
-    # Create Table
-    _logger.info("(Re-)creating table...")
-    models.SeatReservation.__table__.create(engine)
-
-    _logger.info("Loading json...")
-    with open(args.filename, 'r') as stream:
-        try:
-            data = yaml.safe_load(stream)
-        except yaml.YAMLError as exc:
-            _logger.error(exc)
+    engine = bulk_load.open_engine(database_uri)
 
+    _logger.info(f"Loading {args.filename}...")
     try:
-        _logger.info("Creating Records...")
-        for i in data:
-            record = models.SeatReservation(**{
-                'trainid': i["trainid"],
-                'seatid': i["seatid"],
-                'startstation': i["startstation"],
-                'endstation': i["endstation"]
-            })
-            print(record)
-            s.add(record)  # Add all the records
-        _logger.info("Attempt to commit all the records...")
-        s.commit()
+        count = bulk_load.load(engine, bulk_load.read_records(args.filename), args.chunk_size)
     except Exception as e:
         _logger.error("Errors while adding seatreservation data. Rollback.")
         _logger.error('Exception: ' + str(e))
-        s.rollback()
-    finally:
-        s.close()  # Close the connection
+        return
 
+    _logger.info(f"{count} seat reservations loaded")
     _logger.info("Done!")
 
 
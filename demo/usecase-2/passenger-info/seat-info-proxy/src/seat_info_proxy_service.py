@@ -1,18 +1,26 @@
 import asyncio
+from collections import Counter
 import logging
 
 from edgefarm_application.base.application_module import application_module_network_nats
 from edgefarm_application.base.avro import schemaless_decode, schemaless_encode
 
-from schema_loader import schema_load
+import schema_registry
+from delta_history import DeltaHistory
+from single_flight import SingleFlight
 import cache
 
 _logger = logging.getLogger(__name__)
 
 _proxy_status_subject = "seat_info_proxy.data_timestamp"
 _proxy_data_subject = "public.pis.seatRes"
+_proxy_batch_data_subject = "public.pis.seatRes.batch"
+_proxy_delta_data_subject = "public.pis.seatRes.delta"
 
 SYNC_RATE = 5
+METRICS_INTERVAL = 60  # seconds between two metrics log entries
+DEFAULT_MAX_PAYLOAD = 1024 * 1024  # if the server's max payload is not known
+BATCH_CHUNK_RESERVE = 1024  # bytes of max payload reserved for the batch response header
 
 
 async def run_task(logger, q, task_func):
@@ -33,49 +41,168 @@ class SeatInfoProxyService:
         self._nc = application_module_network_nats()
         self._q = q
         self._task = asyncio.create_task(run_task(_logger, q, self._run))
-        self._timestamp_codec = schema_load(__file__, "timestamp")
-        self._seat_info_request_codec = schema_load(__file__, "seat_info_request")
-        self._seat_info_response_codec = schema_load(__file__, "seat_info_response")
+        self._timestamp_codec = schema_registry.codec("timestamp")
+        self._seat_info_request_codec = schema_registry.codec("seat_info_request")
+        self._seat_info_response_codec = schema_registry.codec("seat_info_response")
+        self._seat_info_batch_request_codec = schema_registry.codec("seat_info_batch_request")
+        self._seat_info_batch_response_codec = schema_registry.codec("seat_info_batch_response")
+        self._seat_info_delta_request_codec = schema_registry.codec("seat_info_delta_request")
+        self._seat_info_delta_response_codec = schema_registry.codec("seat_info_delta_response")
         self._sync = 0
         self._lock = asyncio.Lock()
+        # encoded seat_info_response per trainid, dropped when the train's data changes
+        self._responses = {}
+        # reservations of the data versions handed out, for delta responses
+        self._history = DeltaHistory()
+        # concurrent requests for a train not in self._responses share one lookup
+        self._single_flight = SingleFlight()
+        self._lookups = set()
+        self._counters = Counter()
+        cache.subscribe_changes(self._invalidate_responses)
 
     def stop(self):
         self._task.cancel()
+        for task in self._lookups:
+            task.cancel()
 
     def state(self):
         return self._state.state
 
+    def counters(self):
+        """
+        :return: dict with the number of data requests, requests answered from the
+        response cache (hits), requests that shared a running lookup (coalesced),
+        trains with delta history
+        """
+        return {
+            **self._counters,
+            "coalesced": self._single_flight.counters["coalesced"],
+            "delta_history_trains": len(self._history),
+        }
+
     async def _run(self):
         await self._nc.subscribe(_proxy_status_subject, cb=self._handle_req_status)
         await self._nc.subscribe(_proxy_data_subject, cb=self._handle_req_data)
+        await self._nc.subscribe(_proxy_batch_data_subject, cb=self._handle_req_batch_data)
+        await self._nc.subscribe(_proxy_delta_data_subject, cb=self._handle_req_delta_data)
+        syncs = 0
         while True:
-            self._sync = await cache.sync()
+            sync = await cache.sync()
+            # None until the first load succeeded, the status keeps its initial time
+            if sync is not None:
+                self._sync = sync
+            syncs += 1
+            if syncs % (METRICS_INTERVAL // SYNC_RATE) == 0:
+                _logger.info(f"database metrics: {cache.metrics()}")
+                _logger.info(f"request counters: {self.counters()}")
+                _logger.info(f"schema registry counters: {dict(schema_registry.counters)}")
             await asyncio.sleep(SYNC_RATE)
 
     async def _handle_req_data(self, msg):
         _logger.debug("request appinfos received")
         request = schemaless_decode(msg.data, self._seat_info_request_codec)
         trainid = request["train"]
+
+        self._counters["requests"] += 1
+        response = self._responses.get(trainid)
+        if response is not None:
+            self._counters["hits"] += 1
+            await self._nc.publish(msg.reply, response)
+        else:
+            # don't block the subscription while looking up, further requests for
+            # the train join the running lookup
+            task = asyncio.create_task(self._reply_lookup(msg, trainid))
+            self._lookups.add(task)
+            task.add_done_callback(self._lookups.discard)
+
+    async def _reply_lookup(self, msg, trainid):
+        try:
+            response = await self._single_flight.do(
+                trainid, lambda: self._lookup_response(trainid)
+            )
+            await self._nc.publish(msg.reply, response)
+        except Exception:
+            _logger.exception(f"seat info request for train {trainid} failed")
+
+    async def _lookup_response(self, trainid):
+        # only data served from memory is covered by change notifications
+        cacheable = cache.loaded()
         result = await cache.get(trainid)
+        response = self._encode_response(result)
+        if cacheable and len(result) > 0:
+            self._responses[trainid] = response
+        return response
+
+    def _encode_response(self, result):
+        seat_info_response = {"seatReservations": _reservations(result)}
+        return schemaless_encode(seat_info_response, self._seat_info_response_codec)
+
+    async def _handle_req_batch_data(self, msg):
+        """
+        Reply the seat reservations of all requested trains. The response is split
+        into several messages, if it exceeds the max payload of the NATS server.
+        Clients must collect the messages on the reply subject until they have
+        got data.chunks messages.
+        """
+        _logger.debug("batch request appinfos received")
+        request = schemaless_decode(msg.data, self._seat_info_batch_request_codec)
+        # without duplicates, in requested order
+        trainids = list(dict.fromkeys(request["data"]["trains"]))
+        self._counters["batch_requests"] += 1
+        self._counters["batch_trains"] += len(trainids)
 
-        # Prepare seat info data
-        reservations = []
-        for row in result:
-            if row.startstation is not None and row.endstation is not None:
-                reservations.append(
-                    {
-                        "id": row.seatid,
-                        "startStation": row.startstation,
-                        "endStation": row.endstation,
-                    }
-                )
-
-        seat_info_response = {"seatReservations": reservations}
+        results = await cache.get_many(trainids)
+        trains = [
+            {"train": t, "seatReservations": _reservations(results[t])} for t in trainids
+        ]
+
+        max_payload = getattr(self._nc, "max_payload", None) or DEFAULT_MAX_PAYLOAD
+        chunks = _split(trains, max_payload - BATCH_CHUNK_RESERVE)
+        for i, chunk in enumerate(chunks):
+            response = {
+                "meta": {"version": b"\x01\x00\x00"},
+                "data": {"chunk": i, "chunks": len(chunks), "trains": chunk},
+            }
+            await self._nc.publish(
+                msg.reply, schemaless_encode(response, self._seat_info_batch_response_codec)
+            )
+
+    async def _handle_req_delta_data(self, msg):
+        """
+        Reply the seat reservations of a train relative to the data version the
+        client holds: NOT_MODIFIED, DELTA (added/removed reservations) if that
+        version is known and the delta is smaller than the full set, else FULL.
+        """
+        _logger.debug("delta request appinfos received")
+        request = schemaless_decode(msg.data, self._seat_info_delta_request_codec)
+        trainid = request["data"]["train"]
+        held = request["data"]["dataVersion"]
+        self._counters["delta_requests"] += 1
+
+        data_version = cache.version(trainid)
+        reservations = _reservations(await cache.get(trainid))
+        kind, added, removed = self._history.delta(trainid, held, data_version, reservations)
+        self._counters[f"delta_{kind.lower()}"] += 1
+
+        response = {
+            "meta": {"version": b"\x01\x00\x00"},
+            "data": {
+                "dataVersion": data_version,
+                "kind": kind,
+                "added": added,
+                "removed": removed,
+            },
+        }
         await self._nc.publish(
-            msg.reply,
-            schemaless_encode(seat_info_response, self._seat_info_response_codec),
+            msg.reply, schemaless_encode(response, self._seat_info_delta_response_codec)
         )
 
+    def _invalidate_responses(self, trainids):
+        for trainid in trainids:
+            self._responses.pop(trainid, None)
+            if not cache.has_reservations(trainid):
+                self._history.drop(trainid)
+
     async def _handle_req_status(self, msg):
         _logger.debug("request status received")
 
@@ -86,3 +213,58 @@ class SeatInfoProxyService:
         await self._nc.publish(
             msg.reply, schemaless_encode(status, self._timestamp_codec)
         )
+
+
+def _reservations(result):
+    # Prepare seat info data
+    reservations = []
+    for row in result:
+        if row.startstation is not None and row.endstation is not None:
+            reservations.append(
+                {
+                    "id": row.seatid,
+                    "startStation": row.startstation,
+                    "endStation": row.endstation,
+                }
+            )
+    return reservations
+
+
+def _encoded_size(train):
+    """
+    :return: avro encoded size of a trainSeatInfo record
+    """
+    reservations = train["seatReservations"]
+    # array: block count if not empty, items, end of array marker
+    size = _string_size(train["train"]) + (_long_size(len(reservations)) if reservations else 0) + 1
+    for r in reservations:
+        size += _long_size(r["id"]) + _string_size(r["startStation"]) + _string_size(r["endStation"])
+    return size
+
+
+def _string_size(s):
+    n = len(s.encode())
+    return _long_size(n) + n
+
+
+def _long_size(n):
+    # zig-zag encoded varint
+    return max(1, (((n << 1) ^ (n >> 63)).bit_length() + 6) // 7)
+
+
+def _split(trains, max_size):
+    """
+    :return: list of lists of trains, each below <max_size> encoded, at least one (empty) list
+    """
+    chunks = [[]]
+    size = 0
+    for train in trains:
+        train_size = _encoded_size(train)
+        if size + train_size > max_size and len(chunks[-1]) > 0:
+            chunks.append([])
+            size = 0
+        if train_size > max_size:
+            _logger.error(f"seat info of train {train['train']} exceeds max payload")
+        chunks[-1].append(train)
+        size += train_size
+    return chunks
@@ -0,0 +1,33 @@
+import asyncio
+from collections import Counter
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time. Concurrent calls for a key that is
+    already in flight wait for the running call and share its result (or exception).
+    """
+
+    def __init__(self):
+        self._in_flight = {}
+        # calls: number of do() calls, coalesced: calls that shared a running call
+        self.counters = Counter()
+
+    async def do(self, key, func):
+        """
+        :param func: coroutine function, called without arguments if no call for <key> is running
+        :return: result of func()
+        """
+        self.counters["calls"] += 1
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda t: self._in_flight.pop(key, None))
+        else:
+            self.counters["coalesced"] += 1
+        # a cancelled caller must not cancel the call the others wait for
+        return await asyncio.shield(task)
+
+    def in_flight(self):
+        return len(self._in_flight)
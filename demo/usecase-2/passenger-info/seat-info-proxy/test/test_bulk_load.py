@@ -0,0 +1,137 @@
+import io
+import itertools
+import os
+import tempfile
+import tracemalloc
+import unittest
+
+from sqlalchemy import func, inspect, select
+
+import bulk_load
+import models
+
+
+def records(yaml_text):
+    return list(bulk_load.read_yaml_records(io.StringIO(yaml_text)))
+
+
+class TestReadRecords(unittest.TestCase):
+    def test_yaml(self):
+        self.assertEqual(
+            records(
+                "---\n"
+                "- id: 1\n  trainid: ICE 1\n  seatid: 3\n  startstation: HAMBURG\n  endstation: KÖLN\n"
+                "- trainid: ICE 2\n  seatid:\n  startstation: BONN\n"
+            ),
+            [
+                {"trainid": "ICE 1", "seatid": 3, "startstation": "HAMBURG", "endstation": "KÖLN"},
+                {"trainid": "ICE 2", "seatid": None, "startstation": "BONN", "endstation": None},
+            ],
+        )
+
+    def test_yaml_nested_values_of_other_keys_are_ignored(self):
+        self.assertEqual(
+            records(
+                "- trainid: ICE 1\n  extra: [1, 2]\n  seatid: 1\n"
+                "- trainid: ICE 2\n  extra: {a: 1}\n  seatid: 2\n"
+            ),
+            [
+                {"trainid": "ICE 1", "seatid": 1, "startstation": None, "endstation": None},
+                {"trainid": "ICE 2", "seatid": 2, "startstation": None, "endstation": None},
+            ],
+        )
+
+    def test_yaml_aliases(self):
+        self.assertEqual(
+            records("- &r {trainid: ICE 1, seatid: 1, startstation: BONN}\n- *r\n"),
+            [{"trainid": "ICE 1", "seatid": 1, "startstation": "BONN", "endstation": None}] * 2,
+        )
+
+    def test_yaml_empty(self):
+        self.assertEqual(records(""), [])
+
+    def test_yaml_invalid(self):
+        for text in ("trainid: ICE 1\n", "- ICE 1\n", "- trainid: [ICE 1]\n"):
+            with self.subTest(text=text), self.assertRaises(ValueError):
+                records(text)
+
+    def test_yaml_is_streamed(self):
+        entry = "- trainid: ICE 1\n  seatid: 1\n  startstation: BONN\n  endstation: KÖLN\n"
+        stream = io.StringIO(entry * 100000)
+        first = list(itertools.islice(bulk_load.read_yaml_records(stream), 10))
+        self.assertEqual(len(first), 10)
+        # only the beginning of the file is parsed, not the whole document
+        self.assertLess(stream.tell(), len(entry) * 1000)
+
+    def test_yaml_memory_is_bounded(self):
+        entry = "- trainid: ICE 1\n  seatid: {}\n  startstation: BONN\n  endstation: KÖLN\n"
+
+        def peak(count):
+            stream = io.StringIO("".join(entry.format(i % 100) for i in range(count)))
+            tracemalloc.start()
+            try:
+                for _ in bulk_load.read_yaml_records(stream):
+                    pass
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        # ten times the entries, about the same memory
+        self.assertLess(peak(20000), 2 * peak(2000))
+
+    def test_csv(self):
+        self.assertEqual(
+            list(
+                bulk_load.read_csv_records(
+                    io.StringIO("trainid,seatid,startstation,endstation\nICE 1,3,HAMBURG,\n")
+                )
+            ),
+            [{"trainid": "ICE 1", "seatid": 3, "startstation": "HAMBURG", "endstation": None}],
+        )
+
+    def test_csv_missing_columns(self):
+        with self.assertRaises(ValueError):
+            list(bulk_load.read_csv_records(io.StringIO("trainid,seatid\nICE 1,3\n")))
+
+
+class TestLoad(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engine = bulk_load.open_engine(f"sqlite:///{os.path.join(self.tmp.name, 'test.db')}")
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmp.cleanup()
+
+    def rows(self):
+        table = models.SeatReservation.__table__
+        with self.engine.connect() as conn:
+            return conn.execute(select(table.c.id, table.c.trainid, table.c.seatid).order_by(table.c.id)).fetchall()
+
+    def test_load_replaces_table(self):
+        first = [{"trainid": "ICE 1", "seatid": i, "startstation": None, "endstation": None} for i in range(25)]
+        self.assertEqual(bulk_load.load(self.engine, first, chunk_size=10), 25)
+        self.assertEqual(len(self.rows()), 25)
+
+        second = [{"trainid": "ICE 2", "seatid": 1, "startstation": None, "endstation": None}]
+        self.assertEqual(bulk_load.load(self.engine, second), 1)
+        self.assertEqual(self.rows(), [(1, "ICE 2", 1)])
+
+        inspector = inspect(self.engine)
+        self.assertNotIn(models.SeatReservation.__tablename__ + bulk_load.STAGING_SUFFIX, inspector.get_table_names())
+        self.assertEqual(
+            {i["name"] for i in inspector.get_indexes(models.SeatReservation.__tablename__)},
+            {i.name for i in models.SeatReservation.__table__.indexes},
+        )
+
+    def test_change_tracking_columns_are_set(self):
+        bulk_load.load(self.engine, [{"trainid": "ICE 1", "seatid": 1, "startstation": None, "endstation": None}])
+        table = models.SeatReservation.__table__
+        with self.engine.connect() as conn:
+            updated_at, deleted = conn.execute(select(func.max(table.c.updated_at), func.max(table.c.deleted))).one()
+        self.assertIsNotNone(updated_at)
+        self.assertFalse(deleted)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,185 @@
+import importlib
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, insert, update
+
+import cache
+import models
+
+T0 = datetime(2021, 6, 1, 12, 0, 0)
+FILLER = 20  # unchanged reservations, keep the changes below the full reload threshold
+
+
+def reservation(trainid, seatid, updated_at=T0, **kwargs):
+    return dict(
+        trainid=trainid,
+        seatid=seatid,
+        startstation="HAMBURG",
+        endstation="KÖLN",
+        updated_at=updated_at,
+        **kwargs,
+    )
+
+
+class CacheTestCase(unittest.IsolatedAsyncioTestCase):
+    """
+    cache on an in-memory sqlite database, the module state is reset per test.
+    """
+
+    async def asyncSetUp(self):
+        importlib.reload(cache)
+        await cache.init("sqlite+aiosqlite:///:memory:")
+        self.changes = []
+        cache.subscribe_changes(self.changes.append)
+
+    async def asyncTearDown(self):
+        await cache.source_engine.dispose()
+
+    async def create_table(self, rows=()):
+        """
+        Create seat_reservation with <rows> (ids from 1 on) and FILLER reservations of train FILL.
+        """
+        async with cache.source_engine.begin() as conn:
+            await conn.run_sync(models.Base.metadata.create_all)
+        await self.insert(list(rows) + [reservation("FILL", 100 + i, T0 - timedelta(hours=1)) for i in range(FILLER)])
+
+    async def insert(self, rows):
+        if len(rows) > 0:
+            async with cache.source_engine.begin() as conn:
+                await conn.execute(insert(models.SeatReservation.__table__), list(rows))
+
+    async def update(self, id, **values):
+        async with cache.source_engine.begin() as conn:
+            await conn.execute(
+                update(models.SeatReservation.__table__)
+                .where(models.SeatReservation.id == id)
+                .values(**values)
+            )
+
+    async def seats(self, trainid):
+        return [r.seatid for r in await cache.get(trainid)]
+
+    def no_full_reload(self):
+        return patch.object(cache, "_sync_all", side_effect=AssertionError("full reload"))
+
+
+class TestCacheSync(CacheTestCase):
+    async def test_get_before_first_sync_reads_database(self):
+        await self.create_table([reservation("ICE 1", 1), reservation("ICE 2", 2)])
+        self.assertFalse(cache.loaded())
+        self.assertEqual(await self.seats("ICE 1"), [1])
+        self.assertEqual(cache.version("ICE 1"), 0)
+
+    async def test_first_sync_loads_all(self):
+        await self.create_table([reservation("ICE 1", 1), reservation("ICE 1", 2), reservation("ICE 2", 3)])
+        self.assertIsNotNone(await cache.sync())
+        self.assertTrue(cache.loaded())
+        self.assertEqual(await self.seats("ICE 1"), [1, 2])
+        self.assertEqual(await self.seats("ICE 2"), [3])
+        self.assertEqual(await self.seats("ICE 3"), [])
+        self.assertEqual(self.changes, [{"ICE 1", "ICE 2", "FILL"}])
+
+    async def test_incremental_sync_applies_changes(self):
+        await self.create_table([reservation("ICE 1", 1), reservation("ICE 1", 2), reservation("ICE 2", 3)])
+        await cache.sync()
+        version = cache.version("ICE 2")
+
+        # seat 2 moves to ICE 2, a new reservation for ICE 3
+        await self.update(2, trainid="ICE 2", updated_at=T0 + timedelta(seconds=5))
+        await self.insert([reservation("ICE 3", 4, T0 + timedelta(seconds=5))])
+        with self.no_full_reload():
+            await cache.sync()
+
+        self.assertEqual(await self.seats("ICE 1"), [1])
+        self.assertEqual(await self.seats("ICE 2"), [2, 3])
+        self.assertEqual(await self.seats("ICE 3"), [4])
+        self.assertEqual(self.changes[-1], {"ICE 1", "ICE 2", "ICE 3"})
+        self.assertGreater(cache.version("ICE 2"), version)
+
+    async def test_deleted_rows_are_removed(self):
+        await self.create_table([reservation("ICE 1", 1), reservation("ICE 1", 2), reservation("ICE 2", 3)])
+        await cache.sync()
+
+        await self.update(1, deleted=True, updated_at=T0 + timedelta(seconds=5))
+        await self.update(3, deleted=True, updated_at=T0 + timedelta(seconds=5))
+        with self.no_full_reload():
+            await cache.sync()
+
+        self.assertEqual(await self.seats("ICE 1"), [2])
+        self.assertEqual(await self.seats("ICE 2"), [])
+        self.assertEqual(self.changes[-1], {"ICE 1", "ICE 2"})
+
+    async def test_unchanged_rows_within_overlap_are_no_change(self):
+        await self.create_table([reservation("ICE 1", 1), reservation("ICE 2", 2), reservation("ICE 3", 3)])
+        await cache.sync()
+        version = cache.version("ICE 1")
+
+        # read again because of SYNC_OVERLAP, but equal to the cached rows
+        with self.no_full_reload():
+            await cache.sync()
+        self.assertEqual(len(self.changes), 1)
+        self.assertEqual(cache.version("ICE 1"), version)
+
+    async def test_sync_failure_keeps_data(self):
+        await self.create_table([reservation("ICE 1", 1)])
+        loaded = await cache.sync()
+        async with cache.source_engine.begin() as conn:
+            await conn.run_sync(models.Base.metadata.drop_all)
+
+        self.assertEqual(await cache.sync(), loaded)
+        self.assertEqual(await self.seats("ICE 1"), [1])
+        self.assertGreater(cache.metrics()["errors"], 0)
+
+    async def test_replaced_table_is_reloaded(self):
+        # preload_db swaps in a smaller table: ids from 1 on, old rows gone without deleted flag
+        await self.create_table([reservation("ICE 1", i) for i in range(200)])
+        await cache.sync()
+
+        async with cache.source_engine.begin() as conn:
+            await conn.run_sync(models.Base.metadata.drop_all)
+        await self.create_table([reservation("ICE 2", 1, T0 + timedelta(seconds=5))])
+        await cache.sync()
+
+        self.assertEqual(await self.seats("ICE 1"), [])
+        self.assertEqual(await self.seats("ICE 2"), [1])
+        self.assertEqual(len(await cache.get("FILL")), FILLER)
+        # new ids for the FILL reservations
+        self.assertEqual(self.changes[-1], {"ICE 1", "ICE 2", "FILL"})
+
+
+class TestCacheWithoutChangeTracking(CacheTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        # seat_reservation as created before updated_at and deleted were added
+        self.table = Table(
+            models.SeatReservation.__tablename__,
+            MetaData(),
+            Column("id", Integer, primary_key=True),
+            Column("trainid", String),
+            Column("seatid", Integer),
+            Column("startstation", String),
+            Column("endstation", String),
+        )
+        async with cache.source_engine.begin() as conn:
+            await conn.run_sync(self.table.metadata.create_all)
+            await conn.execute(
+                insert(self.table), [dict(trainid="ICE 1", seatid=1), dict(trainid="ICE 2", seatid=2)]
+            )
+
+    async def test_every_sync_reloads_all(self):
+        await cache.sync()
+        self.assertEqual(await self.seats("ICE 1"), [1])
+
+        async with cache.source_engine.begin() as conn:
+            await conn.execute(self.table.delete().where(self.table.c.id == 1))
+        await cache.sync()
+
+        self.assertEqual(await self.seats("ICE 1"), [])
+        self.assertEqual(await self.seats("ICE 2"), [2])
+        self.assertEqual(self.changes[-1], {"ICE 1"})
+
+
+if __name__ == "__main__":
+    unittest.main()
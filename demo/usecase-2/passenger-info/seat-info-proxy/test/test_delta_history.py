@@ -0,0 +1,69 @@
+import unittest
+
+from delta_history import DeltaHistory
+
+
+def seats(*ids):
+    return [{"id": i, "startStation": "HAMBURG", "endStation": "KÖLN"} for i in ids]
+
+
+class TestDeltaHistory(unittest.TestCase):
+    def test_first_request_is_full(self):
+        h = DeltaHistory()
+        self.assertEqual(h.delta("ICE 1", 0, 10, seats(1, 2)), ("FULL", seats(1, 2), []))
+
+    def test_not_modified(self):
+        h = DeltaHistory()
+        h.delta("ICE 1", 0, 10, seats(1, 2))
+        self.assertEqual(h.delta("ICE 1", 10, 10, seats(1, 2)), ("NOT_MODIFIED", [], []))
+
+    def test_delta_to_held_version(self):
+        h = DeltaHistory()
+        h.delta("ICE 1", 0, 10, seats(1, 2, 3, 4, 5))
+        self.assertEqual(
+            h.delta("ICE 1", 10, 11, seats(1, 2, 3, 4, 6)), ("DELTA", seats(6), seats(5))
+        )
+
+    def test_full_if_delta_not_smaller(self):
+        h = DeltaHistory()
+        h.delta("ICE 1", 0, 10, seats(1, 2))
+        self.assertEqual(h.delta("ICE 1", 10, 11, seats(3, 4)), ("FULL", seats(3, 4), []))
+
+    def test_full_if_held_version_unknown(self):
+        h = DeltaHistory(versions=2)
+        h.delta("ICE 1", 0, 10, seats(1, 2, 3))
+        h.delta("ICE 1", 0, 11, seats(1, 2, 3, 4))
+        h.delta("ICE 1", 0, 12, seats(1, 2, 3, 4, 5))
+        self.assertEqual(h.delta("ICE 1", 10, 12, seats(1, 2, 3, 4, 5))[0], "FULL")
+        self.assertEqual(h.delta("ICE 1", 11, 12, seats(1, 2, 3, 4, 5))[0], "DELTA")
+        self.assertEqual(h.delta("ICE 1", 99, 12, seats(1, 2, 3, 4, 5))[0], "FULL")
+
+    def test_unknown_trains_get_no_history(self):
+        h = DeltaHistory()
+        for i in range(1000):
+            self.assertEqual(h.delta(f"junk {i}", 0, 10, []), ("FULL", [], []))
+        # cache not loaded yet
+        h.delta("ICE 1", 0, 0, seats(1))
+        self.assertEqual(len(h), 0)
+
+    def test_least_recently_requested_train_dropped(self):
+        h = DeltaHistory(trains=2)
+        h.delta("ICE 1", 0, 10, seats(1, 2, 3))
+        h.delta("ICE 2", 0, 10, seats(1, 2, 3))
+        h.delta("ICE 1", 10, 10, seats(1, 2, 3))
+        h.delta("ICE 3", 0, 10, seats(1, 2, 3))
+        self.assertEqual(len(h), 2)
+        self.assertEqual(h.delta("ICE 2", 10, 11, seats(1, 2, 3, 4))[0], "FULL")
+        self.assertEqual(h.delta("ICE 3", 10, 11, seats(1, 2, 3, 4))[0], "DELTA")
+
+    def test_drop(self):
+        h = DeltaHistory()
+        h.delta("ICE 1", 0, 10, seats(1, 2, 3))
+        h.drop("ICE 1")
+        h.drop("ICE 2")
+        self.assertEqual(len(h), 0)
+        self.assertEqual(h.delta("ICE 1", 10, 11, seats(1, 2, 3, 4))[0], "FULL")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,224 @@
+import asyncio
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+
+pytest.importorskip("edgefarm_application")
+
+from edgefarm_application.base.avro import schemaless_decode, schemaless_encode  # noqa: E402
+
+import cache  # noqa: E402
+import schema_registry  # noqa: E402
+import seat_info_proxy_service  # noqa: E402
+from seat_info_proxy_service import SeatInfoProxyService  # noqa: E402
+from test_cache import CacheTestCase, T0, reservation  # noqa: E402
+
+
+class Msg:
+    def __init__(self, data, reply):
+        self.data = data
+        self.reply = reply
+
+
+class FakeNats:
+    def __init__(self):
+        # reply subject -> published payloads
+        self.published = {}
+
+    async def subscribe(self, subject, cb=None):
+        pass
+
+    async def publish(self, subject, data):
+        self.published.setdefault(subject, []).append(data)
+
+
+class TestSeatInfoProxyService(CacheTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.nc = FakeNats()
+        with patch.object(seat_info_proxy_service, "application_module_network_nats", return_value=self.nc):
+            self.service = SeatInfoProxyService(asyncio.Queue())
+        # the cache is synced by the tests
+        self.service.stop()
+        self.requests = 0
+
+    async def request(self, trainid):
+        """
+        :return: seat ids of the response
+        """
+        self.requests += 1
+        reply = f"reply.{self.requests}"
+        data = schemaless_encode({"train": trainid}, schema_registry.codec("seat_info_request"))
+        await self.service._handle_req_data(Msg(data, reply))
+        await asyncio.sleep(0.01)
+        response = schemaless_decode(self.nc.published[reply][0], schema_registry.codec("seat_info_response"))
+        return [r["id"] for r in response["seatReservations"]]
+
+    async def delta_request(self, trainid, held):
+        self.requests += 1
+        reply = f"reply.{self.requests}"
+        request = {"meta": {"version": b"\x01\x00\x00"}, "data": {"train": trainid, "dataVersion": held}}
+        data = schemaless_encode(request, schema_registry.codec("seat_info_delta_request"))
+        await self.service._handle_req_delta_data(Msg(data, reply))
+        return schemaless_decode(self.nc.published[reply][0], schema_registry.codec("seat_info_delta_response"))["data"]
+
+    async def test_response_is_cached_until_train_changes(self):
+        await self.create_table([reservation("ICE 1", 1), reservation("ICE 2", 2)])
+        await cache.sync()
+        self.assertEqual(await self.request("ICE 1"), [1])
+        self.assertEqual(await self.request("ICE 1"), [1])
+        self.assertEqual(self.service.counters()["hits"], 1)
+
+        # ICE 2 changes, the response of ICE 1 is kept
+        await self.update(2, seatid=3, updated_at=T0 + timedelta(seconds=5))
+        await cache.sync()
+        self.assertIn("ICE 1", self.service._responses)
+        self.assertEqual(await self.request("ICE 2"), [3])
+
+        await self.update(1, deleted=True, updated_at=T0 + timedelta(seconds=10))
+        await cache.sync()
+        self.assertEqual(await self.request("ICE 1"), [])
+        self.assertEqual(self.service.counters()["hits"], 1)
+
+    async def test_unknown_trains_are_not_cached(self):
+        await self.create_table([reservation("ICE 1", 1)])
+        await cache.sync()
+        self.assertEqual(await self.request("ICE 9"), [])
+        self.assertNotIn("ICE 9", self.service._responses)
+
+    async def test_responses_before_first_sync_are_not_cached(self):
+        await self.create_table([reservation("ICE 1", 1)])
+        self.assertEqual(await self.request("ICE 1"), [1])
+        self.assertEqual(self.service._responses, {})
+
+    async def batch_request(self, trainids):
+        """
+        :return: decoded data of the response messages
+        """
+        self.requests += 1
+        reply = f"reply.{self.requests}"
+        request = {"meta": {"version": b"\x01\x00\x00"}, "data": {"trains": trainids}}
+        data = schemaless_encode(request, schema_registry.codec("seat_info_batch_request"))
+        await self.service._handle_req_batch_data(Msg(data, reply))
+        self.batch_payloads = self.nc.published[reply]
+        codec = schema_registry.codec("seat_info_batch_response")
+        return [schemaless_decode(p, codec)["data"] for p in self.batch_payloads]
+
+    async def test_batch_response_is_split_below_max_payload(self):
+        long_station = "FRANKFURT (MAIN) FLUGHAFEN FERNBAHNHOF ÜBER KÖLN MESSE/DEUTZ"
+        trainids = [f"ICE {t}" for t in range(30)]
+        rows = [
+            {**reservation(trainid, 1000 + i), "startstation": long_station}
+            for t, trainid in enumerate(trainids)
+            for i in range(t % 7 * 3)
+        ]
+        await self.create_table(rows)
+        await cache.sync()
+        self.nc.max_payload = 3000
+
+        chunks = await self.batch_request(trainids + ["ICE 99"])
+        self.assertGreater(len(chunks), 5)
+        for payload in self.batch_payloads:
+            self.assertLessEqual(len(payload), self.nc.max_payload)
+        self.assertEqual([c["chunk"] for c in chunks], list(range(len(chunks))))
+        self.assertEqual({c["chunks"] for c in chunks}, {len(chunks)})
+
+        trains = [t for c in chunks for t in c["trains"]]
+        self.assertEqual([t["train"] for t in trains], trainids + ["ICE 99"])
+        for t, train in enumerate(trainids):
+            self.assertEqual(
+                sorted(r["id"] for r in trains[t]["seatReservations"]), [1000 + i for i in range(t % 7 * 3)]
+            )
+            self.assertTrue(all(r["startStation"] == long_station for r in trains[t]["seatReservations"]))
+        self.assertEqual(trains[-1]["seatReservations"], [])
+
+    async def test_batch_response_without_split(self):
+        await self.create_table([reservation("ICE 1", 1), reservation("ICE 2", 2)])
+        await cache.sync()
+        chunks = await self.batch_request(["ICE 1", "ICE 2", "ICE 1"])
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual((chunks[0]["chunk"], chunks[0]["chunks"]), (0, 1))
+        self.assertEqual([t["train"] for t in chunks[0]["trains"]], ["ICE 1", "ICE 2"])
+
+    async def status(self):
+        self.requests += 1
+        reply = f"reply.{self.requests}"
+        await self.service._handle_req_status(Msg(b"", reply))
+        return schemaless_decode(self.nc.published[reply][0], schema_registry.codec("timestamp"))["data"]["time"]
+
+    async def test_status_before_first_successful_sync(self):
+        # no seat_reservation table, the sync fails
+        run = asyncio.create_task(self.service._run())
+        await asyncio.sleep(0.05)
+        try:
+            self.assertEqual(await self.status(), datetime.fromtimestamp(0, timezone.utc))
+        finally:
+            run.cancel()
+
+    async def test_delta_requests(self):
+        await self.create_table([reservation("ICE 1", i) for i in range(1, 5)])
+        await cache.sync()
+        full = await self.delta_request("ICE 1", 0)
+        self.assertEqual(full["kind"], "FULL")
+        self.assertEqual(sorted(r["id"] for r in full["added"]), [1, 2, 3, 4])
+
+        self.assertEqual((await self.delta_request("ICE 1", full["dataVersion"]))["kind"], "NOT_MODIFIED")
+
+        await self.update(4, deleted=True, updated_at=T0 + timedelta(seconds=5))
+        await cache.sync()
+        delta = await self.delta_request("ICE 1", full["dataVersion"])
+        self.assertEqual(delta["kind"], "DELTA")
+        self.assertEqual((delta["added"], [r["id"] for r in delta["removed"]]), ([], [4]))
+        self.assertGreater(delta["dataVersion"], full["dataVersion"])
+
+
+def train(trainid, reservations, station="KÖLN"):
+    return {
+        "train": trainid,
+        "seatReservations": [
+            {"id": i, "startStation": station, "endStation": station} for i in range(reservations)
+        ],
+    }
+
+
+class TestBatchSplit(unittest.TestCase):
+    def encoded(self, trains):
+        response = {"meta": {"version": b"\x01\x00\x00"}, "data": {"chunk": 0, "chunks": 1, "trains": trains}}
+        return len(schemaless_encode(response, schema_registry.codec("seat_info_batch_response")))
+
+    def test_encoded_size(self):
+        empty = self.encoded([])
+        for t in (
+            train("ICE 1", 0),
+            train("ICE 2", 3),
+            train("Ü" * 100, 200, station="DÜSSELDORF " * 20),
+            {"train": "ICE 3", "seatReservations": [{"id": 2**31 - 1, "startStation": "", "endStation": "X"}]},
+        ):
+            with self.subTest(train=t["train"][:10]):
+                # one train adds the array block count
+                self.assertEqual(seat_info_proxy_service._encoded_size(t), self.encoded([t]) - empty - 1)
+
+    def test_split(self):
+        trains = [train(f"ICE {i}", i % 13, station="KÖLN MESSE/DEUTZ") for i in range(50)]
+        max_size = 600
+        chunks = seat_info_proxy_service._split(trains, max_size)
+        self.assertGreater(len(chunks), 5)
+        self.assertEqual([t for c in chunks for t in c], trains)
+        for c in chunks:
+            self.assertLessEqual(sum(seat_info_proxy_service._encoded_size(t) for t in c), max_size)
+            # the header of a chunk takes less than the reserve
+            self.assertLessEqual(self.encoded(c), max_size + seat_info_proxy_service.BATCH_CHUNK_RESERVE)
+
+    def test_split_oversized_train(self):
+        trains = [train("ICE 1", 1), train("ICE 2", 100), train("ICE 3", 1)]
+        chunks = seat_info_proxy_service._split(trains, 200)
+        self.assertEqual([[t["train"] for t in c] for c in chunks], [["ICE 1"], ["ICE 2"], ["ICE 3"]])
+
+    def test_split_empty(self):
+        self.assertEqual(seat_info_proxy_service._split([], 100), [[]])
+
+
+if __name__ == "__main__":
+    unittest.main()
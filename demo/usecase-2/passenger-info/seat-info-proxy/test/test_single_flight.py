@@ -0,0 +1,87 @@
+import asyncio
+import unittest
+
+from single_flight import SingleFlight
+
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_calls_share_one_call(self):
+        sf = SingleFlight()
+        calls = 0
+        release = asyncio.Event()
+
+        async def lookup():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return calls
+
+        waiting = [asyncio.create_task(sf.do("ICE 1", lookup)) for _ in range(5)]
+        await asyncio.sleep(0)
+        self.assertEqual(sf.in_flight(), 1)
+        release.set()
+
+        self.assertEqual(await asyncio.gather(*waiting), [1] * 5)
+        self.assertEqual(calls, 1)
+        self.assertEqual(sf.counters["calls"], 5)
+        self.assertEqual(sf.counters["coalesced"], 4)
+        self.assertEqual(sf.in_flight(), 0)
+
+    async def test_keys_are_independent(self):
+        sf = SingleFlight()
+
+        async def lookup(key):
+            await asyncio.sleep(0)
+            return key
+
+        results = await asyncio.gather(
+            sf.do("ICE 1", lambda: lookup("ICE 1")), sf.do("ICE 2", lambda: lookup("ICE 2"))
+        )
+        self.assertEqual(results, ["ICE 1", "ICE 2"])
+        self.assertEqual(sf.counters["coalesced"], 0)
+
+    async def test_sequential_calls_are_not_coalesced(self):
+        sf = SingleFlight()
+
+        async def lookup():
+            return 1
+
+        await sf.do("ICE 1", lookup)
+        await sf.do("ICE 1", lookup)
+        self.assertEqual(sf.counters["coalesced"], 0)
+
+    async def test_exception_is_shared(self):
+        sf = SingleFlight()
+        release = asyncio.Event()
+
+        async def lookup():
+            await release.wait()
+            raise OSError("database unreachable")
+
+        waiting = [asyncio.create_task(sf.do("ICE 1", lookup)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*waiting, return_exceptions=True)
+        self.assertTrue(all(isinstance(r, OSError) for r in results))
+        self.assertEqual(sf.in_flight(), 0)
+
+    async def test_cancelled_caller_does_not_cancel_others(self):
+        sf = SingleFlight()
+        release = asyncio.Event()
+
+        async def lookup():
+            await release.wait()
+            return "seats"
+
+        first = asyncio.create_task(sf.do("ICE 1", lookup))
+        second = asyncio.create_task(sf.do("ICE 1", lookup))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        self.assertEqual(await second, "seats")
+        self.assertTrue(first.cancelled())
+
+
+if __name__ == "__main__":
+    unittest.main()
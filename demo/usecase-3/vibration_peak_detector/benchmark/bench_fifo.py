@@ -0,0 +1,89 @@
+"""
+Microbenchmark of the accel Fifo.
+
+Compares the circular buffer Fifo with the former np.roll based implementation
+using the access pattern of Analyzer: push one MQTT message worth of samples,
+pop all complete RMS windows.
+
+Run from demo/usecase-3:
+    PYTHONPATH=vibration_peak_detector/src python -m vibration_peak_detector.benchmark.bench_fifo
+"""
+import argparse
+import time
+
+import numpy as np
+
+from vibration_peak_detector.src.fifo import Fifo
+
+
+class RollFifo:
+    """
+    Former Fifo implementation, moving the whole buffer with np.roll on every pop.
+    Kept for comparison only.
+    """
+
+    def __init__(self, capacity):
+        self._fifo = np.zeros(capacity)
+        self._capacity = capacity[0] if type(capacity) is tuple else capacity
+        self._entries = 0
+
+    def entries(self):
+        return self._entries
+
+    def free_entries(self):
+        return self._capacity - self._entries
+
+    def push(self, nparr):
+        in_len = np.shape(nparr)[0]
+        if in_len > self.free_entries():
+            raise BufferError("fifo overflow")
+        self._fifo[self._entries : self._entries + in_len] = nparr  # noqa E203
+        self._entries += in_len
+
+    def pop(self, n):
+        rv = self.peek(n)
+        self._fifo = np.roll(self._fifo, -n, axis=0)
+        self._entries -= n
+        return rv
+
+    def peek(self, n):
+        if self._entries < n:
+            raise BufferError("not enough entries in fifo")
+        return self._fifo[:n]
+
+
+def run(fifo_cls, capacity, chunk, window, iterations):
+    """
+    :return: processed samples per second
+    """
+    fifo = fifo_cls((capacity, 2))
+    data = np.random.default_rng(0).random((chunk, 2))
+    popped = 0
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fifo.push(data)
+        while fifo.entries() >= window:
+            fifo.pop(window)
+            popped += window
+    elapsed = time.perf_counter() - start
+    return popped / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fifo microbenchmark")
+    parser.add_argument("--capacity", type=int, default=6000)
+    parser.add_argument("--chunk", type=int, default=100, help="samples per push")
+    parser.add_argument("--window", type=int, default=80, help="samples per pop")
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    results = {}
+    for name, cls in (("np.roll", RollFifo), ("circular", Fifo)):
+        results[name] = run(cls, args.capacity, args.chunk, args.window, args.iterations)
+        print(f"{name:>10}: {results[name]:14,.0f} samples/s")
+    print(f"   speedup: {results['circular'] / results['np.roll']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark of the acceleration payload decoding done in Analyzer._accel_handler.
+
+Compares the former per-sample loop (stdlib json) with payload_decoder.
+
+Run from demo/usecase-3:
+    PYTHONPATH=vibration_peak_detector/src python -m vibration_peak_detector.benchmark.bench_payload_decoder
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from vibration_peak_detector.src import payload_decoder
+
+
+def make_payload(samples):
+    rng = np.random.default_rng(0)
+    return json.dumps(
+        {
+            "time": 1625122333.25,
+            "time_delta": 0.01,
+            "accel": [
+                {"x": float(x), "y": float(y), "z": float(z)}
+                for x, y, z in rng.normal(size=(samples, 3))
+            ],
+        }
+    ).encode()
+
+
+def decode_loop(raw):
+    """former implementation of Analyzer._accel_handler"""
+    payload = json.loads(raw)
+    accel = payload["accel"]
+    n = len(accel)
+    ts = payload["time"]
+    td = payload["time_delta"]
+    arr = np.ndarray((n, 2))
+    for i in range(n):
+        arr[i, 0] = ts + td * i
+        arr[i, 1] = accel[i]["z"]
+    return arr
+
+
+def decode_vectorized(raw):
+    return payload_decoder.decode_accel(payload_decoder.loads(raw))
+
+
+def run(decode_func, raw, samples, iterations):
+    """
+    :return: decoded samples per second
+    """
+    start = time.perf_counter()
+    for _ in range(iterations):
+        decode_func(raw)
+    return samples * iterations / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="accel payload decoding benchmark")
+    parser.add_argument("--samples", type=int, default=100, help="samples per message")
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    raw = make_payload(args.samples)
+    assert np.allclose(decode_loop(raw), decode_vectorized(raw))
+
+    print(f"json backend: {payload_decoder._json.__name__}")
+    results = {}
+    for name, func in (("loop", decode_loop), ("vectorized", decode_vectorized)):
+        results[name] = run(func, raw, args.samples, args.iterations)
+        print(f"{name:>10}: {results[name]:14,.0f} samples/s")
+    print(f"   speedup: {results['vectorized'] / results['loop']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Benchmark of the vibration_peak_detector hot path.
+
+Drives synthetic acceleration and location streams through the complete Analyzer
+pipeline (_accel_handler -> Fifo -> AnalyzerLogic -> location mapping -> event queue).
+The MQTT client and the ADS producer are replaced by in-process stand-ins.
+
+Reports throughput, per-window latency (p50/p99) and peak RSS. The results are written
+as JSON; pass a former result file with --baseline to see the relative change.
+
+Run from demo/usecase-3:
+    PYTHONPATH=vibration_peak_detector/src python -m vibration_peak_detector.benchmark.bench_pipeline
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import platform
+import resource
+import subprocess
+import time
+
+import numpy as np
+
+from vibration_peak_detector.src import analyzer as analyzer_module
+from vibration_peak_detector.src.analyzer import Analyzer
+
+T0 = 1625122333.0
+
+
+class InProcessMqttClient:
+    """
+    Stand-in for ef.AlmMqttModuleClient, calls the subscribed handlers directly.
+    """
+
+    def __init__(self):
+        self._handlers = {}
+
+    async def subscribe(self, topic, handler):
+        self._handlers[topic] = handler
+
+    async def publish(self, topic, payload):
+        await self._handlers[topic]({"payload": payload})
+
+
+class InstrumentedAnalyzer(Analyzer):
+    """
+    Analyzer recording the latency of each RMS window, measured from the publish
+    of the accel message completing the window until the window is reported.
+    """
+
+    def __init__(self, q, mqtt_client, completion_time_func, **kwargs):
+        super().__init__(q, mqtt_client, **kwargs)
+        self._completion_time_func = completion_time_func
+        self.latencies = []
+
+    async def _report(self, ts, rms, map_status, lat, lon):
+        await super()._report(ts, rms, map_status, lat, lon)
+        self.latencies.append(time.perf_counter() - self._completion_time_func(ts))
+
+
+class AdsProducerStandIn:
+    """
+    Stand-in for the ADS producer of main.py. Consumes the analyzer event queue.
+    """
+
+    def __init__(self, q):
+        self.events = 0
+        self._task = asyncio.create_task(self._consume(q))
+
+    async def _consume(self, q):
+        while True:
+            await q.get()
+            self.events += 1
+
+    def stop(self):
+        self._task.cancel()
+
+
+def make_accel_messages(args, rng):
+    """
+    :return: list of (sim_time, topic, payload) for all sensors
+    """
+    period = 1.0 / args.sample_rate
+    n_msgs = int(args.duration * args.sample_rate / args.samples_per_msg)
+    axes = args.axes.split(",")
+    messages = []
+    for m in range(n_msgs):
+        start = T0 + m * args.samples_per_msg * period
+        for sensor in range(args.sensors):
+            z = rng.normal(0, 0.2, (args.samples_per_msg, len(axes)))
+            # occasional peaks
+            if rng.random() < 0.05:
+                z[::2] += 1.0
+            payload = {
+                "time": start,
+                "time_delta": period,
+                "accel": [dict(zip(axes, s)) for s in z.tolist()],
+            }
+            messages.append(
+                (
+                    start + (args.samples_per_msg - 1) * period,
+                    f"sensor{sensor}/acceleration",
+                    json.dumps(payload).encode(),
+                )
+            )
+    return messages
+
+
+def make_loc_messages(args):
+    n_locs = int(args.duration * args.loc_rate) + 2
+    messages = []
+    for i in range(n_locs):
+        ts = T0 + i / args.loc_rate
+        payload = {"time": ts, "lat": 49.4 + i * 1e-4, "lon": 11.0 + i * 1e-4}
+        messages.append((ts, "environment/location", json.dumps(payload).encode()))
+    return messages
+
+
+async def drive(args):
+    rng = np.random.default_rng(0)
+    accel_msgs = make_accel_messages(args, rng)
+    loc_msgs = make_loc_messages(args)
+    # ordered by sim time, a location fix is published when it is due
+    messages = sorted(accel_msgs + loc_msgs, key=lambda m: m[0])
+
+    period = 1.0 / args.sample_rate
+    msg_duration = args.samples_per_msg * period
+    window = analyzer_module.RMS_WINDOW_SIZE
+    publish_times = np.zeros(len(accel_msgs) // args.sensors)
+
+    def completion_time(ts):
+        # accel message (batch) containing the last sample of the window
+        last_sample = ts + (window - 1 - window // 2) * period
+        batch = int((last_sample - T0 + period / 2) // msg_duration)
+        return publish_times[batch]
+
+    q = asyncio.Queue()
+    mqtt_client = InProcessMqttClient()
+    topics = [f"sensor{s}/acceleration" for s in range(args.sensors)]
+    analyzer = InstrumentedAnalyzer(
+        q,
+        mqtt_client,
+        completion_time,
+        accel_topics=topics,
+        accel_axes=args.axes.split(","),
+    )
+    ads = AdsProducerStandIn(q)
+    # let the analyzer register its handlers
+    await asyncio.sleep(0)
+
+    samples = 0
+    batch = 0
+    start = time.perf_counter()
+    for sim_time, topic, payload in messages:
+        if args.speedup > 0:
+            delay = start + (sim_time - T0) / args.speedup - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        if topic != "environment/location":
+            publish_times[batch] = time.perf_counter()
+            if topic == topics[-1]:
+                batch += 1
+            samples += args.samples_per_msg
+        await mqtt_client.publish(topic, payload)
+        # give the analyzer tasks a chance to run, like the network would
+        await asyncio.sleep(0)
+
+    # wait until all windows are reported
+    expected = int(batch * msg_duration * args.sample_rate) // analyzer_module.RMS_HOP_SIZE
+    while len(analyzer.latencies) < expected - 1:
+        await asyncio.sleep(0.001)
+        if time.perf_counter() - start > args.duration * 10 + 60:
+            break
+    elapsed = time.perf_counter() - start
+
+    analyzer.stop()
+    ads.stop()
+
+    latencies = np.array(analyzer.latencies) * 1000
+    return {
+        "samples": samples,
+        "windows": len(latencies),
+        "events": ads.events,
+        "elapsed_s": elapsed,
+        "throughput_samples_per_s": samples / elapsed,
+        "latency_ms_p50": float(np.percentile(latencies, 50)) if len(latencies) else None,
+        "latency_ms_p99": float(np.percentile(latencies, 99)) if len(latencies) else None,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "counters": analyzer.counters(),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_file):
+    with open(baseline_file) as f:
+        baseline = json.load(f)["results"]
+    print(f"Compared to {baseline_file}:")
+    for key in ("throughput_samples_per_s", "latency_ms_p50", "latency_ms_p99", "peak_rss_kb"):
+        if results.get(key) and baseline.get(key):
+            change = (results[key] - baseline[key]) / baseline[key] * 100
+            print(f"  {key:>26}: {change:+.1f} %")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="vibration_peak_detector pipeline benchmark")
+    parser.add_argument("--duration", type=float, default=120, help="simulated seconds")
+    parser.add_argument("--sample-rate", type=float, default=100, help="accel Hz")
+    parser.add_argument("--samples-per-msg", type=int, default=100)
+    parser.add_argument("--loc-rate", type=float, default=1, help="location fixes per s")
+    parser.add_argument("--sensors", type=int, default=1)
+    parser.add_argument("--axes", default="z", help="comma separated, e.g. x,y,z")
+    parser.add_argument(
+        "--speedup",
+        type=float,
+        default=0,
+        help="publish at <speedup> times real time, 0: as fast as possible",
+    )
+    parser.add_argument("-o", "--output", default="bench_pipeline.json")
+    parser.add_argument("--baseline", help="former result file to compare with")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    results = asyncio.run(drive(args))
+
+    for key, value in results.items():
+        if key == "counters":
+            continue
+        print(f"{key:>28}: {value:,.3f}" if isinstance(value, float) else f"{key:>28}: {value}")
+
+    report = {
+        "benchmark": "bench_pipeline",
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "config": vars(args),
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import asyncio
+import collections
+import logging
+
+from fifo import Fifo
+
+_logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("drop-oldest", "drop-newest", "decimate")
+
+
+class AccelBuffer:
+    def __init__(
+        self, capacity, policy="drop-newest", decimation=2, high_watermark=0.75
+    ):
+        """
+        Bounded buffer between the accel handler and the analysis with a coalescing
+        wakeup: any number of pushes wake up the consumer once.
+
+        :param capacity: dimensions of the underlying fifo, see Fifo
+        :param policy: what to do when the buffer can't take all new samples
+        "drop-newest" - discard the new samples that don't fit
+        "drop-oldest" - discard the oldest buffered samples to make room
+        "decimate" - above <high_watermark> fill level only every <decimation>-th
+                     message is taken, the others are discarded completely.
+                     New samples that still don't fit are discarded.
+        """
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {policy}, use one of {OVERFLOW_POLICIES}")
+        self._fifo = Fifo(capacity)
+        self._capacity = capacity[0] if type(capacity) is tuple else capacity
+        self._policy = policy
+        self._decimation = decimation
+        self._high_watermark = high_watermark
+        self._decimation_cnt = 0
+        self._event = asyncio.Event()
+        self.counters = collections.Counter()
+
+    def entries(self):
+        return self._fifo.entries()
+
+    def push(self, arr):
+        """
+        Add samples, apply the overflow policy if they don't fit. Never raises BufferError.
+        """
+        n = len(arr)
+        self.counters["messages"] += 1
+        self.counters["samples"] += n
+
+        if self._policy == "decimate" and self._above_high_watermark():
+            self._decimation_cnt = (self._decimation_cnt + 1) % self._decimation
+            if self._decimation_cnt != 0:
+                self._dropped("decimated", n)
+                return
+
+        free = self._fifo.free_entries()
+        if n > free:
+            if self._policy == "drop-oldest":
+                # new samples exceeding the whole buffer can't be kept anyway
+                if n > self._capacity:
+                    self._dropped("dropped_newest", n - self._capacity)
+                    arr = arr[n - self._capacity :]  # noqa E203
+                drop = len(arr) - self._fifo.free_entries()
+                self._fifo.drop(drop)
+                self._dropped("dropped_oldest", drop)
+            else:
+                self._dropped("dropped_newest", n - free)
+                arr = arr[:free]
+
+        if len(arr) > 0:
+            self._fifo.push(arr)
+            if self._event.is_set():
+                self.counters["coalesced_wakeups"] += 1
+            self._event.set()
+
+    async def wait(self):
+        """
+        Wait until there are new samples in the buffer.
+        """
+        await self._event.wait()
+        self._event.clear()
+        self.counters["wakeups"] += 1
+
+    def pop_all(self):
+        """
+        :return: all samples in the buffer, oldest first
+        """
+        return self._fifo.pop(self._fifo.entries())
+
+    def _above_high_watermark(self):
+        return self._fifo.entries() >= self._capacity * self._high_watermark
+
+    def _dropped(self, reason, n):
+        self.counters[reason] += n
+        self.counters["overflows"] += 1
+        _logger.error(
+            f"Accel buffer overflow ({self._policy}): {reason} {n} samples, "
+            f"{self.dropped_samples()} dropped in total"
+        )
+
+    def dropped_samples(self):
+        return (
+            self.counters["dropped_newest"]
+            + self.counters["dropped_oldest"]
+            + self.counters["decimated"]
+        )
@@ -1,10 +1,16 @@
+import asyncio
 import logging
 
 import edgefarm_application as ef
 from schema_loader import schema_read
+from peak_segmenter import PeakSegmenter
+from run_task import run_task
 
 _logger = logging.getLogger(__name__)
 
+BATCH_MAX_SEGMENTS = 50  # send batch when that many peak segments are collected
+BATCH_MAX_DELAY_MS = 2000  # send batch at latest that long after the first peak
+
 
 class AdsEventReporter:
     """
@@ -24,7 +30,83 @@ class AdsEventReporter:
         )
 
     async def report(self, event):
-        ads_payload = {"data": event}
+        # the channel is not part of the vibration_intensity schema
+        ads_payload = {
+            "data": {
+                "time": event["time"],
+                "lat": event["lat"],
+                "lon": event["lon"],
+                "vibrationIntensity": event["vibrationIntensity"],
+            }
+        }
         _logger.debug(f"sending event to ADS: {ads_payload}")
         # Send data to ads node module
         await self._ads_producer.encode_and_send(self._ads_encoder, ads_payload)
+
+    async def close(self):
+        pass
+
+
+class BatchingAdsEventReporter:
+    """
+    Forwards detected peaks to ADS in batches.
+
+    Peaks of consecutive RMS windows are merged into one peak segment carrying max and
+    mean intensity. Segments are sent as one vibration_peaks message when
+    <max_segments> are collected or <max_delay_ms> after the first one.
+    Segments that may still be extended are sent as well, so a peak lasting longer
+    than a batch continues as a new segment in the next message.
+
+    :param q: event q to stop the program on errors
+    :param max_gap_seconds: max time between two RMS windows to merge them
+    """
+
+    def __init__(
+        self,
+        q,
+        max_gap_seconds,
+        max_segments=BATCH_MAX_SEGMENTS,
+        max_delay_ms=BATCH_MAX_DELAY_MS,
+    ):
+        self._ads_producer = ef.AdsProducer()
+        self._segmenter = PeakSegmenter(max_gap_seconds)
+        self._max_segments = max_segments
+        self._max_delay = max_delay_ms / 1000
+        self._pending = asyncio.Event()
+
+        # Create an encoder for an application specific payload
+        payload_schema = schema_read(__file__, "vibration_peaks")
+        self._ads_encoder = ef.AdsEncoder(
+            payload_schema,
+            schema_name="vibration_peaks",
+            schema_version=(1, 0, 0),
+            tags={},
+        )
+        self._task = asyncio.create_task(run_task(_logger, q, self._flusher))
+
+    async def report(self, event):
+        self._segmenter.add(event)
+        self._pending.set()
+        if self._segmenter.segments() >= self._max_segments:
+            await self.flush()
+
+    async def flush(self):
+        segments = self._segmenter.take()
+        self._pending.clear()
+        if len(segments) == 0:
+            return
+
+        ads_payload = {"data": {"peaks": segments}}
+        _logger.debug(f"sending {len(segments)} peak segments to ADS")
+        # Send data to ads node module
+        await self._ads_producer.encode_and_send(self._ads_encoder, ads_payload)
+
+    async def close(self):
+        self._task.cancel()
+        await self.flush()
+
+    async def _flusher(self):
+        while True:
+            await self._pending.wait()
+            await asyncio.sleep(self._max_delay)
+            await self.flush()
@@ -1,157 +1,263 @@
 import asyncio
+import collections
+import functools
 import numpy as np
-import json
 import logging
 import datetime
 import math
+import time
 
 from fifo import Fifo
+from accel_buffer import AccelBuffer
+from sliding_rms import SlidingRms
+from sensor_aligner import SensorAligner
 from run_task import run_task
+import payload_decoder
 import location_mapper
 
 ACCEL_FIFO_CAPACITY = 6000  # number of samples in Acceleration Data Fifo ~1 minute
+ACCEL_OVERFLOW_POLICY = "drop-newest"  # see AccelBuffer
 ACCEL_NOMINAL_SAMPLE_PERIOD = 0.01  # sample rate we except the samples to arrive
 LOC_FIFO_CAPACITY = 60  # number of samples in Location Fifo
 RMS_WINDOW_SIZE = 80  # number of samples over which RMS is computed
+RMS_HOP_SIZE = RMS_WINDOW_SIZE  # number of samples between two RMS values
 PEAK_THRESHOLD = 0.42  # if RMS value above that threshold, send ADS message
+ACCEL_TOPICS = ("environment/acceleration",)  # one MQTT topic per sensor
+ACCEL_AXES = ("z",)  # acceleration axes analyzed per sensor
+SENSOR_STALL_TIMEOUT = 1  # seconds of samples the other sensors wait for a silent sensor
 MAP_TIMESTAMP_TIMEOUT_SECONDS = 60
+# number of RMS values waiting for location data ~1 minute
+PENDING_WINDOWS_CAPACITY = ACCEL_FIFO_CAPACITY // RMS_HOP_SIZE
 
 
 _logger = logging.getLogger(__name__)
 
 
 class Analyzer:
-    def __init__(self, q, mqtt_client):
+    def __init__(
+        self,
+        q,
+        mqtt_client,
+        accel_topics=ACCEL_TOPICS,
+        accel_axes=ACCEL_AXES,
+        peak_thresholds=PEAK_THRESHOLD,
+        accel_overflow_policy=ACCEL_OVERFLOW_POLICY,
+    ):
+        """
+        Analyze the vibration of all <accel_axes> of all sensors in <accel_topics>.
+        Each sensor/axis combination is a channel, sensor-major:
+        <topic0>:<axis0>, <topic0>:<axis1>, ..., <topic1>:<axis0>, ...
+
+        :param peak_thresholds: one threshold for all channels or one per channel
+        :param accel_overflow_policy: what to do when the accel buffer is full,
+        see AccelBuffer
+        """
         self._q = q
         self._mqtt_client = mqtt_client
+        self._accel_topics = tuple(accel_topics)
+        self._accel_axes = tuple(accel_axes)
+        self._channels = [f"{t}:{a}" for t in self._accel_topics for a in self._accel_axes]
+        peak_thresholds = np.asarray(peak_thresholds, dtype=float).reshape(-1)
+        if len(peak_thresholds) not in (1, len(self._channels)):
+            raise ValueError(
+                f"Expected 1 or {len(self._channels)} peak thresholds, got {len(peak_thresholds)}"
+            )
+        self._peak_thresholds = np.broadcast_to(peak_thresholds, (len(self._channels),))
         self._logic = AnalyzerLogic(
-            RMS_WINDOW_SIZE, ACCEL_NOMINAL_SAMPLE_PERIOD)
+            RMS_WINDOW_SIZE, ACCEL_NOMINAL_SAMPLE_PERIOD, RMS_HOP_SIZE)
+        self._aligner = SensorAligner(
+            len(self._accel_topics),
+            len(self._accel_axes),
+            ACCEL_NOMINAL_SAMPLE_PERIOD / 2,
+            SENSOR_STALL_TIMEOUT,
+            ACCEL_FIFO_CAPACITY,
+        )
         # communication between accel_handler and monitor task
-        self._accel_fifo = Fifo((ACCEL_FIFO_CAPACITY, 2))
-        self._accel_q = asyncio.Queue()
+        # columns: time, then the channels
+        self._accel_buffer = AccelBuffer(
+            (ACCEL_FIFO_CAPACITY, self._aligner.columns()), accel_overflow_policy
+        )
 
         self._loc_fifo = Fifo((LOC_FIFO_CAPACITY, 3))
 
+        # communication between monitor/loc_handler and mapper task
+        # RMS values waiting to be mapped to a location, entries: (ts, rms, parked_since)
+        self._pending = collections.deque()
+        self._map_event = asyncio.Event()
+        self._counters = collections.Counter()
+
         self._task = asyncio.create_task(run_task(_logger, q, self._monitor))
+        self._mapper_task = asyncio.create_task(run_task(_logger, q, self._mapper))
 
-    async def _accel_handler(self, msg):
-        """This is the handler function that gets registered for `environment/acceleration`.
+    def stop(self):
+        self._task.cancel()
+        self._mapper_task.cancel()
+
+    def counters(self):
+        """
+        Counters for monitoring:
+        accel buffer - see AccelBuffer, e.g. "samples", "dropped_oldest", "wakeups"
+        "pending" - RMS values currently waiting for location data
+        "pending_dropped" - RMS values dropped because the pending queue was full
+        "map_<status>" - RMS values per mapping result, e.g. "map_ok", "map_ts-too-new"
+        "align_<counter>" - see SensorAligner, e.g. "align_unmatched", "align_stalled_rows"
+        """
+        counters = dict(self._accel_buffer.counters)
+        counters.update((f"align_{k}", v) for k, v in self._aligner.counters.items())
+        counters.update(self._counters)
+        counters["pending"] = len(self._pending)
+        counters["accel_dropped"] = self._accel_buffer.dropped_samples()
+        return counters
+
+    async def _accel_handler(self, msg, sensor=0):
+        """This is the handler function that gets registered for each accel topic,
+        by default `environment/acceleration`.
         The received data is a python dictionary.
         msg['payload'] is the MQTT message as received from MQTT. Here, the payload is
         a json message, so we convert the json to a python dictionary.
         """
-        payload = json.loads(msg["payload"])
+        payload = payload_decoder.loads(msg["payload"])
 
-        # Z-acceleration + timestamps to np-array
-        accel = payload["accel"]
-        n = len(accel)
+        # acceleration + timestamps to np-array
+        arr = payload_decoder.decode_accel(payload, self._accel_axes)
         ts = payload["time"]
-        td = payload["time_delta"]
-        arr = np.ndarray((n, 2))
-
-        for i in range(n):
-            arr[i, 0] = ts + td * i
-            arr[i, 1] = accel[i]["z"]
 
         age = datetime.datetime.now() - datetime.datetime.fromtimestamp(float(ts))
         _logger.debug(
-            f"Place {n} accel samples into fifo. age={age.total_seconds()} s")
+            f"Got {len(arr)} accel samples from sensor {sensor}. age={age.total_seconds()} s")
 
-        # Push into Fifo
-        try:
-            self._accel_fifo.push(arr)
-            await self._accel_q.put(0)
-        except BufferError as e:
-            _logger.error(f"Accel Fifo: {e}")
+        # rows of all sensors
+        arr = self._aligner.add(sensor, arr)
+        if len(arr) == 0:
+            return
+
+        # Push into buffer, wakes up the monitor task
+        self._accel_buffer.push(arr)
 
     async def _loc_handler(self, msg):
         """This is the handler function that gets registered for `environment/location`"""
-        payload = json.loads(msg["payload"])
+        payload = payload_decoder.loads(msg["payload"])
         _logger.debug(f"loc_handler {payload}")
         try:
             entry = np.array([payload["time"], payload["lat"], payload["lon"]])
             self._loc_fifo.push(entry)
+            # pending RMS values may be mappable now
+            self._map_event.set()
         except BufferError as e:
             _logger.error(f"Loc Fifo: {e}")
 
     async def register_handlers(self):
-        await self._mqtt_client.subscribe(
-            "environment/acceleration", self._accel_handler
-        )
+        for sensor, topic in enumerate(self._accel_topics):
+            await self._mqtt_client.subscribe(
+                topic, functools.partial(self._accel_handler, sensor=sensor)
+            )
         await self._mqtt_client.subscribe("environment/location", self._loc_handler)
 
     async def _monitor(self):
         await self.register_handlers()
 
         while True:
-            # wait for accel_handler to put something into FIFO
-            await self._accel_q.get()
-            while True:
-                try:
-                    accel = self._accel_fifo.pop(RMS_WINDOW_SIZE)
-                    _logger.debug(
-                        f"Got {RMS_WINDOW_SIZE} accel samples from fifo.")
-
-                    ts, rms = self._logic.analyze(accel)
-
-                    if ts is not None:
-                        map_status, lat, lon = await self.map_timestamp(ts)
-                        _logger.info(f"RMS={rms} at ts={ts} loc={lat}, {lon}")
-
-                        # Discard location entries that are too old
-                        self.clean_locs_fifo(ts)
-
-                        if map_status == "ok" and rms > PEAK_THRESHOLD:
-                            # report peak to main task
-                            _logger.info("*** Peak detected!")
-
-                            await self._q.put(
-                                {
-                                    "time": datetime.datetime.fromtimestamp(float(ts)),
-                                    "lat": lat,
-                                    "lon": lon,
-                                    "vibrationIntensity": rms,
-                                }
-                            )
-
-                except BufferError:
-                    # not enough data in fifo, wait for more
-                    break
-
-    async def map_timestamp(self, ts):
+            # wait for accel_handler to put something into buffer
+            await self._accel_buffer.wait()
+            accel = self._accel_buffer.pop_all()
+            _logger.debug(f"Got {len(accel)} accel samples from buffer.")
+
+            # samples of incomplete windows are kept by the RMS engine
+            ts, rms = self._logic.analyze_stream(accel)
+            if len(ts) == 0:
+                continue
+
+            # park RMS values until location data covering them is available
+            now = time.monotonic()
+            for entry in zip(ts, rms):
+                if len(self._pending) >= PENDING_WINDOWS_CAPACITY:
+                    dropped_ts, _, _ = self._pending.popleft()
+                    self._counters["pending_dropped"] += 1
+                    _logger.warning(f"Pending queue full. Dropping RMS at ts={dropped_ts}")
+                self._pending.append((*entry, now))
+            self._map_event.set()
+
+    async def _mapper(self):
         """
-        Map the timestamp to a location position.
-        If ts is newer than all received locations, wait for newer locations
-
-        :param ts: timestamp to map
-        :return: map_status, lat, lon
-                  "ok" - mapping done - lat, lon valid
-                  "ts-too-old" mapping failed - ts is older than all timestamps in locs
-                  "time-gap" mapping failed - time gap in accel
+        Map pending RMS values to locations.
+        Runs whenever new RMS values or new location data arrive. RMS values that can't
+        be mapped within MAP_TIMESTAMP_TIMEOUT_SECONDS are discarded.
         """
-        if ts is None:
-            map_status = "time-gap"
-            lat = lon = None
-        else:
-            elapsed_time_seconds = 0
-            while elapsed_time_seconds < MAP_TIMESTAMP_TIMEOUT_SECONDS:
-                locs = self._loc_fifo.peek(self._loc_fifo.entries())
-                lat, lon, map_status = location_mapper.map_timestamp_to_location(
-                    ts, locs
+        while True:
+            timeout = None
+            if len(self._pending) > 0:
+                parked_since = self._pending[0][2]
+                timeout = max(
+                    0, parked_since + MAP_TIMESTAMP_TIMEOUT_SECONDS - time.monotonic()
                 )
+            try:
+                await asyncio.wait_for(self._map_event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._map_event.clear()
+            await self.map_pending()
 
-                if map_status == "ts-too-new":
-                    # no location data available. Let's wait
-                    _logger.info("Wait for newer location data")
-                    await asyncio.sleep(1)
-                    elapsed_time_seconds += 1
-                else:
-                    break
+    async def map_pending(self):
+        """
+        Map all pending RMS values to locations and report peaks.
+        Mapping stops at the first RMS value that is newer than all received locations,
+        that one and all following stay pending unless they timed out.
+        """
+        if len(self._pending) == 0:
+            return
 
-        if map_status != "ok":
-            _logger.warn(f"Could not map timestamp to location: {map_status}")
+        locs = self._loc_fifo.peek(self._loc_fifo.entries())
+        ts = np.fromiter((p[0] for p in self._pending), dtype=float, count=len(self._pending))
+        lat, lon, map_status = location_mapper.map_timestamps_to_locations(ts, locs)
+
+        # take the mapped entries off the queue before reporting: the monitor task
+        # appends to and may drop from self._pending while _report() awaits
+        now = time.monotonic()
+        mapped = []
+        for i in range(len(ts)):
+            window_ts, rms, parked_since = self._pending[0]
+            if (
+                map_status[i] == "ts-too-new"
+                and now - parked_since < MAP_TIMESTAMP_TIMEOUT_SECONDS
+            ):
+                # no location data available yet. Let's wait
+                _logger.debug(f"Wait for newer location data. {len(ts) - i} pending")
+                break
+
+            self._pending.popleft()
+            self._counters[f"map_{map_status[i]}"] += 1
+            mapped.append((window_ts, rms, map_status[i], lat[i], lon[i]))
+
+        if len(mapped) > 0:
+            # Discard location entries that are too old
+            self.clean_locs_fifo(mapped[-1][0])
+
+        for entry in mapped:
+            await self._report(*entry)
+
+    async def _report(self, ts, rms, map_status, lat, lon):
+        """
+        :param rms: rms values of all channels
+        """
+        _logger.info(f"RMS={rms} at ts={ts} loc={lat}, {lon}")
 
-        return map_status, lat, lon
+        if map_status != "ok":
+            _logger.warning(f"Could not map timestamp to location: {map_status}")
+            return
+
+        for channel in np.flatnonzero(rms > self._peak_thresholds):
+            # report peak to main task
+            _logger.info(f"*** Peak detected on {self._channels[channel]}!")
+
+            await self._q.put(
+                {
+                    "time": datetime.datetime.fromtimestamp(float(ts)),
+                    "lat": float(lat),
+                    "lon": float(lon),
+                    "vibrationIntensity": float(rms[channel]),
+                    "channel": self._channels[channel],
+                }
+            )
 
     def clean_locs_fifo(self, ts):
         locs = self._loc_fifo.peek(self._loc_fifo.entries())
@@ -162,12 +268,21 @@ class Analyzer:
 
 
 class AnalyzerLogic:
-    def __init__(self, rms_window_size, accel_nominal_sample_period):
+    def __init__(self, rms_window_size, accel_nominal_sample_period, rms_hop_size=None):
         """
-        Stateless logic of Analyzer
+        Logic of Analyzer.
+        analyze() is stateless, analyze_stream() keeps the samples of incomplete windows.
+
+        :param rms_hop_size: number of samples between two windows of analyze_stream(),
+        defaults to <rms_window_size> (disjoint windows)
         """
         self._rms_window_size = rms_window_size
         self._accel_nominal_sample_period = accel_nominal_sample_period
+        self._sliding_rms = SlidingRms(
+            rms_window_size,
+            rms_hop_size if rms_hop_size is not None else rms_window_size,
+            accel_nominal_sample_period,
+        )
 
     def analyze(self, accel):
         """
@@ -194,6 +309,15 @@ class AnalyzerLogic:
 
         return ts, rms
 
+    def analyze_stream(self, accel):
+        """
+        Determine RMS values of all complete (possibly overlapping) windows.
+
+        :param accel: any number of new [time, z-acceleration] samples, oldest first
+        :return: ts, rms arrays - see SlidingRms.process()
+        """
+        return self._sliding_rms.process(accel)
+
     @staticmethod
     def _analyze_chunk(accel):
         """
@@ -221,48 +345,13 @@ class AnalyzerLogic:
     @staticmethod
     def _map_timestamp_to_location(ts, locs):
         """
-        Find the location (lat,lon) at time <ts> in <locs>.
-        <locs> must be array with entries [time,lat,lon], oldest entry first
-
-        :return: lat, lon, status
-        <lat>, <lon>: averaged position at time (linear interpolation)
-        <status>: "ok" - mapping done
-                  "ts-too-new" ts is newer than all timestamps in locs, or locs is empty
-                  "ts-too-old" ts is older than all timestamps in locs
+        See location_mapper.map_timestamp_to_location()
         """
-        status = "ts-too-old" if len(locs) > 0 else "ts-too-new"
-        for idx in range(len(locs)):
-            try:
-                if ts >= locs[idx, 0] and ts < locs[idx + 1, 0]:
-                    td = ts - locs[idx, 0]
-                    f = td / (locs[idx + 1, 0] - locs[idx, 0])
-                    lat = (locs[idx + 1, 1] - locs[idx, 1]) * f + locs[idx, 1]
-                    lon = (locs[idx + 1, 2] - locs[idx, 2]) * f + locs[idx, 2]
-
-                    return lat, lon, "ok"
-            except IndexError:
-                status = "ts-too-new"
-                break
-
-        if len(locs > 0):
-            _logger.error(f"oldest: {ts-locs[0,0]} newest: {ts-locs[-1,0]}")
-        return None, None, status
+        return location_mapper.map_timestamp_to_location(ts, locs)
 
     @staticmethod
     def _find_last_unused_location_entry(ts, locs):
         """
-        Find the last location entry that is no more used.
-        i.e. the last entry that is older than the one just before <ts>.
-        <locs> must be array with entries [time,lat,lon], oldest entry first
-
-        :return: idx or None
+        See location_mapper.find_last_unused_location_entry()
         """
-        idx = 0
-        for idx in range(len(locs)):
-            try:
-                if ts >= locs[idx, 0] and ts < locs[idx + 1, 0]:
-                    break
-            except IndexError:
-                break
-        if idx > 0:
-            return idx - 1
+        return location_mapper.find_last_unused_location_entry(ts, locs)
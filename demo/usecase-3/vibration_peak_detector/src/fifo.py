@@ -8,9 +8,13 @@ class Fifo:
         :param capacity: specifies the dimensions of the fifo, e.g.
         `10` - for a 1D array with 10 entries
         `(10,2)` - for a 2D array with 10 entries with 2 columns
+
+        The fifo is a circular buffer: push and pop only touch the affected
+        entries, the buffer itself is never moved.
         """
         self._fifo = np.zeros(capacity)
         self._capacity = capacity[0] if type(capacity) is tuple else capacity
+        self._head = 0  # index of the oldest entry
         self._entries = 0
 
     def entries(self):
@@ -22,37 +26,67 @@ class Fifo:
     def push(self, nparr):
         """
         add nparr to fifo. Must fit to shape of created fifo.
-        Oldest sample must be in nparr[0]
+        Oldest sample must be in nparr[0]. A single entry (e.g. one row of a 2D fifo)
+        may be passed without the leading dimension.
         :raise: BufferError if not enough space in fifo
         """
-        shape = np.shape(nparr)
-        in_len = shape[0]
+        nparr = np.asarray(nparr)
+        if nparr.ndim < self._fifo.ndim:
+            nparr = nparr.reshape((1,) + self._fifo.shape[1:])
+
+        in_len = nparr.shape[0]
         if in_len > self.free_entries():
             raise BufferError("fifo overflow")
 
-        self._fifo[self._entries : self._entries + in_len] = nparr  # noqa E203
+        tail = (self._head + self._entries) % self._capacity
+        first = min(in_len, self._capacity - tail)
+        self._fifo[tail : tail + first] = nparr[:first]  # noqa E203
+        # wraparound
+        self._fifo[: in_len - first] = nparr[first:]  # noqa E203
         self._entries += in_len
 
     def pop(self, n):
         """
         pop n entries from fifo.
+        The returned array is a copy, it stays valid when new entries are pushed.
         :raise: BufferError if not enough entries in fifo
         """
         rv = self.peek(n)
-        self._fifo = np.roll(self._fifo, -n, axis=0)
-        self._entries -= n
+        if rv.base is self._fifo:
+            rv = rv.copy()
+        self.drop(n)
         return rv
 
+    def drop(self, n):
+        """
+        remove the first n entries from fifo without returning them.
+        :raise: BufferError if not enough entries in fifo
+        """
+        if self._entries < n:
+            raise BufferError(
+                f"not enough entries in fifo. Requested {n}, in fifo: {self._entries}"
+            )
+        self._head = (self._head + n) % self._capacity
+        self._entries -= n
+
     def peek(self, n):
         """
         peek first n entries from fifo. Don't remove entries from fifo.
+        If the entries are contiguous in the buffer, a view into the buffer is returned,
+        otherwise a copy.
         :raise: BufferError if not enough entries in fifo
         """
         if self._entries < n:
             raise BufferError(
                 f"not enough entries in fifo. Requested {n}, in fifo: {self._entries}"
             )
-        return self._fifo[:n]
+        end = self._head + n
+        if end <= self._capacity:
+            return self._fifo[self._head : end]  # noqa E203
+        return np.concatenate(
+            (self._fifo[self._head :], self._fifo[: end - self._capacity])  # noqa E203
+        )
 
     def clear(self):
+        self._head = 0
         self._entries = 0
@@ -1,4 +1,5 @@
 import logging
+import numpy as np
 
 _logger = logging.getLogger(__name__)
 
@@ -14,25 +15,53 @@ def map_timestamp_to_location(ts, locs):
                 "ts-too-new" ts is newer than all timestamps in locs, or locs is empty
                 "ts-too-old" ts is older than all timestamps in locs
     """
-    status = "ts-too-old" if len(locs) > 0 else "ts-too-new"
-    for idx in range(len(locs)):
-        try:
-            if ts >= locs[idx, 0] and ts < locs[idx + 1, 0]:
-                td = ts - locs[idx, 0]
-                f = td / (locs[idx + 1, 0] - locs[idx, 0])
-                lat = (locs[idx + 1, 1] - locs[idx, 1]) * f + locs[idx, 1]
-                lon = (locs[idx + 1, 2] - locs[idx, 2]) * f + locs[idx, 2]
-
-                return lat, lon, "ok"
-        except IndexError:
-            status = "ts-too-new"
-            break
-
-    if len(locs > 0):
-        _logger.debug(f"oldest: {ts-locs[0,0]} newest: {ts-locs[-1,0]}")
+    if len(locs) == 0:
+        return None, None, "ts-too-new"
+
+    idx = _preceding_entry(ts, locs)
+    if idx < 0:
+        status = "ts-too-old"
+    elif idx >= len(locs) - 1:
+        status = "ts-too-new"
+    else:
+        f = (ts - locs[idx, 0]) / (locs[idx + 1, 0] - locs[idx, 0])
+        lat = (locs[idx + 1, 1] - locs[idx, 1]) * f + locs[idx, 1]
+        lon = (locs[idx + 1, 2] - locs[idx, 2]) * f + locs[idx, 2]
+        return lat, lon, "ok"
+
+    _logger.debug(f"oldest: {ts-locs[0,0]} newest: {ts-locs[-1,0]}")
     return None, None, status
 
 
+def map_timestamps_to_locations(ts, locs):
+    """
+    Batched version of map_timestamp_to_location().
+    Map all timestamps in <ts> to locations (lat,lon) in <locs> in one call.
+    <locs> must be array with entries [time,lat,lon], oldest entry first
+
+    :return: lat, lon, status
+    <lat>, <lon>: arrays of averaged positions, nan where mapping failed
+    <status>: array with status per timestamp, see map_timestamp_to_location()
+    """
+    ts = np.asarray(ts, dtype=float)
+    lat = np.full(len(ts), np.nan)
+    lon = np.full(len(ts), np.nan)
+    status = np.full(len(ts), "ts-too-new", dtype=object)
+    if len(locs) == 0:
+        return lat, lon, status
+
+    idx = _preceding_entry(ts, locs)
+    status[idx < 0] = "ts-too-old"
+    ok = (idx >= 0) & (idx < len(locs) - 1)
+    status[ok] = "ok"
+
+    i = idx[ok]
+    f = (ts[ok] - locs[i, 0]) / (locs[i + 1, 0] - locs[i, 0])
+    lat[ok] = (locs[i + 1, 1] - locs[i, 1]) * f + locs[i, 1]
+    lon[ok] = (locs[i + 1, 2] - locs[i, 2]) * f + locs[i, 2]
+    return lat, lon, status
+
+
 def find_last_unused_location_entry(ts, locs):
     """
     Find the last location entry that is no more used.
@@ -41,12 +70,17 @@ def find_last_unused_location_entry(ts, locs):
 
     :return: idx or None
     """
-    idx = 0
-    for idx in range(len(locs)):
-        try:
-            if ts >= locs[idx, 0] and ts < locs[idx + 1, 0]:
-                break
-        except IndexError:
-            break
+    if len(locs) == 0:
+        return None
+
+    idx = _preceding_entry(ts, locs)
     if idx > 0:
-        return idx - 1
+        return int(idx) - 1
+
+
+def _preceding_entry(ts, locs):
+    """
+    :return: index of the newest entry in <locs> with time <= <ts>, -1 if there is none.
+    Works for scalar and array <ts>.
+    """
+    return np.searchsorted(locs[:, 0], ts, side="right") - 1
@@ -4,11 +4,14 @@ import asyncio
 import logging
 
 import edgefarm_application as ef
+import analyzer
 from analyzer import Analyzer
-from ads_event_reporter import AdsEventReporter
+from ads_event_reporter import AdsEventReporter, BatchingAdsEventReporter
 
 _logger = logging.getLogger(__name__)
 
+METRICS_INTERVAL = 60  # seconds between two analyzer counters log entries
+
 
 async def main():
     loop = asyncio.get_event_loop()
@@ -29,10 +32,40 @@ async def main():
     mqtt_client = ef.AlmMqttModuleClient()
 
     # Prepare reporter to send detected peaks to ADS
-    event_reporter = AdsEventReporter()
+    # ADS_BATCHING=0: one vibration_intensity message per RMS window above threshold
+    # ADS_BATCHING=1: batches of vibration_peaks segments
+    if os.getenv("ADS_BATCHING", "0") == "0":
+        event_reporter = AdsEventReporter()
+    else:
+        # RMS windows up to 1.5 hops apart belong to the same peak segment
+        max_gap_seconds = (
+            analyzer.RMS_HOP_SIZE * analyzer.ACCEL_NOMINAL_SAMPLE_PERIOD * 1.5
+        )
+        event_reporter = BatchingAdsEventReporter(event_q, max_gap_seconds)
 
     # Start the Analyzer
-    Analyzer(event_q, mqtt_client)
+    # ACCEL_TOPICS: comma separated MQTT topics, one per sensor
+    # ACCEL_AXES: comma separated axes to analyze per sensor, e.g. "x,y,z"
+    # PEAK_THRESHOLDS: comma separated thresholds, one for all channels or one per channel
+    accel_topics = _env_list("ACCEL_TOPICS", analyzer.ACCEL_TOPICS)
+    accel_axes = _env_list("ACCEL_AXES", analyzer.ACCEL_AXES)
+    peak_thresholds = [
+        float(t) for t in _env_list("PEAK_THRESHOLDS", [analyzer.PEAK_THRESHOLD])
+    ]
+    # ACCEL_OVERFLOW_POLICY: drop-newest, drop-oldest or decimate
+    accel_overflow_policy = os.getenv(
+        "ACCEL_OVERFLOW_POLICY", analyzer.ACCEL_OVERFLOW_POLICY
+    )
+    peak_analyzer = Analyzer(
+        event_q,
+        mqtt_client,
+        accel_topics,
+        accel_axes,
+        peak_thresholds,
+        accel_overflow_policy,
+    )
+
+    metrics_task = asyncio.create_task(_log_metrics(peak_analyzer))
 
     def signal_handler():
         event_q.put_nowait("stop")
@@ -49,10 +82,25 @@ async def main():
             await event_reporter.report(event)
 
     print("Shutting down...")
+    metrics_task.cancel()
+    await event_reporter.close()
     await mqtt_client.close()
     await ef.application_module_term()
 
 
+async def _log_metrics(peak_analyzer):
+    while True:
+        await asyncio.sleep(METRICS_INTERVAL)
+        _logger.info(f"analyzer counters: {peak_analyzer.counters()}")
+
+
+def _env_list(name, default):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return [v.strip() for v in value.split(",")]
+
+
 if __name__ == "__main__":
     logging.basicConfig(
         level=os.environ.get("LOGLEVEL", "INFO").upper(),
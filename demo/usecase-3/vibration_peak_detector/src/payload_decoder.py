@@ -0,0 +1,40 @@
+import numpy as np
+
+try:
+    # optional, considerably faster JSON parser
+    import orjson as _json
+except ImportError:  # pragma: no cover
+    import json as _json
+
+
+def loads(payload):
+    """
+    Parse a JSON MQTT payload (bytes or str) with the fastest available JSON backend.
+    """
+    return _json.loads(payload)
+
+
+def decode_accel(payload, axes=("z",)):
+    """
+    Convert a decoded `environment/acceleration` payload into an np-array.
+
+    :param payload: dict with "time", "time_delta" and the "accel" sample list
+    :param axes: acceleration axes to extract
+    :return: array with entries [time, <axes>...], oldest entry first
+    """
+    accel = payload["accel"]
+    n = len(accel)
+    num_axes = len(axes)
+    arr = np.empty((n, 1 + num_axes))
+
+    # timestamps are equidistant, derive them from the first one
+    np.multiply(np.arange(n), payload["time_delta"], out=arr[:, 0])
+    arr[:, 0] += payload["time"]
+    if num_axes == 1:
+        axis = axes[0]
+        arr[:, 1] = np.fromiter((s[axis] for s in accel), dtype=float, count=n)
+    else:
+        arr[:, 1:] = np.fromiter(
+            (s[axis] for s in accel for axis in axes), dtype=float, count=n * num_axes
+        ).reshape((n, num_axes))
+    return arr
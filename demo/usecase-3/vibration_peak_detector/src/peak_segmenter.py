@@ -0,0 +1,63 @@
+class PeakSegmenter:
+    def __init__(self, max_gap_seconds):
+        """
+        Merge peak events of consecutive RMS windows into peak segments, per channel.
+
+        :param max_gap_seconds: max time between two windows to be consecutive
+        """
+        self._max_gap_seconds = max_gap_seconds
+        self._open = {}  # channel -> segment that may still be extended
+        self._closed = []
+
+    def segments(self):
+        """
+        :return: number of open and closed segments
+        """
+        return len(self._open) + len(self._closed)
+
+    def add(self, event):
+        """
+        :param event: peak event as reported by Analyzer
+        """
+        channel = event.get("channel", "")
+        t = event["time"]
+        intensity = event["vibrationIntensity"]
+        segment = self._open.get(channel)
+
+        if segment is not None and (
+            (t - segment["endTime"]).total_seconds() <= self._max_gap_seconds
+        ):
+            segment["endTime"] = t
+            segment["windows"] += 1
+            segment["_sum"] += intensity
+            if intensity > segment["maxIntensity"]:
+                segment["maxIntensity"] = intensity
+                segment["lat"] = event["lat"]
+                segment["lon"] = event["lon"]
+            return
+
+        if segment is not None:
+            self._closed.append(segment)
+        self._open[channel] = {
+            "time": t,
+            "endTime": t,
+            "lat": event["lat"],
+            "lon": event["lon"],
+            "channel": channel,
+            "maxIntensity": intensity,
+            "_sum": intensity,
+            "windows": 1,
+        }
+
+    def take(self):
+        """
+        Remove and return all segments, including the ones that may still be extended.
+
+        :return: list of segments in vibration_peaks schema format
+        """
+        segments = self._closed + list(self._open.values())
+        self._closed = []
+        self._open = {}
+        for s in segments:
+            s["meanIntensity"] = s.pop("_sum") / s["windows"]
+        return sorted(segments, key=lambda s: s["time"])
@@ -0,0 +1,216 @@
+"""
+Offline replay of a recorded train ride through the vibration analysis.
+
+Streams the recorded `Accelerometer.csv` and `Location.csv` (phyphox export, as used by
+the train simulation) in chunks through AnalyzerLogic and location_mapper as fast as
+possible and writes the detected peaks to a CSV file.
+
+Example, run from this directory:
+    python replay.py <path-to>/Bahnfahrt_RB10_2021-07-01_08-52-13 -o peaks.csv
+"""
+import argparse
+import csv
+import itertools
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+import analyzer
+from analyzer import AnalyzerLogic
+import location_mapper
+
+_logger = logging.getLogger(__name__)
+
+ACCEL_TIME_COLUMN = "Time (s)"
+ACCEL_AXIS_COLUMNS = {"x": "X (m/s^2)", "y": "Y (m/s^2)", "z": "Z (m/s^2)"}
+LOC_COLUMNS = ("Time (s)", "Latitude (°)", "Longitude (°)")
+CHUNK_SIZE = 10000  # accel samples processed at once
+
+
+def parse_args(args):
+
+    parser = argparse.ArgumentParser(
+        description="Replay a recorded train ride through the vibration peak detection"
+    )
+    parser.add_argument(
+        "ride",
+        help="directory containing Accelerometer.csv and Location.csv",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        default="peaks.csv",
+        help="output csv with the detected peaks (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--axes",
+        default=",".join(analyzer.ACCEL_AXES),
+        help="comma separated axes to analyze (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--threshold",
+        default=str(analyzer.PEAK_THRESHOLD),
+        help="comma separated peak thresholds, one for all or one per axis (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--window",
+        type=int,
+        default=analyzer.RMS_WINDOW_SIZE,
+        help="RMS window size in samples (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--hop",
+        type=int,
+        default=None,
+        help="samples between two RMS windows (default: window size)",
+    )
+    parser.add_argument(
+        "--sample-period",
+        type=float,
+        default=analyzer.ACCEL_NOMINAL_SAMPLE_PERIOD,
+        help="nominal accel sample period in s (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--start-time",
+        type=float,
+        default=0.0,
+        help="unix time of the start of the recording, added to all timestamps",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=CHUNK_SIZE,
+        help="accel samples processed at once (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        dest="loglevel",
+        help="set loglevel to INFO",
+        action="store_const",
+        const=logging.INFO,
+    )
+    parser.add_argument(
+        "-vv",
+        "--very-verbose",
+        dest="loglevel",
+        help="set loglevel to DEBUG",
+        action="store_const",
+        const=logging.DEBUG,
+    )
+    return parser.parse_args(args)
+
+
+def setup_logging(loglevel):
+
+    logformat = "[%(asctime)s] %(levelname)s:%(name)s:%(message)s"
+    logging.basicConfig(
+        level=loglevel, stream=sys.stdout, format=logformat, datefmt="%Y-%m-%d %H:%M:%S"
+    )
+
+
+def read_csv_chunks(filename, columns, chunk_size):
+    """
+    Read the <columns> of a csv file with header line.
+
+    :return: generator of arrays with up to <chunk_size> rows, columns in given order
+    """
+    with open(filename, newline="") as stream:
+        header = next(csv.reader([stream.readline()]))
+        try:
+            usecols = [header.index(c) for c in columns]
+        except ValueError:
+            raise ValueError(f"{filename}: expected columns {columns}, got {header}")
+
+        while True:
+            lines = list(itertools.islice(stream, chunk_size))
+            if len(lines) == 0:
+                break
+            yield np.loadtxt(lines, delimiter=",", usecols=usecols, ndmin=2)
+
+
+def read_csv(filename, columns):
+    chunks = list(read_csv_chunks(filename, columns, CHUNK_SIZE))
+    if len(chunks) == 0:
+        return np.empty((0, len(columns)))
+    return np.concatenate(chunks)
+
+
+def replay(accel_chunks, locs, axes, thresholds, logic, peak_writer, start_time=0.0):
+    """
+    Run the analysis over all <accel_chunks> and write the peaks with <peak_writer>.
+
+    :param accel_chunks: iterable of arrays with entries [time, <axes>...]
+    :param locs: array with entries [time, lat, lon], oldest entry first
+    :return: number of samples, number of RMS windows, number of peaks
+    """
+    num_samples = num_windows = num_peaks = 0
+    for accel in accel_chunks:
+        num_samples += len(accel)
+        ts, rms = logic.analyze_stream(accel)
+        num_windows += len(ts)
+        if len(ts) == 0:
+            continue
+
+        lat, lon, map_status = location_mapper.map_timestamps_to_locations(ts, locs)
+        peaks = (rms > thresholds) & (map_status == "ok")[:, np.newaxis]
+        for window, channel in zip(*np.nonzero(peaks)):
+            peak_writer.writerow(
+                [
+                    f"{ts[window] + start_time:.3f}",
+                    lat[window],
+                    lon[window],
+                    axes[channel],
+                    rms[window, channel],
+                ]
+            )
+        num_peaks += np.count_nonzero(peaks)
+
+    return num_samples, num_windows, num_peaks
+
+
+def main(args):
+
+    args = parse_args(args)
+    setup_logging(args.loglevel)
+
+    axes = [a.strip() for a in args.axes.split(",")]
+    thresholds = np.array([float(t) for t in args.threshold.split(",")])
+    if len(thresholds) not in (1, len(axes)):
+        raise ValueError(f"Expected 1 or {len(axes)} thresholds")
+
+    locs = read_csv(os.path.join(args.ride, "Location.csv"), LOC_COLUMNS)
+    _logger.info(f"Loaded {len(locs)} locations")
+
+    accel_chunks = read_csv_chunks(
+        os.path.join(args.ride, "Accelerometer.csv"),
+        [ACCEL_TIME_COLUMN] + [ACCEL_AXIS_COLUMNS[a] for a in axes],
+        args.chunk_size,
+    )
+    logic = AnalyzerLogic(args.window, args.sample_period, args.hop)
+
+    start = time.perf_counter()
+    with open(args.output, "w", newline="") as output:
+        peak_writer = csv.writer(output)
+        peak_writer.writerow(["time", "lat", "lon", "axis", "vibrationIntensity"])
+        num_samples, num_windows, num_peaks = replay(
+            accel_chunks, locs, axes, thresholds, logic, peak_writer, args.start_time
+        )
+    elapsed = max(time.perf_counter() - start, 1e-9)
+
+    print(
+        f"{num_samples} samples, {num_windows} RMS windows, {num_peaks} peaks "
+        f"in {elapsed:.2f} s ({num_samples / elapsed:,.0f} samples/s)"
+    )
+    print(f"Peaks written to {args.output}")
+
+
+def run():
+    main(sys.argv[1:])
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,122 @@
+import collections
+import logging
+import numpy as np
+
+_logger = logging.getLogger(__name__)
+
+
+class SensorAligner:
+    def __init__(self, num_sensors, num_axes, tolerance, stall_timeout, capacity):
+        """
+        Merge the samples of synchronously sampled sensors into rows of one columnar array.
+
+        Each sensor delivers arrays with entries [time, axis0, axis1, ...], oldest entry
+        first. Samples are matched on their timestamps: each sample of the reference
+        sensor gets the nearest sample of every other sensor in its row:
+        [time, sensor0-axis0, sensor0-axis1, ..., sensor1-axis0, ...]
+        The reference is sensor 0, or the first live sensor while sensor 0 is stalled.
+        The time column is taken from the reference. Reference samples without a sample
+        of every live sensor within <tolerance> are dropped.
+
+        A sensor is stalled while its newest sample is more than <stall_timeout> older
+        than the newest sample of any sensor. Rows are then released without it, its
+        columns are NaN.
+
+        :param tolerance: max time difference between the samples of a row, below the
+        sample period
+        :param stall_timeout: seconds of sample time the other sensors wait for a sensor
+        :param capacity: max number of samples staged per sensor, the oldest are dropped
+        beyond
+        """
+        self._num_sensors = num_sensors
+        self._num_axes = num_axes
+        self._tolerance = tolerance
+        self._stall_timeout = stall_timeout
+        self._capacity = capacity
+        self._staged = [np.empty((0, 1 + num_axes)) for _ in range(num_sensors)]
+        self._latest = np.full(num_sensors, -np.inf)  # timestamp of the newest sample per sensor
+        self._start = None  # timestamp of the first sample of any sensor
+        self._released = -np.inf  # timestamp of the last row released
+        self.counters = collections.Counter()
+
+    def columns(self):
+        return 1 + self._num_sensors * self._num_axes
+
+    def add(self, sensor, arr):
+        """
+        Stage samples of <sensor>.
+
+        :return: array with all rows that can't get further samples, possibly empty
+        """
+        if self._num_sensors == 1:
+            return arr
+        if len(arr) == 0:
+            return np.empty((0, self.columns()))
+
+        if self._start is None:
+            self._start = arr[0, 0]
+        self._latest[sensor] = max(self._latest[sensor], arr[-1, 0])
+
+        staged = np.concatenate((self._staged[sensor], arr))
+        if len(staged) > self._capacity:
+            self.counters["dropped"] += len(staged) - self._capacity
+            _logger.error(
+                f"Sensor {sensor}: other sensors are lagging. "
+                f"Dropping {len(staged) - self._capacity} samples"
+            )
+            staged = staged[-self._capacity :]  # noqa E203
+        self._staged[sensor] = staged
+        return self._release()
+
+    def _release(self):
+        # sensors that never delivered are stalled <stall_timeout> after the first sample
+        live = np.maximum(self._latest, self._start) >= self._latest.max() - self._stall_timeout
+        ref = int(np.argmax(live))
+        # every live sensor has delivered up to here, the nearest samples are known
+        horizon = self._latest[live].min()
+
+        ref_staged = self._staged[ref]
+        # after switching the reference, its samples of released rows are skipped
+        start = np.searchsorted(ref_staged[:, 0], self._released + self._tolerance, side="right")
+        end = np.searchsorted(ref_staged[:, 0], horizon, side="right")
+        times = ref_staged[start:end, 0]
+        rows = np.full((len(times), self.columns()), np.nan)
+        rows[:, 0] = times
+        matched = np.ones(len(times), dtype=bool)
+        for i, s in enumerate(self._staged):
+            col = 1 + i * self._num_axes
+            if i == ref:
+                rows[:, col : col + self._num_axes] = ref_staged[start:end, 1:]  # noqa E203
+            elif live[i] and len(s) == 0:
+                matched[:] = False
+            elif live[i]:
+                nearest = _nearest(s[:, 0], times)
+                matched &= np.abs(s[nearest, 0] - times) <= self._tolerance
+                rows[:, col : col + self._num_axes] = s[nearest, 1:]  # noqa E203
+
+        # keep the samples upcoming reference samples may be matched with
+        self._staged[ref] = ref_staged[end:]
+        for i, s in enumerate(self._staged):
+            if i != ref:
+                self._staged[i] = s[np.searchsorted(s[:, 0], horizon - self._tolerance, side="right"):]
+
+        unmatched = len(times) - np.count_nonzero(matched)
+        if unmatched > 0:
+            self.counters["unmatched"] += unmatched
+            _logger.warning(f"Dropping {unmatched} samples without matching samples of all sensors")
+        if not live.all():
+            self.counters["stalled_rows"] += np.count_nonzero(matched)
+        if len(times) > 0:
+            self._released = times[-1]
+        return rows[matched]
+
+
+def _nearest(times, t):
+    """
+    :param times: ascending timestamps, not empty
+    :return: index of the entry of <times> nearest to each entry of <t>
+    """
+    idx = np.searchsorted(times, t)
+    before = np.clip(idx - 1, 0, len(times) - 1)
+    after = np.clip(idx, 0, len(times) - 1)
+    return np.where(np.abs(times[before] - t) <= np.abs(times[after] - t), before, after)
@@ -0,0 +1,87 @@
+import logging
+import numpy as np
+
+_logger = logging.getLogger(__name__)
+
+
+class SlidingRms:
+    def __init__(self, window_size, hop_size, accel_nominal_sample_period):
+        """
+        Streaming RMS over the differential of the acceleration.
+        All acceleration channels (columns after the time column) are computed at once.
+
+        Computes one RMS value every <hop_size> samples over the last <window_size>
+        samples. Samples can be fed in chunks of any length; samples still needed
+        for upcoming windows are carried over to the next call.
+
+        The window sums are taken from a running (cumulative) sum of the squared
+        differentials, so the cost per sample is constant regardless of window size
+        and overlap. With hop_size == window_size the results are identical to
+        AnalyzerLogic._analyze_chunk() over disjoint windows.
+
+        :param window_size: number of samples over which RMS is computed
+        :param hop_size: number of samples between the start of two windows
+        :param accel_nominal_sample_period: nominal time between two samples
+        """
+        if hop_size < 1 or window_size < 2:
+            raise ValueError("window_size must be >= 2 and hop_size >= 1")
+        self._window_size = window_size
+        self._hop_size = hop_size
+        self._max_window_duration = accel_nominal_sample_period * window_size * 1.1
+        self._tail = None
+        self._next_start = 0  # start index of next window, relative to self._tail
+
+    def process(self, accel):
+        """
+        Feed new samples and compute all windows that are complete.
+
+        :param accel: array with entries [time, channel0, channel1, ...], oldest entry first
+        :return: ts, rms
+
+        <ts> array with the timestamp of the middle entry of each window
+        <rms> array with the rms values of each window, shape (windows, channels)
+        Windows with time gaps are not part of the result.
+        """
+        buf = np.concatenate((self._tail, accel)) if self._tail is not None else accel
+        n = len(buf)
+        w = self._window_size
+
+        if self._next_start + w > n:
+            self._carry_over(buf, self._next_start)
+            return np.empty(0), np.empty((0, buf.shape[1] - 1))
+
+        starts = np.arange(self._next_start, n - w + 1, self._hop_size)
+        # running sum of squared differentials.
+        # window at s covers the differentials of the sample pairs s .. s+w-2
+        sq_sum = np.zeros((n - self._next_start, buf.shape[1] - 1))
+        np.cumsum(
+            np.square(np.diff(buf[self._next_start :, 1:], axis=0)),  # noqa E203
+            axis=0,
+            out=sq_sum[1:],
+        )
+        rel = starts - self._next_start
+        # first differential of a window is 0 (prepend), but it counts for the mean
+        rms = np.sqrt((sq_sum[rel + w - 1] - sq_sum[rel]) / w)
+        ts = buf[starts + w // 2, 0]
+
+        gaps = (buf[starts + w - 1, 0] - buf[starts, 0]) > self._max_window_duration
+        if gaps.any():
+            _logger.error(f"Time gap. Not analyzing {np.count_nonzero(gaps)} windows")
+            ts = ts[~gaps]
+            rms = rms[~gaps]
+
+        self._carry_over(buf, starts[-1] + self._hop_size)
+        return ts, rms
+
+    def reset(self):
+        self._tail = None
+        self._next_start = 0
+
+    def _carry_over(self, buf, next_start):
+        if next_start >= len(buf):
+            # hop_size > window_size: skip samples that are in no window
+            self._tail = None
+            self._next_start = next_start - len(buf)
+        else:
+            self._tail = buf[next_start:].copy()
+            self._next_start = 0
@@ -0,0 +1,60 @@
+import asyncio
+import unittest
+import numpy as np
+from vibration_peak_detector.src.accel_buffer import AccelBuffer
+
+
+def samples(start, n):
+    a = np.ndarray((n, 2))
+    a[:, 0] = np.arange(start, start + n)
+    a[:, 1] = a[:, 0] * 10
+    return a
+
+
+class TestAccelBuffer(unittest.IsolatedAsyncioTestCase):
+    async def test_coalescing_wakeup(self):
+        b = AccelBuffer((10, 2))
+        b.push(samples(0, 2))
+        b.push(samples(2, 2))
+        await asyncio.wait_for(b.wait(), 1)
+        self.assertTrue(np.array_equal(b.pop_all(), samples(0, 4)))
+        self.assertEqual(b.counters["wakeups"], 1)
+        self.assertEqual(b.counters["coalesced_wakeups"], 1)
+
+        # no further wakeup pending
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(b.wait(), 0.01)
+
+    def test_drop_newest(self):
+        b = AccelBuffer((10, 2), "drop-newest")
+        b.push(samples(0, 8))
+        b.push(samples(8, 4))
+        self.assertTrue(np.array_equal(b.pop_all(), samples(0, 10)))
+        self.assertEqual(b.counters["dropped_newest"], 2)
+        self.assertEqual(b.dropped_samples(), 2)
+
+    def test_drop_oldest(self):
+        b = AccelBuffer((10, 2), "drop-oldest")
+        b.push(samples(0, 8))
+        b.push(samples(8, 4))
+        self.assertTrue(np.array_equal(b.pop_all(), samples(2, 10)))
+        self.assertEqual(b.counters["dropped_oldest"], 2)
+
+        b.push(samples(0, 15))
+        self.assertTrue(np.array_equal(b.pop_all(), samples(5, 10)))
+        self.assertEqual(b.dropped_samples(), 7)
+
+    def test_decimate(self):
+        b = AccelBuffer((100, 2), "decimate", decimation=2, high_watermark=0.5)
+        for i in range(5):
+            b.push(samples(i * 10, 10))
+        self.assertEqual(b.entries(), 50)
+        # above high watermark: only every 2nd message is taken
+        for i in range(5, 9):
+            b.push(samples(i * 10, 10))
+        self.assertEqual(b.entries(), 70)
+        self.assertEqual(b.counters["decimated"], 20)
+
+    def test_invalid_policy(self):
+        with self.assertRaises(ValueError):
+            AccelBuffer((10, 2), "drop-all")
@@ -1,6 +1,13 @@
+import asyncio
+import json
 import unittest
+from unittest.mock import patch
 import numpy as np
-from vibration_peak_detector.src.analyzer import AnalyzerLogic
+from vibration_peak_detector.src.analyzer import (
+    Analyzer,
+    AnalyzerLogic,
+    RMS_WINDOW_SIZE,
+)
 
 
 class TestAnalyzer(unittest.TestCase):
@@ -32,3 +39,153 @@ class TestAnalyzer(unittest.TestCase):
         accel = np.ndarray((100, 2))
         accel[:, 0] = np.linspace(1, 2.2, 100)
         self.assertTrue(logic._has_time_gaps(accel))
+
+
+class FakeMqttClient:
+    def __init__(self):
+        self.handlers = {}
+
+    async def subscribe(self, topic, handler):
+        self.handlers[topic] = handler
+
+    async def publish(self, topic, payload):
+        await self.handlers[topic]({"payload": json.dumps(payload).encode()})
+
+
+class TestAnalyzerMapping(unittest.IsolatedAsyncioTestCase):
+    T0 = 1625122333.0
+
+    async def asyncSetUp(self):
+        self.q = asyncio.Queue()
+        self.mqtt_client = FakeMqttClient()
+        self.analyzer = Analyzer(self.q, self.mqtt_client)
+        # let the monitor task register its handlers
+        await asyncio.sleep(0)
+
+    async def asyncTearDown(self):
+        self.analyzer.stop()
+
+    async def publish_accel(self, n):
+        # alternating z values -> rms over differential is 2.0, always a peak
+        await self.mqtt_client.publish(
+            "environment/acceleration",
+            {
+                "time": self.T0,
+                "time_delta": 0.01,
+                "accel": [{"z": 9.81 + (i % 2) * 2.0} for i in range(n)],
+            },
+        )
+
+    async def publish_loc(self, ts, lat, lon):
+        await self.mqtt_client.publish(
+            "environment/location", {"time": ts, "lat": lat, "lon": lon}
+        )
+
+    async def test_waits_for_location(self):
+        await self.publish_accel(RMS_WINDOW_SIZE * 2)
+        await self.publish_loc(self.T0 - 1, 49.0, 11.0)
+        await asyncio.sleep(0.01)
+        # no location newer than the RMS windows yet
+        self.assertTrue(self.q.empty())
+
+        await self.publish_loc(self.T0 + 9, 50.0, 12.0)
+        events = [await asyncio.wait_for(self.q.get(), 1) for _ in range(2)]
+
+        self.assertAlmostEqual(events[0]["lat"], 49.14)
+        self.assertAlmostEqual(events[0]["lon"], 11.14)
+        self.assertAlmostEqual(events[1]["lat"], 49.22)
+        self.assertAlmostEqual(events[0]["vibrationIntensity"], 2.0, 1)
+
+    async def test_unmappable_windows_time_out(self):
+        with patch(
+            "vibration_peak_detector.src.analyzer.MAP_TIMESTAMP_TIMEOUT_SECONDS", 0.05
+        ):
+            await self.publish_accel(RMS_WINDOW_SIZE)
+            await asyncio.sleep(0.2)
+            self.assertEqual(len(self.analyzer._pending), 0)
+            self.assertTrue(self.q.empty())
+
+    async def test_pending_changes_while_reporting(self):
+        # the report queue is full after the first peak, so the mapper blocks while
+        # the monitor task adds windows and drops the oldest ones
+        self.analyzer.stop()
+        self.q = asyncio.Queue(maxsize=1)
+        self.analyzer = Analyzer(self.q, self.mqtt_client)
+        await asyncio.sleep(0)
+        with patch("vibration_peak_detector.src.analyzer.PENDING_WINDOWS_CAPACITY", 3):
+            await self.publish_loc(self.T0 - 1, 49.0, 11.0)
+            await self.publish_loc(self.T0 + 100, 50.0, 12.0)
+            await self.publish_accel(RMS_WINDOW_SIZE * 3)
+            await asyncio.sleep(0.01)
+            self.T0 += RMS_WINDOW_SIZE * 3 * 0.01
+            await self.publish_accel(RMS_WINDOW_SIZE * 5)
+            await asyncio.sleep(0.01)
+
+            events = []
+            while len(events) < 8:
+                try:
+                    events.append(await asyncio.wait_for(self.q.get(), 0.1))
+                except asyncio.TimeoutError:
+                    break
+
+        times = [e["time"].timestamp() for e in events]
+        self.assertEqual(times, sorted(set(times)))
+        for event, ts in zip(events, times):
+            # location interpolated for the reported window
+            self.assertAlmostEqual(event["lat"], 49.0 + (ts - (TestAnalyzerMapping.T0 - 1)) / 101)
+        counters = self.analyzer.counters()
+        self.assertEqual(counters["map_ok"], len(events))
+        self.assertGreater(counters["pending_dropped"], 0)
+        self.assertEqual(counters["map_ok"] + counters["pending_dropped"], 8)
+
+
+class TestAnalyzerMultiSensor(unittest.IsolatedAsyncioTestCase):
+    T0 = 1625122333.0
+
+    async def test_per_channel_thresholds(self):
+        q = asyncio.Queue()
+        mqtt_client = FakeMqttClient()
+        analyzer = Analyzer(
+            q,
+            mqtt_client,
+            accel_topics=("bogie1/acceleration", "bogie2/acceleration"),
+            accel_axes=("x", "z"),
+            peak_thresholds=[0.5, 0.5, 0.5, 3.0],
+        )
+        await asyncio.sleep(0)
+        try:
+            n = RMS_WINDOW_SIZE
+            for topic in ("bogie1/acceleration", "bogie2/acceleration"):
+                # alternating values -> rms over differential is 2.0 on x and z
+                await mqtt_client.publish(
+                    topic,
+                    {
+                        "time": self.T0,
+                        "time_delta": 0.01,
+                        "accel": [
+                            {"x": (i % 2) * 2.0, "y": 0.0, "z": 9.81 + (i % 2) * 2.0}
+                            for i in range(n)
+                        ],
+                    },
+                )
+            await mqtt_client.publish(
+                "environment/location", {"time": self.T0 - 1, "lat": 49.0, "lon": 11.0}
+            )
+            await mqtt_client.publish(
+                "environment/location", {"time": self.T0 + 1, "lat": 50.0, "lon": 12.0}
+            )
+            events = [await asyncio.wait_for(q.get(), 1) for _ in range(3)]
+            await asyncio.sleep(0.01)
+            self.assertTrue(q.empty())
+
+            # bogie2 z is below its threshold
+            self.assertEqual(
+                [e["channel"] for e in events],
+                ["bogie1/acceleration:x", "bogie1/acceleration:z", "bogie2/acceleration:x"],
+            )
+        finally:
+            analyzer.stop()
+
+    def test_invalid_thresholds(self):
+        with self.assertRaises(ValueError):
+            Analyzer(asyncio.Queue(), FakeMqttClient(), accel_axes=("x", "z"), peak_thresholds=[1, 2, 3])
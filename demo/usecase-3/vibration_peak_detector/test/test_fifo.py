@@ -56,3 +56,47 @@ class TestFifo(unittest.TestCase):
 
         with self.assertRaises(BufferError):
             a = f.pop(2)
+
+    def test_2d_wraparound(self):
+        cols = 2
+        f = Fifo((10, cols))
+
+        f.push(self.data_2d(cols, 0, 8, 1))
+        f.pop(6)
+        # 4 entries fit at the end, 2 wrap to the start of the buffer
+        f.push(self.data_2d(cols, 8, 6, 1))
+        self.assertEqual(f.entries(), 8)
+        self.assertEqual(f.free_entries(), 2)
+
+        a = f.peek(8)
+        self.assertTrue(np.array_equal(a, self.data_2d(cols, 6, 8, 1)))
+
+        a = f.pop(5)
+        self.assertTrue(np.array_equal(a, self.data_2d(cols, 6, 5, 1)))
+
+        # popped data must not change when the buffer is overwritten
+        f.push(self.data_2d(cols, 14, 7, 1))
+        self.assertTrue(np.array_equal(a, self.data_2d(cols, 6, 5, 1)))
+
+        a = f.pop(10)
+        self.assertTrue(np.array_equal(a, self.data_2d(cols, 11, 10, 1)))
+        self.assertEqual(f.entries(), 0)
+
+    def test_single_entry_push(self):
+        f = Fifo((4, 3))
+        f.push(np.array([1.0, 49.1, 11.4]))
+        f.push(np.array([2.0, 49.4, 11.3]))
+        self.assertEqual(f.entries(), 2)
+        self.assertTrue(
+            np.array_equal(f.peek(2), [[1.0, 49.1, 11.4], [2.0, 49.4, 11.3]])
+        )
+
+    def test_1d(self):
+        f = Fifo(5)
+        f.push(np.arange(4))
+        self.assertTrue(np.array_equal(f.pop(3), [0, 1, 2]))
+        f.push(np.arange(4, 8))
+        self.assertTrue(np.array_equal(f.peek(5), [3, 4, 5, 6, 7]))
+        f.clear()
+        self.assertEqual(f.entries(), 0)
+        self.assertEqual(f.free_entries(), 5)
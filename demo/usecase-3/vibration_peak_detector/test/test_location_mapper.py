@@ -2,6 +2,7 @@ import unittest
 import numpy as np
 from vibration_peak_detector.src.location_mapper import (
     map_timestamp_to_location,
+    map_timestamps_to_locations,
     find_last_unused_location_entry,
 )
 
@@ -63,7 +64,41 @@ class TestLocationMapper(unittest.TestCase):
         idx = find_last_unused_location_entry(5.0, location_records)
         self.assertEqual(idx, 2)
 
+        # all entries are newer than ts
+        idx = find_last_unused_location_entry(0.5, location_records)
+        self.assertIsNone(idx)
+
         # no entries in fifo
         location_records = np.array([])
         idx = find_last_unused_location_entry(1.0, location_records)
         self.assertIsNone(idx)
+
+    def test_map_timestamps_to_locations(self):
+        location_records = np.array(
+            [
+                [1.0, 49.1, 11.4],
+                [2.0, 49.4, 11.3],
+                [3.0, 49.8, 11.2],
+                [4.0, 49.6, 11.4],
+            ]
+        )
+        ts = np.array([0.5, 1.0, 3.5, 4.0, 5.0])
+
+        lat, lon, status = map_timestamps_to_locations(ts, location_records)
+        self.assertEqual(
+            list(status), ["ts-too-old", "ok", "ok", "ts-too-new", "ts-too-new"]
+        )
+        for i, t in enumerate(ts):
+            exp_lat, exp_lon, exp_status = map_timestamp_to_location(
+                t, location_records
+            )
+            self.assertEqual(status[i], exp_status)
+            if exp_status == "ok":
+                self.assertAlmostEqual(lat[i], exp_lat)
+                self.assertAlmostEqual(lon[i], exp_lon)
+            else:
+                self.assertTrue(np.isnan(lat[i]) and np.isnan(lon[i]))
+
+        # no entries in fifo
+        lat, lon, status = map_timestamps_to_locations(ts, np.array([]))
+        self.assertTrue(all(s == "ts-too-new" for s in status))
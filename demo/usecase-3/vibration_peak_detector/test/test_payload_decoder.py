@@ -0,0 +1,36 @@
+import json
+import unittest
+import numpy as np
+from vibration_peak_detector.src.payload_decoder import loads, decode_accel
+
+
+class TestPayloadDecoder(unittest.TestCase):
+    def test_loads(self):
+        payload = loads(b'{"time": 1.5, "lat": 49.1, "lon": 11.4}')
+        self.assertEqual(payload, {"time": 1.5, "lat": 49.1, "lon": 11.4})
+
+    def test_decode_accel(self):
+        payload = {
+            "time": 1625122333.25,
+            "time_delta": 0.01,
+            "accel": [{"x": 0.1, "y": 0.2, "z": z} for z in (9.81, 9.7, 9.9)],
+        }
+        arr = decode_accel(loads(json.dumps(payload)))
+        self.assertEqual(arr.shape, (3, 2))
+        self.assertTrue(
+            np.allclose(arr[:, 0], [1625122333.25, 1625122333.26, 1625122333.27])
+        )
+        self.assertTrue(np.array_equal(arr[:, 1], [9.81, 9.7, 9.9]))
+
+    def test_decode_accel_empty(self):
+        arr = decode_accel({"time": 1.0, "time_delta": 0.01, "accel": []})
+        self.assertEqual(arr.shape, (0, 2))
+
+    def test_decode_accel_axes(self):
+        payload = {
+            "time": 10.0,
+            "time_delta": 0.5,
+            "accel": [{"x": 1.0, "y": 2.0, "z": 3.0}, {"x": 4.0, "y": 5.0, "z": 6.0}],
+        }
+        arr = decode_accel(payload, ("x", "y", "z"))
+        self.assertTrue(np.array_equal(arr, [[10.0, 1, 2, 3], [10.5, 4, 5, 6]]))
@@ -0,0 +1,54 @@
+import datetime
+import unittest
+from vibration_peak_detector.src.peak_segmenter import PeakSegmenter
+
+T0 = datetime.datetime(2021, 7, 1, 8, 52, 13)
+
+
+def event(seconds, intensity, channel="environment/acceleration:z"):
+    return {
+        "time": T0 + datetime.timedelta(seconds=seconds),
+        "lat": 49.0 + seconds,
+        "lon": 11.0 + seconds,
+        "vibrationIntensity": intensity,
+        "channel": channel,
+    }
+
+
+class TestPeakSegmenter(unittest.TestCase):
+    def test_merge_consecutive_windows(self):
+        s = PeakSegmenter(1.2)
+        s.add(event(0.0, 0.5))
+        s.add(event(0.8, 0.9))
+        s.add(event(1.6, 0.7))
+        # gap -> new segment
+        s.add(event(5.0, 0.6))
+        self.assertEqual(s.segments(), 2)
+
+        segments = s.take()
+        self.assertEqual(s.segments(), 0)
+        self.assertEqual(len(segments), 2)
+
+        first = segments[0]
+        self.assertEqual(first["time"], T0)
+        self.assertEqual(first["endTime"], T0 + datetime.timedelta(seconds=1.6))
+        self.assertEqual(first["windows"], 3)
+        self.assertAlmostEqual(first["maxIntensity"], 0.9)
+        self.assertAlmostEqual(first["meanIntensity"], 0.7)
+        # location of max intensity
+        self.assertAlmostEqual(first["lat"], 49.8)
+        self.assertNotIn("_sum", first)
+
+        self.assertEqual(segments[1]["windows"], 1)
+        self.assertAlmostEqual(segments[1]["meanIntensity"], 0.6)
+
+    def test_channels_are_separate(self):
+        s = PeakSegmenter(1.2)
+        s.add(event(0.0, 0.5, "a:z"))
+        s.add(event(0.0, 0.6, "b:z"))
+        s.add(event(0.8, 0.7, "a:z"))
+        segments = s.take()
+        self.assertEqual(
+            sorted((seg["channel"], seg["windows"]) for seg in segments),
+            [("a:z", 2), ("b:z", 1)],
+        )
@@ -0,0 +1,63 @@
+import csv
+import os
+import tempfile
+import unittest
+import numpy as np
+from vibration_peak_detector.src import replay
+
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.ride = self._dir.name
+
+        n = 1000
+        t = np.arange(n) * 0.01
+        z = np.full(n, 9.81)
+        # vibration between 4.0 and 4.8 s
+        z[400:480] += np.tile([0.0, 2.0], 40)
+        with open(os.path.join(self.ride, "Accelerometer.csv"), "w") as f:
+            f.write('"Time (s)","X (m/s^2)","Y (m/s^2)","Z (m/s^2)"\n')
+            for i in range(n):
+                f.write(f"{t[i]:.3f},0.1,0.2,{z[i]:.4f}\n")
+
+        with open(os.path.join(self.ride, "Location.csv"), "w") as f:
+            f.write('"Time (s)","Latitude (°)","Longitude (°)","Height (m)"\n')
+            for i in range(11):
+                f.write(f"{i:.1f},{49.0 + i * 0.01:.4f},{11.0 + i * 0.01:.4f},300\n")
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def test_read_csv_chunks(self):
+        chunks = list(
+            replay.read_csv_chunks(
+                os.path.join(self.ride, "Accelerometer.csv"),
+                ["Time (s)", "Z (m/s^2)"],
+                300,
+            )
+        )
+        self.assertEqual([len(c) for c in chunks], [300, 300, 300, 100])
+        self.assertEqual(chunks[1].shape, (300, 2))
+        self.assertAlmostEqual(chunks[1][0, 0], 3.0)
+
+    def test_replay(self):
+        output = os.path.join(self.ride, "peaks.csv")
+        replay.main([self.ride, "-o", output, "--chunk-size", "128"])
+
+        with open(output, newline="") as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(len(rows), 1)
+        self.assertAlmostEqual(float(rows[0]["time"]), 4.4)
+        self.assertAlmostEqual(float(rows[0]["lat"]), 49.044)
+        self.assertEqual(rows[0]["axis"], "z")
+        self.assertAlmostEqual(float(rows[0]["vibrationIntensity"]), 2.0, 1)
+
+    def test_replay_overlapping_windows(self):
+        output = os.path.join(self.ride, "peaks.csv")
+        replay.main([self.ride, "-o", output, "--hop", "20"])
+
+        with open(output, newline="") as f:
+            rows = list(csv.DictReader(f))
+        # windows starting at 340 .. 460 overlap the vibration enough
+        self.assertGreater(len(rows), 1)
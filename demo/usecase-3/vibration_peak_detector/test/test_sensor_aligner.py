@@ -0,0 +1,100 @@
+import unittest
+import numpy as np
+from vibration_peak_detector.src.sensor_aligner import SensorAligner
+
+
+class TestSensorAligner(unittest.TestCase):
+    def samples(self, start, n, value):
+        a = np.ndarray((n, 3))
+        a[:, 0] = start + np.arange(n) * 0.01
+        a[:, 1] = value
+        a[:, 2] = -value
+        return a
+
+    def aligner(self, capacity=1000):
+        return SensorAligner(2, 2, 0.005, 0.5, capacity)
+
+    def test_single_sensor_passthrough(self):
+        aligner = SensorAligner(1, 2, 0.005, 0.5, 100)
+        arr = self.samples(0, 5, 1)
+        self.assertIs(aligner.add(0, arr), arr)
+
+    def test_align(self):
+        aligner = self.aligner()
+        self.assertEqual(aligner.columns(), 5)
+
+        rows = aligner.add(0, self.samples(0, 5, 1))
+        self.assertEqual(rows.shape, (0, 5))
+
+        rows = aligner.add(1, self.samples(0.001, 3, 2))
+        self.assertEqual(rows.shape, (3, 5))
+        # time is taken from sensor 0
+        self.assertTrue(np.allclose(rows[:, 0], [0, 0.01, 0.02]))
+        self.assertTrue(np.array_equal(rows[0, 1:], [1, -1, 2, -2]))
+
+        rows = aligner.add(1, self.samples(0.031, 4, 2))
+        self.assertEqual(len(rows), 2)
+        self.assertTrue(np.allclose(rows[:, 0], [0.03, 0.04]))
+
+    def test_align_on_timestamps(self):
+        aligner = self.aligner()
+        # sensor 1 started 3 samples later
+        aligner.add(0, self.samples(0, 10, 1))
+        rows = aligner.add(1, self.samples(0.0301, 10, 2))
+        self.assertTrue(np.allclose(rows[:, 0], np.arange(3, 10) * 0.01))
+        self.assertTrue(np.all(rows[:, 3] == 2))
+        # the samples of sensor 0 before sensor 1 started have no match
+        self.assertEqual(aligner.counters["unmatched"], 3)
+
+    def test_missing_samples_are_dropped(self):
+        aligner = self.aligner()
+        aligner.add(0, self.samples(0, 10, 1))
+        # sample 4 of sensor 1 is lost
+        s1 = self.samples(0.001, 10, 2)
+        rows = aligner.add(1, np.delete(s1, 4, axis=0))
+        self.assertTrue(np.allclose(rows[:, 0], np.delete(np.arange(10) * 0.01, 4)))
+        self.assertEqual(aligner.counters["unmatched"], 1)
+
+    def test_stalled_sensor(self):
+        aligner = self.aligner()
+        aligner.add(0, self.samples(0, 10, 1))
+        self.assertEqual(len(aligner.add(1, self.samples(0, 10, 2))), 10)
+
+        # sensor 1 stops, sensor 0 waits for it up to 0.5 s of samples
+        self.assertEqual(len(aligner.add(0, self.samples(0.1, 40, 1))), 0)
+        rows = aligner.add(0, self.samples(0.5, 20, 1))
+        self.assertTrue(np.allclose(rows[:, 0], 0.1 + np.arange(60) * 0.01))
+        self.assertTrue(np.all(rows[:, 1] == 1))
+        self.assertTrue(np.all(np.isnan(rows[:, 3:])))
+        self.assertEqual(aligner.counters["stalled_rows"], 60)
+
+        # sensor 1 is back
+        aligner.add(1, self.samples(0.7, 10, 2))
+        rows = aligner.add(0, self.samples(0.7, 10, 1))
+        self.assertTrue(np.allclose(rows[:, 0], 0.7 + np.arange(10) * 0.01))
+        self.assertTrue(np.all(rows[:, 3] == 2))
+
+    def test_stalled_reference_sensor(self):
+        aligner = self.aligner()
+        aligner.add(0, self.samples(0, 10, 1))
+        aligner.add(1, self.samples(0, 10, 2))
+        rows = aligner.add(1, self.samples(0.1, 70, 2))
+        # time is taken from sensor 1 now, the released rows are not repeated
+        self.assertTrue(np.allclose(rows[:, 0], 0.1 + np.arange(70) * 0.01))
+        self.assertTrue(np.all(np.isnan(rows[:, 1:3])))
+        self.assertTrue(np.all(rows[:, 3] == 2))
+
+    def test_sensor_that_never_delivers(self):
+        aligner = self.aligner()
+        self.assertEqual(len(aligner.add(0, self.samples(0, 40, 1))), 0)
+        rows = aligner.add(0, self.samples(0.4, 20, 1))
+        self.assertEqual(len(rows), 60)
+
+    def test_capacity(self):
+        aligner = self.aligner(capacity=10)
+        aligner.add(0, self.samples(0, 15, 1))
+        rows = aligner.add(1, self.samples(0, 15, 2))
+        # only the newest 10 samples of each sensor were kept
+        self.assertEqual(len(rows), 10)
+        self.assertAlmostEqual(rows[0, 0], 0.05)
+        self.assertEqual(aligner.counters["dropped"], 10)
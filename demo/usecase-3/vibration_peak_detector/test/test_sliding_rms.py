@@ -0,0 +1,85 @@
+import unittest
+import numpy as np
+from vibration_peak_detector.src.analyzer import AnalyzerLogic
+from vibration_peak_detector.src.sliding_rms import SlidingRms
+
+
+class TestSlidingRms(unittest.TestCase):
+    def accel(self, n, period=0.01):
+        a = np.ndarray((n, 2))
+        a[:, 0] = 1000.0 + np.arange(n) * period
+        a[:, 1] = np.random.default_rng(42).normal(9.81, 0.3, n)
+        return a
+
+    def feed(self, engine, accel, chunk_sizes):
+        ts = []
+        rms = []
+        pos = 0
+        for size in chunk_sizes:
+            t, r = engine.process(accel[pos : pos + size])  # noqa E203
+            ts.extend(t)
+            rms.extend(r)
+            pos += size
+        return np.array(ts), np.array(rms)
+
+    def test_disjoint_windows_match_analyze_chunk(self):
+        accel = self.accel(800)
+        engine = SlidingRms(80, 80, 0.01)
+        ts, rms = self.feed(engine, accel, [1, 79, 100, 37, 200, 3, 380])
+
+        self.assertEqual(len(rms), 10)
+        for i in range(10):
+            window = accel[i * 80 : (i + 1) * 80]  # noqa E203
+            self.assertAlmostEqual(rms[i, 0], AnalyzerLogic._analyze_chunk(window), 12)
+            self.assertEqual(ts[i], window[40, 0])
+
+    def test_overlapping_windows(self):
+        accel = self.accel(300)
+        engine = SlidingRms(80, 10, 0.01)
+        ts, rms = self.feed(engine, accel, [50, 50, 200])
+
+        starts = range(0, 300 - 80 + 1, 10)
+        self.assertEqual(len(rms), len(starts))
+        for i, s in enumerate(starts):
+            window = accel[s : s + 80]  # noqa E203
+            self.assertAlmostEqual(rms[i, 0], AnalyzerLogic._analyze_chunk(window), 12)
+
+    def test_hop_larger_than_window(self):
+        accel = self.accel(500)
+        engine = SlidingRms(80, 200, 0.01)
+        ts, rms = self.feed(engine, accel, [90, 90, 90, 90, 140])
+
+        self.assertEqual(len(rms), 3)
+        for i, s in enumerate((0, 200, 400)):
+            window = accel[s : s + 80]  # noqa E203
+            self.assertAlmostEqual(rms[i, 0], AnalyzerLogic._analyze_chunk(window), 12)
+
+    def test_time_gap(self):
+        accel = self.accel(240)
+        accel[100:, 0] += 5.0
+        engine = SlidingRms(80, 80, 0.01)
+        ts, rms = engine.process(accel)
+        # second window contains the gap
+        self.assertTrue(np.array_equal(ts, [accel[40, 0], accel[200, 0]]))
+
+    def test_analyzer_logic_stream(self):
+        accel = self.accel(160)
+        logic = AnalyzerLogic(80, 0.01, 40)
+        ts, rms = logic.analyze_stream(accel)
+        self.assertEqual(len(rms), 3)
+        self.assertAlmostEqual(rms[1, 0], logic.analyze(accel[40:120])[1], 12)
+
+    def test_multi_channel(self):
+        accel = np.ndarray((400, 4))
+        accel[:, 0] = 1000.0 + np.arange(400) * 0.01
+        accel[:, 1:] = np.random.default_rng(7).normal(0, 1, (400, 3))
+        engine = SlidingRms(80, 40, 0.01)
+        ts, rms = self.feed(engine, accel, [130, 270])
+
+        self.assertEqual(rms.shape, (9, 3))
+        for i, s in enumerate(range(0, 400 - 80 + 1, 40)):
+            for c in range(3):
+                window = accel[s : s + 80, [0, c + 1]]  # noqa E203
+                self.assertAlmostEqual(
+                    rms[i, c], AnalyzerLogic._analyze_chunk(window), 12
+                )